@@ -0,0 +1,128 @@
+'''
+Benchmark of the extraction of the OpenAlex columns: the per-work loop in `addwork_openalex` against a
+columnar version that flattens the authorships of every work into one pd.DataFrame and groups it by work.
+
+Both are run on the same synthetic works, and their outputs are checked to be identical before timing.
+
+Example
+-------
+python benchmarks/bench_openalex_extraction.py --works 100000
+'''
+
+#imports
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+import pandas as pd
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import citation_counter_functions as f
+
+FIRST_NAMES = ["Ana", "Ben", "Chloé", "Dmitri", "Eun-ji", "Farid", "Grace", "Hiro", "Ines", "José"]
+LAST_NAMES = ["Ng", "Okafor", "Müller", "Silva", "Tanaka", "van der Berg", "Smith", "Kowalski"]
+COUNTRIES = ["AU", "US", "GB", "DE", "JP", "BR", "CN", "IN"]
+
+def makeworks(n: int, seed: int = 0) -> list:
+    """Return `n` synthetic works with the fields read by `addwork_openalex`, with 1 to 12 authors each."""
+    rng = random.Random(seed)
+    works = []
+    for k in range(n):
+        authorships = []
+        n_authors = rng.randint(1, 12)
+        for a in range(n_authors):
+            name = " ".join([rng.choice(FIRST_NAMES)] * rng.randint(0, 1) + [rng.choice(LAST_NAMES)])
+            authorships.append({
+                "author_position": "first" if a == 0 else "last" if a == n_authors - 1 else "middle",
+                "author": {"display_name": name},
+                "countries": rng.sample(COUNTRIES, rng.randint(0, 2)),
+                "institutions": [{"display_name": f"University {rng.randint(1, 50)}", "type": "education",
+                                  "country_code": rng.choice(COUNTRIES)} for _ in range(rng.randint(0, 2))],
+            })
+        works.append({
+            "authorships": authorships,
+            "cited_by_count": rng.randint(0, 5000),
+            "referenced_works": [f"W{j}" for j in range(rng.randint(0, 40))],
+            "fwci": rng.random() * 5,
+            "citation_normalized_percentile": {"value": rng.random()},
+            "primary_location": {"source": {"display_name": f"Journal {k % 300}", "issn_l": "1234-5678",
+                                            "issn": ["1234-5678", "8765-4321"]}},
+            "open_access": {"is_oa": rng.random() < 0.5},
+            "is_retracted": False,
+        })
+    return works
+
+def extract_loop(works: list) -> dict:
+    """Extract the OpenAlex columns of every work with `addwork_openalex`."""
+    data_dict = {i: f.emptyrow("", "") for i in range(len(works))}
+    for i, w in enumerate(works):
+        data_dict = f.addwork_openalex(data_dict, i, w)
+    return data_dict
+
+def extract_columnar(works: list) -> dict:
+    """Extract the OpenAlex columns of every work by flattening the authorships into pd.DataFrames and grouping them."""
+    data_dict = {i: f.emptyrow("", "") for i in range(len(works))}
+    index = pd.RangeIndex(len(works))
+
+    ## One row per authorship, one per country and one per institution
+    authorships = pd.json_normalize([dict(a, work=i) for i, w in enumerate(works) for a in w.get('authorships', [])])
+    names = authorships["author.display_name"].fillna("X.,X.").str.split()
+    authorships["name"] = [f"{t[-1]},{t[0]}" if len(t) > 1 else f"{t[0]},X." if t else "X.,X." for t in names]
+    countries = authorships[["work", "countries"]].explode("countries").dropna()
+    institutions = authorships[["work", "institutions"]].explode("institutions").dropna()
+    institutions["ins"] = [f"{d.get('display_name')},{d.get('type')},{d.get('country_code')}" for d in institutions["institutions"]]
+
+    ## Group by work. Countries and institutions are listed once each, in the order they first appear
+    grouped = authorships.groupby("work")["name"]
+    authors = grouped.agg("; ".join).reindex(index)
+    counts = grouped.size().reindex(index)
+    first = authorships[authorships["author_position"] == "first"].groupby("work")["name"].last().reindex(index).fillna("X.,X.")
+    last = authorships[authorships["author_position"] == "last"].groupby("work")["name"].last().reindex(index).fillna("X.,X.")
+    country_cells = countries.drop_duplicates().groupby("work")["countries"].agg(", ".join).reindex(index)
+    institution_cells = institutions.drop_duplicates(["work", "ins"]).groupby("work")["ins"].agg("; ".join).reindex(index)
+
+    for i, w in enumerate(works):
+        row = data_dict[i]
+        row["authorcountries_openalex"] = country_cells[i] if isinstance(country_cells[i], str) else None
+        row["institutions_openalex"] = institution_cells[i] if isinstance(institution_cells[i], str) else None
+        row["authorcount_openalex"] = int(counts[i]) if counts[i] == counts[i] else None
+        row["authors_openalex"] = authors[i] if isinstance(authors[i], str) else None
+        row["firstlastauthor_openalex"] = first[i] + "; " + last[i]
+        row["citationcount_openalex"] = w.get('cited_by_count')
+        row["workscitedcount_openalex"] = len(w.get('referenced_works') or [])
+        row["FWCI_openalex"] = w.get('fwci')
+        row["citationnormalisedpercentile_openalex"] = (w.get('citation_normalized_percentile') or {}).get('value')
+        source = (w.get('primary_location') or {}).get('source') or {}
+        row["journal_openalex"] = source.get('display_name')
+        issns = [source.get('issn_l')] + [issn for issn in source.get('issn') or [] if issn != source.get('issn_l')]
+        row["issn_openalex"] = ",".join(issn for issn in issns if issn) or None
+        row["openaccess_openalex"] = (w.get('open_access') or {}).get('is_oa')
+        row["retracted_openalex"] = w.get('is_retracted')
+    return data_dict
+
+def timeit(function, works: list, repeats: int) -> float:
+    """Return the fastest of `repeats` runs of `function(works)`, in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(works)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the per-work and columnar extraction of the OpenAlex columns.")
+    parser.add_argument("--works", type=int, default=100000, help="Number of synthetic works (default: 100000).")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs of each version; the fastest is reported (default: 3).")
+    args = parser.parse_args()
+
+    works = makeworks(args.works)
+    if extract_loop(works) != extract_columnar(works):
+        sys.exit("The per-work and columnar outputs differ.")
+
+    loop = timeit(extract_loop, works, args.repeats)
+    columnar = timeit(extract_columnar, works, args.repeats)
+    print(f"{args.works} works")
+    print(f"per-work loop (addwork_openalex): {loop:.2f} s, {loop / args.works * 1e6:.1f} us per work")
+    print(f"columnar (pandas):                {columnar:.2f} s, {columnar / args.works * 1e6:.1f} us per work")
+    print(f"columnar / per-work:              {columnar / loop:.1f}x")
@@ -0,0 +1,161 @@
+import time
+import sqlite3
+import hashlib
+import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Iterable
+
+PERIODS = ("day", "week", "month")
+
+class BudgetLedger:
+    """
+    A persistent count of the requests made to each API, per API key and budget period.
+
+    Counts are stored in an SQLite database at `data/cache/budgets.sqlite`, so they persist across
+    runs and are shared by concurrent processes. API keys are stored as a hash, never in full.
+
+    If a budget is configured for an API, `take` grants requests only while the count for the
+    current period is below the budget. Requests to APIs without a budget are neither limited nor counted. Work refused a request is recorded with `defer`, so that
+    it is picked up again by the next run, including incremental runs, and dropped with `resume`
+    once it has been done. Rows whose requests kept failing with transient errors are deferred the same way.
+
+    Attributes
+    ----------
+    ledger_file : Path
+        Path to the SQLite database
+    budgets : Dict[str, Dict[str, Any]]
+        Class attribute mapping API name to {"limit": int, "period": "day", "week" or "month"}, set with `configure`
+    """
+
+    budgets: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def configure(cls, budgets: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        """
+        Set the budgets of ledgers created afterwards.
+
+        Parameters
+        ----------
+        budgets : dict, optional
+            Dictionary mapping API name to {"limit": int, "period": "day", "week" or "month"},
+            e.g. {"elsevier": {"limit": 20000, "period": "week"}}
+
+        Raises
+        ------
+        ValueError
+            If a budget does not have an integer limit and a known period
+        """
+        for provider, budget in (budgets or {}).items():
+            if not isinstance(budget.get("limit"), int) or budget.get("period") not in PERIODS:
+                raise ValueError(f"Invalid budget for {provider!r}: {budget!r}. Expected an integer 'limit' and a 'period' of 'day', 'week' or 'month'.")
+        cls.budgets = budgets or {}
+
+    def __init__(self, ledger_file: Path = Path("data/cache/budgets.sqlite")):
+        """
+        Initialize the BudgetLedger, creating the database if needed.
+
+        Parameters
+        ----------
+        ledger_file : Path, optional
+            Path to the SQLite database (default: data/cache/budgets.sqlite)
+        """
+        self.ledger_file = ledger_file
+        self.ledger_file.parent.mkdir(parents=True, exist_ok=True)
+        # isolation_level=None, so transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(self.ledger_file, timeout=60, isolation_level=None)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS spend (provider TEXT NOT NULL, key_hash TEXT NOT NULL, "
+                           "period TEXT NOT NULL, used INTEGER NOT NULL, PRIMARY KEY (provider, key_hash, period))")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS deferred (provider TEXT NOT NULL, key TEXT NOT NULL, "
+                           "since REAL NOT NULL, PRIMARY KEY (provider, key))")
+
+    @staticmethod
+    def _key_hash(apikey: str) -> str:
+        return hashlib.sha256((apikey or "").encode("utf-8")).hexdigest()[:16]
+
+    def _period(self, provider: str) -> str:
+        """Label of the current period of `provider`'s budget, e.g. '2025-W07'."""
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        period = self.budgets.get(provider, {}).get("period", "day")
+        if period == "week":
+            year, week, _ = today.isocalendar()
+            return f"{year}-W{week:02d}"
+        if period == "month":
+            return today.strftime("%Y-%m")
+        return today.isoformat()
+
+    def used(self, provider: str, apikey: str = "") -> int:
+        """Return the number of requests made to `provider` with `apikey` in the current period."""
+        row = self._conn.execute("SELECT used FROM spend WHERE provider = ? AND key_hash = ? AND period = ?",
+                                 (provider, self._key_hash(apikey), self._period(provider))).fetchone()
+        return row[0] if row else 0
+
+    def remaining(self, provider: str, apikey: str = "") -> Optional[int]:
+        """Return the number of requests left in the current period, or None if `provider` has no budget."""
+        if provider not in self.budgets:
+            return None
+        return max(self.budgets[provider]["limit"] - self.used(provider, apikey), 0)
+
+    def take(self, provider: str, apikey: str = "", n: int = 1) -> int:
+        """
+        Record up to `n` requests to `provider`, as many as its budget allows.
+
+        Parameters
+        ----------
+        provider : str
+            API name, e.g. 'elsevier'
+        apikey : str, optional
+            API key the requests are made with. Budgets are counted separately for each key
+        n : int, optional
+            Number of requests wanted (default: 1)
+
+        Returns
+        -------
+        int
+            Number of requests granted, from 0 to `n`. The caller must make no more than this. All `n` are
+            granted, without using the database, if `provider` has no budget
+        """
+        if provider not in self.budgets:
+            return n
+        key_hash, period = self._key_hash(apikey), self._period(provider)
+        # BEGIN IMMEDIATE so that concurrent processes cannot both take the last of a budget
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute("SELECT used FROM spend WHERE provider = ? AND key_hash = ? AND period = ?",
+                                     (provider, key_hash, period)).fetchone()
+            used = row[0] if row else 0
+            granted = max(min(n, self.budgets[provider]["limit"] - used), 0)
+            if granted:
+                self._conn.execute("INSERT OR REPLACE INTO spend VALUES (?, ?, ?, ?)", (provider, key_hash, period, used + granted))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return granted
+
+    def defer(self, provider: str, keys: Iterable[str]) -> None:
+        """Record that the work for `keys` (DOIs or names) was not done because `provider`'s budget was spent, or its requests kept failing."""
+        keys = list(keys)
+        if not keys:
+            return
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.executemany("INSERT OR IGNORE INTO deferred VALUES (?, ?, ?)", [(provider, key, now) for key in keys])
+        self._conn.execute("COMMIT")
+
+    def resume(self, provider: str, keys: Iterable[str]) -> None:
+        """Record that the deferred work for `keys` has now been done."""
+        keys = list(keys)
+        if not keys:
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.executemany("DELETE FROM deferred WHERE provider = ? AND key = ?", [(provider, key) for key in keys])
+        self._conn.execute("COMMIT")
+
+    def deferred(self, provider: Optional[str] = None) -> set:
+        """Return the keys deferred for `provider`, or for every API if `provider` is None."""
+        if provider is None:
+            return {row[0] for row in self._conn.execute("SELECT key FROM deferred")}
+        return {row[0] for row in self._conn.execute("SELECT key FROM deferred WHERE provider = ?", (provider,))}
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,236 @@
+'''
+Export the caches in data/cache to a portable bundle, and import a bundle into them, e.g. to seed a new node.
+
+A bundle is a gzipped JSON Lines file. The first line describes the bundle:
+{"format": "citation-counter-cache-bundle", "version": 1, "created": ..., "counts": {"openalex": 1200, ...}}
+Each following line is one cached result: {"cache": "openalex", "key": "10.1000/xyz", "value": ...}
+Values are the JSON the APIs returned, rather than pickled library objects, so a bundle can be imported
+with any version of elsapy, semanticscholar and pyalex. Semantic Scholar papers and OpenAlex works are rebuilt
+with the public constructors of the installed versions on import; Elsevier search entries and author papers are
+cached as plain JSON. A value of an unexpected shape stops the export or import with a ValueError.
+
+Example
+-------
+python cache_bundle.py export cache-bundle.jsonl.gz
+python cache_bundle.py import cache-bundle.jsonl.gz
+'''
+
+#imports
+import os
+import gzip
+import json
+import time
+import base64
+import argparse
+import itertools
+from typing import Callable, Dict, Iterator, Optional, Tuple
+import pyalex as pa
+from semanticscholar.Paper import Paper
+from semanticscholar.PaginatedResults import PaginatedResults
+from results_cache import ResultsCache
+from citation_counter_functions import loadcache_gender, savecache_gender, searchentries_elsevier
+
+BUNDLE_FORMAT = "citation-counter-cache-bundle"
+BUNDLE_VERSION = 1
+
+## Conversion of the results of each cache to and from JSON. Only the public constructors and properties of the
+## client libraries are used, and a value of any other shape is refused rather than imported or exported half-read
+
+def checkshape(value, kind: type, db_name: str):
+    """Return `value`, raising a ValueError if it is not a `kind`, e.g. because the installed library returns another type."""
+    if not isinstance(value, kind):
+        raise ValueError(f"Expected a {kind.__name__} in the {db_name} cache, got a {type(value).__name__}. "
+                         "The bundle or the installed client library has a format this version cannot read.")
+    return value
+
+def checkentries(value, db_name: str) -> list:
+    """Return `value`, raising a ValueError if it is not a list of JSON objects."""
+    for entry in checkshape(value, list, db_name):
+        checkshape(entry, dict, db_name)
+    return value
+
+def tojson_elsevier(entries) -> list:
+    return checkentries(searchentries_elsevier(entries), "elsevier")
+
+def fromjson_elsevier(value) -> list:
+    # Bundles written before the search entries were cached on their own hold them under 'results'
+    return checkentries(value["results"] if isinstance(value, dict) else value, "elsevier")
+
+def tojson_semanticscholar(paper: Paper) -> dict:
+    return checkshape(checkshape(paper, Paper, "semanticscholar").raw_data, dict, "semanticscholar")
+
+def fromjson_semanticscholar(value: dict) -> Paper:
+    return Paper(checkshape(value, dict, "semanticscholar"))
+
+def tojson_authors(papers) -> list:
+    # Earlier versions cached the client's PaginatedResults, whose raw_data is the same JSON
+    return checkentries(papers.raw_data if isinstance(papers, PaginatedResults) else papers, "semanticscholar_authors")
+
+def fromjson_authors(value) -> list:
+    # Bundles written before the papers were cached on their own hold them under 'data'
+    return checkentries(value["data"] if isinstance(value, dict) else value, "semanticscholar_authors")
+
+def tojson_openalex(work: dict) -> dict:
+    return dict(checkshape(work, dict, "openalex"))
+
+def fromjson_openalex(value: dict) -> pa.Work:
+    return pa.Work(checkshape(value, dict, "openalex"))
+
+def tojson_http(response: dict) -> dict:
+    return dict(response, content=base64.b64encode(response["content"]).decode("ascii"))
+
+def fromjson_http(value: dict) -> dict:
+    return dict(value, content=base64.b64decode(value["content"]))
+
+# Cache name -> (result to JSON, JSON to result)
+CONVERTERS: Dict[str, Tuple[Callable, Callable]] = {
+    "elsevier": (tojson_elsevier, fromjson_elsevier),
+    "semanticscholar": (tojson_semanticscholar, fromjson_semanticscholar),
+    "semanticscholar_authors": (tojson_authors, fromjson_authors),
+    "openalex": (tojson_openalex, fromjson_openalex),
+    "scimago": (tojson_http, fromjson_http),
+}
+
+def export_bundle(bundle_path: str, db_names: Optional[list] = None) -> Dict[str, int]:
+    """
+    Write the provider caches, the Scimago tables and the gender name cache to a bundle.
+
+    Parameters
+    ----------
+    bundle_path : str
+        Path of the bundle to write, e.g. 'cache-bundle.jsonl.gz'.
+    db_names : list, optional
+        Caches to export, from CONVERTERS and 'gender'. Defaults to every cache.
+
+    Returns
+    -------
+    dict
+        Number of results exported from each cache.
+    """
+    db_names = db_names or list(CONVERTERS) + ["gender"]
+    unknown = set(db_names) - set(CONVERTERS) - {"gender"}
+    if unknown:
+        raise ValueError(f"Unknown caches {sorted(unknown)}. Expected some of {list(CONVERTERS) + ['gender']}.")
+
+    ## Count the results first, so the header can describe the bundle
+    caches = {db_name: ResultsCache(db_name) for db_name in db_names if db_name != "gender"}
+    namegends = loadcache_gender() if "gender" in db_names else {}
+    counts = {db_name: cache.size() for db_name, cache in caches.items()}
+    if "gender" in db_names:
+        counts["gender"] = len(namegends)
+
+    temp_path = f"{bundle_path}.tmp"
+    with gzip.open(temp_path, "wt", encoding="utf-8") as bundle:
+        bundle.write(json.dumps({"format": BUNDLE_FORMAT, "version": BUNDLE_VERSION,
+                                 "created": round(time.time()), "counts": counts}) + "\n")
+        for db_name, cache in caches.items():
+            tojson = CONVERTERS[db_name][0]
+            for key, result in cache.items():
+                bundle.write(json.dumps({"cache": db_name, "key": key, "value": tojson(result)}, ensure_ascii=False) + "\n")
+        for name, (prob_m, prob_w) in namegends.items():
+            bundle.write(json.dumps({"cache": "gender", "key": name, "value": [prob_m, prob_w]}, ensure_ascii=False) + "\n")
+    # Only replace an earlier bundle once this one is complete
+    os.replace(temp_path, bundle_path)
+
+    return counts
+
+def readbundle(bundle_path: str) -> Tuple[dict, Iterator[dict]]:
+    """
+    Open a bundle, returning its header and an iterator over its entries.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a bundle, or was written by a newer version.
+    """
+    bundle = gzip.open(bundle_path, "rt", encoding="utf-8")
+    try:
+        header = json.loads(bundle.readline())
+    except (ValueError, OSError) as e:
+        bundle.close()
+        raise ValueError(f"{bundle_path} is not a cache bundle: {e}")
+    if not isinstance(header, dict) or header.get("format") != BUNDLE_FORMAT:
+        bundle.close()
+        raise ValueError(f"{bundle_path} is not a cache bundle.")
+    if header.get("version", 0) > BUNDLE_VERSION:
+        bundle.close()
+        raise ValueError(f"{bundle_path} is a version {header['version']} bundle, but only versions up to {BUNDLE_VERSION} "
+                         "can be read. Update citation counter to import it.")
+
+    def entries():
+        with bundle:
+            for line in bundle:
+                yield json.loads(line)
+    return header, entries()
+
+def import_bundle(bundle_path: str, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Merge a bundle into the caches in data/cache. Results already cached are kept, and only results
+    for new keys are added.
+
+    Parameters
+    ----------
+    bundle_path : str
+        Path of the bundle to import.
+    batch_size : int, optional
+        Results added to a cache in each transaction (default: 1000).
+
+    Returns
+    -------
+    dict
+        Number of results added to each cache.
+    """
+    header, entries = readbundle(bundle_path)
+    caches = {}
+    added = {db_name: 0 for db_name in header.get("counts", {})}
+    namegends = None
+
+    # Entries of a cache are contiguous, so merge them in batches as they are read
+    for db_name, group in itertools.groupby(entries, key=lambda entry: entry["cache"]):
+        if db_name == "gender":
+            namegends = loadcache_gender() if namegends is None else namegends
+            for entry in group:
+                if entry["key"] not in namegends:
+                    namegends[entry["key"]] = tuple(entry["value"])
+                    added["gender"] = added.get("gender", 0) + 1
+            continue
+        if db_name not in CONVERTERS:
+            print(f"WARNING: Skipping the results of unknown cache {db_name!r}")
+            continue
+        if db_name not in caches:
+            caches[db_name] = ResultsCache(db_name)
+        cache = caches[db_name]
+        fromjson = CONVERTERS[db_name][1]
+        while True:
+            batch = list(itertools.islice(group, batch_size))
+            if not batch:
+                break
+            added[db_name] = added.get(db_name, 0) + cache.merge((entry["key"], fromjson(entry["value"])) for entry in batch)
+
+    for cache in caches.values():
+        cache.save_to_disk()
+    if namegends is not None:
+        savecache_gender(namegends)
+
+    return added
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the caches in data/cache to a portable bundle, or merge a bundle into them.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write the caches to a bundle.")
+    export_parser.add_argument("bundle", help="Path of the bundle to write, e.g. cache-bundle.jsonl.gz.")
+    export_parser.add_argument("--db", nargs="*", default=None,
+                               help=f"Caches to export, from {', '.join(list(CONVERTERS) + ['gender'])}. Defaults to every cache.")
+    import_parser = subparsers.add_parser("import", help="Merge a bundle into the caches, keeping results already cached.")
+    import_parser.add_argument("bundle", help="Path of the bundle to import.")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        counts = export_bundle(args.bundle, args.db)
+        print(f"** Exported {sum(counts.values())} results to {args.bundle} **")
+    else:
+        counts = import_bundle(args.bundle)
+        print(f"** Added {sum(counts.values())} new results from {args.bundle} **")
+    for db_name, count in counts.items():
+        print(f"{db_name}: {count}")
@@ -3,23 +3,82 @@ Run this file to extract metadata on journal articles in provided csv. Please se
 '''
 
 #imports
+import sys
 import citation_counter_functions as f
 
 #main block
 if __name__ == '__main__':
     #Collect user input, instantiate data dictionary
+    args = f.readargs()
     d = f.readjson()
-    data_dict, full_dataframe = f.readcsv(d["csv_path"], d["colname_title"], d["colname_DOI"])
+    f.ResultsCache.configure(d["cache_limits"], d["cache_compression"])
+    f.TraceLog.configure(d["trace_log"])
+    f.BudgetLedger.configure(d["budgets"])
+    if f.isbatch(d["csv_path"]):
+        #Several csvs: enrich each unique DOI once, and output each csv separately at the end
+        inputs = f.readbatch(d["csv_path"], d["colname_title"], d["colname_DOI"], d["retain_all_columns"])
+        data_dict, batch_rows = f.dedupe_batch(inputs)
+    else:
+        data_dict, full_dataframe = f.readcsv(d["csv_path"], d["colname_title"], d["colname_DOI"], d["retain_all_columns"])
 
-    #Interface with each API
-    data_dict = f.get_elsevier_data(d["elsevier_apikey"], data_dict, d["no_cache"])
-    data_dict = f.get_semanticscholar_data(data_dict, d["no_cache"])
-    data_dict = f.get_openalex_data(data_dict, d["no_cache"])
-    data_dict = f.get_scimago_data(data_dict, d["year"], d["no_cache"])
+    #Select the rows to enrich: only rows that are new or changed since the previous output if incremental
+    if d["incremental"]:
+        previous = f.readprevious_output(d["output_format"])
+        data_dict, update_dict, update_rows = f.split_incremental(data_dict, previous, f.BudgetLedger().deferred())
+    else:
+        update_dict, update_rows = data_dict, list(range(len(data_dict)))
+    if args.dry_run:
+        f.plan_requests(update_dict, d)
+        sys.exit(0)
+
+    #Count this execution as one run of the caches. Processes enriching a shard join the latest run instead, i.e. the run
+    #of the process that started them with --workers
+    if not args.shard_count or args.merge:
+        f.ResultsCache.start_run()
+
+    #Enrich one shard and write it to disk, to be merged by another process
+    if args.shard_count and not args.merge:
+        d["rates"] = f.sharerates(d["rates"], args.shard_count)
+        shard_dict, shard_rows = f.select_shard(update_dict, update_rows, args.shard_index, args.shard_count)
+        journal = f.openjournal(shard_dict, d, f"shard {args.shard_index}/{args.shard_count}")
+        shard_dict = f.get_all_data(shard_dict, d, scimago=False, journal=journal)
+        f.output_shard(shard_dict, shard_rows, args.shard_index, args.shard_count)
+        journal.complete()
+        sys.exit(0)
+
+    #Interface with each API, either in worker processes whose shards are merged, or in this process
+    journal = f.openjournal(update_dict, d)
+    if args.workers:
+        f.run_workers(args.workers)
+    shard_count = args.workers or args.shard_count
+    if shard_count:
+        update_dict, update_rows = f.merge_shards(shard_count)
+        update_dict = f.get_scimago_data(update_dict, d["year"], d["no_cache"]) if update_dict else update_dict
+    else:
+        update_dict = f.get_all_data(update_dict, d, journal=journal)
+    data_dict = f.merge_rows(data_dict, update_dict, update_rows)
+
+    #Infer author genders in this process, unless the R script is used after output
+    gender_journal = f.openjournal(data_dict, d, "gender")
+    if not d["skip_gender"] and not d["gender_engine"]:
+        if gender_journal.done('gender'):
+            data_dict = gender_journal.restore(data_dict)
+        else:
+            data_dict = f.get_gender_data(data_dict, d["gender-api.com_apikey"], d["no_cache"], rate=d["rates"]["gender-api"])
+            gender_journal.finish('gender', data_dict)
 
     #Output csv
-    f.output_csv(data_dict, full_dataframe, d["retain_all_columns"])
+    if f.isbatch(d["csv_path"]):
+        f.output_batch(data_dict, inputs, batch_rows, d["retain_all_columns"], d["output_format"])
+    else:
+        f.output_csv(data_dict, full_dataframe, d["retain_all_columns"])
+        if d["output_format"]:
+            f.output_typed(data_dict, full_dataframe, d["retain_all_columns"], d["output_format"])
+
+    #The output is written, so the run no longer needs to be resumed
+    journal.complete()
+    gender_journal.complete()
 
     # Run the gender script
-    if not d["skip_gender"]:
-        f.execute_gender_script()
+    if not d["skip_gender"] and d["gender_engine"] == "R":
+        f.execute_gender_script(d["gender_timeout"])
@@ -4,7 +4,22 @@ Functions required for citation_counter.py. See function descriptor for informat
 
 #imports
 import json
-from typing import Optional
+import csv
+import glob
+import os
+import sys
+import pickle
+import tempfile
+import argparse
+import codecs
+import collections
+import itertools
+import re
+import queue
+import threading
+import unicodedata
+import urllib.parse
+from typing import Callable, Optional, Tuple, Union
 import httpx
 import subprocess
 import shutil
@@ -17,9 +32,72 @@ from elsapy.elsclient import ElsClient
 from elsapy.elssearch import ElsSearch
 from semanticscholar import SemanticScholar
 import pyalex as pa
+from pyalex.api import OpenAlexAuth
 from semanticscholar.Paper import Paper
+from semanticscholar.PaginatedResults import PaginatedResults
 from semanticscholar.SemanticScholarException import ObjectNotFoundException
 from results_cache import ResultsCache
+from trace_log import TraceLog
+from budget_ledger import BudgetLedger
+from openalex_snapshot import OpenAlexSnapshot
+from retry_queue import RetryQueue
+from run_journal import RunJournal
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+## pandas dtypes of the extracted metadata columns, used when writing typed (Parquet/Arrow) output
+OUTPUT_DTYPES = {"DOI": "string",
+                 "Title": "string",
+                 "citationcount_elsevier": "Int64",
+                 "citationcount_semanticscholar": "Int64",
+                 "citationcount_openalex": "Int64",
+                 "authors_semanticscholar": "string",
+                 "authors_openalex": "string",
+                 "authorcount_semanticscholar": "Int64",
+                 "authorcount_openalex": "Int64",
+                 "firstlastauthor_openalex": "string",
+                 "journal_elsevier": "string",
+                 "journal_semanticscholar": "string",
+                 "journal_openalex": "string",
+                 "issn_elsevier": "string",
+                 "issn_openalex": "string",
+                 "institutions_openalex": "string",
+                 "authorcountries_openalex": "string",
+                 "openaccess_openalex": "boolean",
+                 "FWCI_openalex": "Float64",
+                 "citationnormalisedpercentile_openalex": "Float64",
+                 "workscitedcount_openalex": "Int64",
+                 "retracted_openalex": "boolean",
+                 "SJR_scimago": "Float64",
+                 "Hindex_scimago": "Int64",
+                 "journalquartile_scimago": "string",
+                 "first_prob_male": "Float64",
+                 "first_prob_female": "Float64",
+                 "last_prob_male": "Float64",
+                 "last_prob_female": "Float64"
+                }
+
+## Default requests per second made to each API, used to space out requests to Elsevier and gender-api.com and to estimate
+## run times with --dry-run. The other APIs are not throttled here; their rates are typical throughputs, including Scimago's
+## 1 s delay. Each can be overridden with 'rates' in config.json, and is split evenly between the shards of a sharded run
+PROVIDER_RATES = {"elsevier": 1.0,
+                  "semanticscholar": 1.0,
+                  "semanticscholar_authors": 1.0,
+                  "openalex": 5.0,
+                  "scimago": 0.5,
+                  "gender-api": 1.0
+                 }
+
+## Scopus search API, which titles are searched in
+SEARCH_URL_ELSEVIER = "https://api.elsevier.com/content/search/scopus"
+
+## Default connect and read timeouts in seconds of each API whose timeouts can be set in config.json
+PROVIDER_TIMEOUTS = {"elsevier": {"connect": 10, "read": 60},
+                     "semanticscholar": {"connect": 10, "read": 30},
+                     "openalex": {"connect": 10, "read": 30}
+                    }
 
 ## Functions used within main functions, called in citation_counter.py
 
@@ -83,6 +161,64 @@ def print_progress(i: int, proportion: float, total: int, database: str, c_hits:
     
     return proportion
 
+def prioritise_rows(data_dict: dict, deferred: set, value: Union[str, tuple, None] = None, provider: str = "") -> list:
+    """
+    Order the rows of `data_dict` so that, if an API's budget runs out, it has been spent on the most valuable rows.
+
+    Rows deferred by an earlier run come first, then rows with the highest `value`, then the rest in input order.
+    The value columns are filled by the APIs queried before, e.g. `get_all_data` queries OpenAlex first so that
+    Elsevier and Semantic Scholar can rank rows by its citation counts. If no row has a value, e.g. because those
+    APIs have not been queried, the rows are queried in input order.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of extracted metadata.
+    deferred : set
+        DOIs deferred by an earlier run, from `BudgetLedger.deferred`.
+    value : str or tuple of str, optional
+        Numeric columns of `data_dict` to rank rows by, the first with a value in a row being used, e.g.
+        ('citationcount_openalex', 'citationcount_elsevier'). Missing values rank last.
+    provider : str, optional
+        API the rows are ordered for. If it has a budget and no row has a value, a warning is printed.
+
+    Returns
+    -------
+    list
+        Indices of `data_dict` in the order they should be queried.
+    """
+    columns = (value,) if isinstance(value, str) else tuple(value or ())
+    values = [next((data_dict[i][column] for column in columns if data_dict[i].get(column)), 0) for i in range(len(data_dict))]
+    if columns and provider in BudgetLedger.budgets and data_dict and not any(values):
+        print(f"WARNING: No rows have a value of {' or '.join(columns)} to rank them by, so the {provider} budget "
+              "is spent on the rows in input order.")
+    return sorted(range(len(data_dict)), key=lambda i: (data_dict[i]["DOI"] not in deferred, -values[i]))
+
+def updatebudget(ledger: BudgetLedger, provider: str, data_dict: dict, deferred: set, over_budget: list) -> None:
+    """
+    Record the rows of `data_dict` deferred because `provider`'s budget was spent, and drop the earlier deferred rows that have now been done.
+
+    Parameters
+    ----------
+    ledger : BudgetLedger
+        The ledger the budget is counted in.
+    provider : str
+        API name, e.g. 'elsevier'.
+    data_dict : dict
+        Dictionary of extracted metadata.
+    deferred : set
+        DOIs deferred by an earlier run, from `BudgetLedger.deferred`.
+    over_budget : list
+        DOIs that were not queried because the budget was spent.
+    """
+    done = {data_dict[i]["DOI"] for i in range(len(data_dict))} & deferred - set(over_budget)
+    ledger.resume(provider, done)
+    ledger.defer(provider, over_budget)
+    if over_budget:
+        budget = ledger.budgets[provider]
+        print(f"WARNING: The {provider} budget of {budget['limit']} requests per {budget['period']} is spent. "
+              f"{len(over_budget)} rows were deferred and will be queried first in the next run.")
+
 def instantiateclient_elsevier(elsevier_apikey: str) -> ElsClient:
     """
     Instantiate an `ElsClient` object for the Elsevier API.
@@ -105,8 +241,7 @@ def instantiateclient_elsevier(elsevier_apikey: str) -> ElsClient:
     #Instantiate the client object and test it
     client = ElsClient(elsevier_apikey)
     try:
-        doc_srch = ElsSearch("TITLE({})".format("Tensor-based Uncorrelated Multilinear Discriminant Analysis for Epileptic Seizure Prediction"), 'scopus')
-        doc_srch.execute(client)
+        searchtitle_elsevier(client, "Tensor-based Uncorrelated Multilinear Discriminant Analysis for Epileptic Seizure Prediction")
     except Exception as e:
         print("ERROR: There was a problem setting up a connection with your API key. Please check it's correct. More information:\n")
         raise
@@ -116,6 +251,90 @@ def instantiateclient_elsevier(elsevier_apikey: str) -> ElsClient:
 
     return client    
 
+def searchtitle_elsevier(els_client: ElsClient, title: str, timeout: dict = PROVIDER_TIMEOUTS["elsevier"]) -> Tuple[list, int]:
+    """
+    Search Scopus for papers with the title `title`, as `ElsSearch.execute` does, but with connect and read timeouts.
+
+    Parameters
+    ----------
+    els_client : ElsClient
+        Client for the Elsevier API, holding the API key and institutional token.
+    title : str
+        Title, cleaned with `cleantitle_elsevier`.
+    timeout : dict, optional
+        Dictionary with the connect and read timeouts in seconds, under 'connect' and 'read'.
+
+    Returns
+    -------
+    list of dict
+        The entries of the search results, as the JSON the API returned. These are what the Elsevier cache stores.
+    int
+        Size of the response body in bytes.
+
+    Raises
+    ------
+    requests.RequestException
+        If the request fails or times out.
+    """
+    headers = {"X-ELS-APIKey": els_client.api_key, "Accept": "application/json"}
+    if els_client.inst_token:
+        headers["X-ELS-Insttoken"] = els_client.inst_token
+    response = requests.get(SEARCH_URL_ELSEVIER, params={"query": f"TITLE({title})"}, headers=headers,
+                            timeout=(timeout["connect"], timeout["read"]))
+    response.raise_for_status()
+    return response.json()['search-results'].get('entry', []), len(response.content)
+
+def searchentries_elsevier(cached) -> list:
+    """
+    Return the search result entries of a result from the Elsevier cache.
+
+    Parameters
+    ----------
+    cached : list or ElsSearch
+        Entries, from `searchtitle_elsevier`, or an executed `ElsSearch` cached by earlier versions.
+
+    Returns
+    -------
+    list of dict
+        The entries of the search results.
+    """
+    return cached.results if isinstance(cached, ElsSearch) else cached
+
+def addsearch_elsevier(data_dict: dict, i: int, doi: str, entries: list) -> dict:
+    """
+    Add the citation count, journal and ISSNs of the search result matching `doi` to row `i` of `data_dict`.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of extracted metadata.
+    i : int
+        Index of the row in `data_dict`.
+    doi : str
+        DOI of the row.
+    entries : list of dict
+        Entries of the title search, from `searchtitle_elsevier`.
+
+    Returns
+    -------
+    dict
+        Updated `data_dict`.
+    """
+    #Use the title search to extract citation count and journal. Author information can't be found reliably, due to how poor AbsDoc and Fulldoc perform.
+    for result in entries:
+        if 'prism:doi' in result.keys():
+            if result['prism:doi'] == doi:
+                #Get citation count
+                data_dict[i]['citationcount_elsevier'] = int(result.get('citedby-count')) if result.get('citedby-count') else None
+                #Get journal
+                if 'prism:publicationName' in result.keys():
+                    data_dict[i]['journal_elsevier'] = result.get('prism:publicationName')
+                #Get journal ISSNs
+                issns = [result.get(key) for key in ('prism:issn', 'prism:eIssn') if result.get(key)]
+                if issns:
+                    data_dict[i]['issn_elsevier'] = ",".join(issns)
+    return data_dict
+
 def cleantitle_elsevier(string, chars_to_remove):
     """
     Remove specified characters from a string.
@@ -176,7 +395,8 @@ def reformatauthors_semanticscholar(authors: list) -> str:
     return "; ".join(formatted)
 
 def getauthorpapers_semanticscholar(sch, author_id: str, initial_limit: int = 1000, retries: int = 3,
-                                    cache: Optional[ResultsCache] = None):
+                                    cache: Optional[ResultsCache] = None, ledger: Optional[BudgetLedger] = None,
+                                    row: Optional[int] = None):
     """
     Safely fetch author papers from Semantic Scholar API with retries
     and progressively smaller limits if the request times out.
@@ -193,25 +413,210 @@ def getauthorpapers_semanticscholar(sch, author_id: str, initial_limit: int = 10
         Number of retry attempts before giving up (default 3).
     cache : ResultsCache, optional
         ResultsCache instance to store the results of requests made.
+    ledger : BudgetLedger, optional
+        Ledger each request is taken from, as part of the 'semanticscholar' budget (default: None, no budget).
+    row : int, optional
+        Index of the row the papers are fetched for, recorded in the trace log (default: None).
 
     Returns
     -------
-    list or None
-        List of author papers if successful, or None if request fails.
+    list of dict or None
+        The author's papers, as the JSON the API returned, if successful, or None if every request fails
+        or the budget is spent.
+        These are what the cache stores.
     """
     if cache is not None:
         if cache.has(author_id):
-            return cache.get(author_id)
+            with TraceLog.call('semanticscholar_authors', row, author_id, cache='hit') as event:
+                result = cache.get(author_id)
+                event["bytes"] = cache.last_nbytes
+            # Earlier versions cached the client's PaginatedResults, whose raw_data is the same JSON
+            return result.raw_data if isinstance(result, PaginatedResults) else result
     limit = initial_limit
     for attempt in range(retries):
+        if ledger is not None and not ledger.take('semanticscholar'):
+            return None
         try:
-            result = sch.get_author_papers(author_id, limit=limit)
-            cache.set(author_id, result)
+            with TraceLog.call('semanticscholar_authors', row, author_id, attempt=attempt + 1):
+                result = sch.get_author_papers(author_id, limit=limit).raw_data
+            if cache is not None:
+                cache.set(author_id, result)
             return result
         except Exception as e:
             limit = max(100, limit // 2)
     return None
 
+def addpaper_semanticscholar(data_dict: dict, i: int, doi: str, paper_result, sch: SemanticScholar,
+                             cache_authors: Optional[ResultsCache] = None, ledger: Optional[BudgetLedger] = None) -> dict:
+    """
+    Add the citation count, journal and authors of a Semantic Scholar paper to row `i` of `data_dict`.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of extracted metadata.
+    i : int
+        Index of the row in `data_dict`.
+    doi : str
+        DOI of the row.
+    paper_result : Paper
+        The paper, from `sch.get_paper`.
+    sch : SemanticScholar
+        Client, used to fetch the papers of the first author.
+    cache_authors : ResultsCache, optional
+        Cache of the papers of each author.
+    ledger : BudgetLedger, optional
+        Ledger the requests for the papers of the first author are taken from (default: None, no budget).
+
+    Returns
+    -------
+    dict
+        Updated `data_dict`.
+    """
+    #Extract citation count. Method is looking at the papers author1 has published, and matching according to title. Take max citation count. JUSTIFICATION FOR THIS PROCESS: This is more complicated than the semanticscholar documentation may suggest. Semantic scholar can give two copies of the same paper, with different citation counts, eg: 'Local Transformed Features for Epileptic Seizure Detection in EEG Signal.' Type that into https://www.semanticscholar.org and see what you get. This is managed by taking the first author, seeing all the papers they're authored on, and then taking the one with a matching title and greatest citation count.        
+    citation_count = None
+    authors = paper_result['authors']
+    #Some papers, erroneously, may not have a listed author in Semantic Scholar, eg: https://www.semanticscholar.org/paper/EEG-Signal-Research-for-Identification-of-Epilepsy/140ee25d5ca5dbdf65dafc57f422f00366137bc8
+    #If there are authors, check through author1 papers to manage paper duplication problems leading to erroneous citation counts:
+    if authors:
+        author1_papers = getauthorpapers_semanticscholar(sch, authors[0]['authorId'], cache=cache_authors, ledger=ledger, row=i)
+        #If author1's papers could not be fetched, or the budget is spent, fall back to the paper's own citation count
+        if author1_papers is None:
+            citation_count = paper_result['citationCount']
+        for author1_paper in author1_papers or []:
+            if 'DOI' in author1_paper['externalIds'].keys():                                # A couple things to note here. Because sometimes the titles extracted have strange characters, I'm only checking to see if the DOI.lower() matches. .lower() is needed because sometimes pre-prints have a letter of lower case and they get chosen instead of the peer-reviewed published paper, which has the citations.
+                if author1_paper['externalIds']['DOI'].lower() == doi.lower():
+                    if citation_count != None:
+                        citation_count = max(citation_count, author1_paper['citationCount'])
+                    else:
+                        citation_count = author1_paper['citationCount']
+    #If there aren't any authors, assume no paper duplication problems:
+    else:
+        citation_count = paper_result['citationCount']
+    #Save the citation count
+    data_dict[i]['citationcount_semanticscholar'] = citation_count
+
+    #Extract journal information
+    if paper_result['venue']:
+        data_dict[i]['journal_semanticscholar'] = paper_result['venue']
+    
+    #Extract author information, including authors and author count
+    if paper_result['authors']:
+        authors = paper_result['authors']
+        authors = [a['name'] for a in paper_result['authors']]
+        num_authors = len(authors)
+        data_dict[i]['authorcount_semanticscholar'] = num_authors
+        authors = reformatauthors_semanticscholar(authors)
+        data_dict[i]['authors_semanticscholar'] = authors
+    else:
+        data_dict[i]['authors_semanticscholar'] = 'X.,X.'
+
+    return data_dict
+
+def getwork_openalex(doi_link: str, timeout: dict) -> Tuple[pa.Work, int]:
+    """
+    Get a work from the OpenAlex API by DOI, as `pa.Works()[doi_link]` does, but with connect and read timeouts.
+
+    Parameters
+    ----------
+    doi_link : str
+        DOI as a link, e.g. 'https://doi.org/10.1000/xyz'.
+    timeout : dict
+        Dictionary with the connect and read timeouts in seconds, under 'connect' and 'read'.
+
+    Returns
+    -------
+    pa.Work
+        The work.
+    int
+        Size of the response body in bytes.
+
+    Raises
+    ------
+    requests.RequestException
+        If the request fails, times out or the work is not found.
+    """
+    url = f"{pa.config.openalex_url}/works/{urllib.parse.quote(doi_link, safe=':/')}"
+    response = requests.get(url, auth=OpenAlexAuth(pa.config), timeout=(timeout["connect"], timeout["read"]))
+    response.raise_for_status()
+    return pa.Work(response.json()), len(response.content)
+
+def addwork_openalex(data_dict: dict, i: int, w: dict) -> dict:
+    """
+    Add the metadata of an OpenAlex work to a data dictionary entry.
+
+    Countries and institutions are listed in the order they first appear, so the output is the same in every run.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of paper metadata.
+    i : int
+        Index in `data_dict` of the entry to update.
+    w : dict
+        The work, from the OpenAlex API or a snapshot.
+
+    Returns
+    -------
+    dict
+        The updated dictionary, with the '*_openalex' fields of entry `i` filled in.
+    """
+    ## Author associated data
+    authors = []
+    first = 'X.,X.'
+    last = 'X.,X.'
+    countries = {}
+    institutions = {}
+
+    for authorship in w.get('authorships', []):
+        # Author name
+        name = reformatauthor_openalex(
+            (authorship.get('author') or {})
+            .get('display_name') or "X.,X."
+        )
+        authors.append(name)
+
+        # First and last authors
+        position = authorship.get('author_position')
+        if position == 'first':
+            first = name
+        elif position == 'last':
+            last = name
+
+        # Countries
+        for country in authorship.get('countries', []) or []:
+            countries[country] = None
+
+        # Institutions
+        for institution in authorship.get('institutions', []) or []:
+            ins = f"{institution.get('display_name')},{institution.get('type')},{institution.get('country_code')}"
+            institutions[ins] = None
+
+    data_dict[i]["authorcountries_openalex"] = ", ".join(countries) if countries else None
+    data_dict[i]["institutions_openalex"] = "; ".join(institutions) if institutions else None
+    data_dict[i]["authorcount_openalex"] = len(authors) if authors else None
+    data_dict[i]["authors_openalex"] = "; ".join(authors) if authors else None
+    data_dict[i]["firstlastauthor_openalex"] = first + "; " + last
+
+    ## Citing information
+    data_dict[i]["citationcount_openalex"] = w.get('cited_by_count')
+    data_dict[i]["workscitedcount_openalex"] = len(w.get('referenced_works') or [])
+    data_dict[i]["FWCI_openalex"] = w.get('fwci')
+    citation_normalised_percentile = w.get('citation_normalized_percentile') or {}
+    data_dict[i]["citationnormalisedpercentile_openalex"] = citation_normalised_percentile.get('value')
+
+    ## Publishing information
+    primary_location = w.get('primary_location') or {}
+    source = primary_location.get('source') or {}
+    data_dict[i]["journal_openalex"] = source.get('display_name')
+    issns = [source.get('issn_l')] + [issn for issn in source.get('issn') or [] if issn != source.get('issn_l')]
+    data_dict[i]["issn_openalex"] = ",".join(issn for issn in issns if issn) or None
+    openaccess = w.get('open_access') or {}
+    data_dict[i]["openaccess_openalex"] = openaccess.get('is_oa')
+    data_dict[i]["retracted_openalex"] = w.get('is_retracted')
+
+    return data_dict
+
 def reformatauthor_openalex(author: str) -> str:
     """
     Clean and reformat an author name into "Last,First" format.
@@ -270,79 +675,164 @@ def reformatjournal_scimago(journal: str) -> str:
                 clean += letter
         return clean.lower()
 
-def manageNan_scimago(value: pd.Series):
+def reformatissn_scimago(issn: str) -> Optional[str]:
     """
-    Convert a pandas Series containing a single value to a Python scalar, replacing NaN with None.
-    Includes handling for missing or duplicate journal entries.
+    Normalise an ISSN to 8 upper case characters without a hyphen, e.g. '0010-482x' to '0010482X'.
+
+    Standardisation allows ISSNs from Scimago, OpenAlex and Elsevier to be matched exactly.
 
     Parameters
     ----------
-    value : pd.Series
-        A pandas Series expected to contain exactly one element.
+    issn : str
+        Input ISSN, with or without a hyphen.
 
     Returns
     -------
-    result : object
-        The scalar value contained in the Series, or None if the value is NaN.
+    str or None
+        The normalised ISSN, or None if `issn` is not a valid ISSN.
     """
-    # Handling for missing journal, or duplicate journal, and extract as scalar
-    if value.empty:
+    if not isinstance(issn, str):
         return None
-    if len(value) > 1:
-        value = value.iloc[0]
-    else:
-        value = value.item()
+    clean = issn.strip().replace('-', '').upper()
+    return clean if re.fullmatch(r"\d{7}[\dX]", clean) else None
 
-    # Return None or scalar as appropriate
-    return None if (pd.isna(value) or value == '-') else value
+def manageNan_scimago(value):
+    """
+    Convert a value from the Scimago pd.DataFrame to a Python scalar, replacing NaN and '-' with None.
+
+    Parameters
+    ----------
+    value : object
+        A value from a row of the Scimago pd.DataFrame.
 
-def addjournalinfo_scimago(df: pd.DataFrame, data_dict: dict, i: int, journals: dict, journal: str) -> dict:
+    Returns
+    -------
+    result : object
+        The value, or None if the value is NaN or '-'.
     """
-    Add Scimago journal metrics (SJR, H-index, and quartile) to a data dictionary entry.
+    return None if (pd.isna(value) or value == '-') else value
 
-    This function looks up a journal in a DataFrame containing Scimago metrics, extracts
-    the SJR, H-Index and Quartile, and stores the information in a dictionary entry corresponding to the
-    given index.
+def indexjournals_scimago(df: pd.DataFrame) -> tuple[dict, dict]:
+    """
+    Index the rows of the Scimago pd.DataFrame by normalised ISSN and by cleaned journal name.
 
     Parameters
     ----------
     df : pd.DataFrame
-        DataFrame containing Scimago journal data with columns 'Title', 'SJR', 'h-index', and 'field'.
+        DataFrame containing Scimago journal data with columns 'Title', 'Issn', 'SJR', 'H index' and 'SJR Best Quartile'.
+
+    Returns
+    -------
+    tuple of (dict, dict)
+        - dict : Normalised ISSN -> row, as a dictionary.
+        - dict : Journal name cleaned with `reformatjournal_scimago` -> row, as a dictionary.
+        Where several rows share an ISSN or name, the first (most recent) row is kept.
+    """
+    issn_index = {}
+    title_index = {}
+    for record in df.to_dict('records'):
+        # Scimago lists all ISSNs of a journal in one comma separated string, e.g. '15424863, 00079235'
+        for issn in str(record.get('Issn') or '').split(','):
+            issn = reformatissn_scimago(issn)
+            if issn:
+                issn_index.setdefault(issn, record)
+        title_index.setdefault(reformatjournal_scimago(record['Title']), record)
+
+    return issn_index, title_index
+
+def addjournalinfo_scimago(data_dict: dict, i: int, record: dict) -> dict:
+    """
+    Add Scimago journal metrics (SJR, H-index, and quartile) to a data dictionary entry.
+
+    Parameters
+    ----------
     data_dict : dict
         Dictionary of article or journal entries where metrics will be added.
     i : int
         Index in `data_dict` corresponding to the entry to update.
-    journals : dict
-        Dictionary mapping input journal names to the canonical names in `df`.
-    journal : str
-        Name of the journal to look up.
+    record : dict
+        Row of the Scimago pd.DataFrame for the journal, from `indexjournals_scimago`.
 
     Returns
     -------
     data_dict : dict
         The updated dictionary with added fields:
-        - 'SJR_openalex': SJR value or None
-        - 'Hindex_openalex': H-index value or None
+        - 'SJR_scimago': SJR value as a float, or None
+        - 'Hindex_scimago': H-index value or None
         - 'journalquartile_scimago': Quartile string ('Q1'-'Q4') if SJR exists
 
     Notes
     -----
     - If no SJR or H-index is found for the journal, the corresponding dictionary entries
       will be None.
-    - Quartiles are determined according to the SJR percentile boundaries of the journal's field.
     - Relies on `manageNan_scimago` to safely handle missing values in the DataFrame.
     """
-    # Lookup name of the journal, given a match was found
-    dfjournalname = journals[journal]
-
-    ## Extraction of the SJR and H-index if a journal name match is found
-    data_dict[i]['SJR_scimago'] = manageNan_scimago(df[df['Title'] == dfjournalname]['SJR'])
-    data_dict[i]['Hindex_scimago'] = manageNan_scimago(df[df['Title'] == dfjournalname]['H index'])
-    data_dict[i]['journalquartile_scimago'] = manageNan_scimago(df[df['Title'] == dfjournalname]['SJR Best Quartile'])
+    sjr = manageNan_scimago(record.get('SJR'))
+    data_dict[i]['SJR_scimago'] = float(sjr) if sjr is not None else None
+    data_dict[i]['Hindex_scimago'] = manageNan_scimago(record.get('H index'))
+    data_dict[i]['journalquartile_scimago'] = manageNan_scimago(record.get('SJR Best Quartile'))
 
     return data_dict
 
-def collectyear_scimago(year):
+def conditionalget_http(url: str, headers: dict, cache: Optional[ResultsCache] = None, provider: str = 'http',
+                        timeout: float = 60) -> requests.Response:
+    """
+    GET `url`, revalidating a cached copy of the response with its ETag/Last-Modified validators instead of downloading it again.
+
+    If `cache` holds a response for `url`, the request is sent with If-None-Match/If-Modified-Since. A 304 Not
+    Modified response is answered from the cache, so only the headers are transferred. Responses with a validator
+    are stored in `cache`; responses without one cannot be revalidated, so are not stored.
+
+    Parameters
+    ----------
+    url : str
+        URL to request.
+    headers : dict
+        Request headers.
+    cache : ResultsCache, optional
+        Cache of responses, keyed by URL. If None, the request is always made in full.
+    provider : str, optional
+        Name of the API, for the trace log (default: 'http').
+    timeout : float, optional
+        Seconds to wait for the server (default: 60).
+
+    Returns
+    -------
+    requests.Response
+        The response, with the cached body and a status of 200 if the cached copy was revalidated.
+
+    Raises
+    ------
+    requests.RequestException
+        If the request fails or returns an error status.
+    """
+    cached = cache.get(url) if cache is not None else None
+    headers = dict(headers)
+    if cached is not None:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    with TraceLog.call(provider, doi=url, cache='revalidate' if cached is not None else 'miss') as event:
+        response = requests.get(url, headers=headers, timeout=timeout)
+        event["status"], event["bytes"] = response.status_code, len(response.content)
+
+    if response.status_code == 304 and cached is not None:
+        # Rebuild the response from the cached copy
+        response.status_code = 200
+        response._content = cached["content"]
+        response.encoding = cached["encoding"]
+        return response
+
+    response.raise_for_status()
+    etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+    if cache is not None and (etag or last_modified):
+        cache.set(url, {"etag": etag, "last_modified": last_modified,
+                        "content": response.content, "encoding": response.encoding})
+    return response
+
+def collectyear_scimago(year, cache: Optional[ResultsCache] = None):
     """
     Fetch SCImago Journal Rank (SJR) data for a specific year.
 
@@ -350,6 +840,8 @@ def collectyear_scimago(year):
     ----------
     year : int
         Year for which SCImago Journal Rank data is requested.
+    cache : ResultsCache, optional
+        Cache of Scimago responses, which are revalidated rather than downloaded again if unchanged.
 
     Returns
     -------
@@ -363,6 +855,8 @@ def collectyear_scimago(year):
             Best quartile classification (Q1–Q4).
         - 'H index' : int
             Journal's H-index.
+        - 'Issn' : str
+            Comma separated ISSNs of the journal, without hyphens.
         Returns None if data could not be downloaded or parsed.
     """
     # Access the csv data from a particular year
@@ -374,19 +868,21 @@ def collectyear_scimago(year):
     }
 
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+        response = conditionalget_http(url, headers, cache, 'scimago')
     except requests.RequestException as e:
         print(f"Failed to download data for year {year}: {e}")
         return None
 
-    # Read CSV from response, take the relevant columns, clean SJR 
-    df = pd.read_csv(StringIO(response.text), delimiter=';', dtype={5: str, 'Issn': str, 8: str})
-    df = df[['Title', "SJR Best Quartile", "H index"]]
+    # Read CSV from response, take the relevant columns. SJR is written with a decimal comma
+    df = pd.read_csv(StringIO(response.text), delimiter=';', decimal=',', dtype={'Issn': str})
+    df = df[['Title', "Issn", "SJR", "SJR Best Quartile", "H index"]]
+    # A column with any other text in it is read as strings, so make sure SJR is numeric
+    if not pd.api.types.is_numeric_dtype(df["SJR"]):
+        df["SJR"] = pd.to_numeric(df["SJR"].astype(str).str.replace(",", ".", regex=False), errors="coerce")
 
     return df
 
-def collectall_scimago(end_year, start_year = 1999, delay=1) -> pd.DataFrame:
+def collectall_scimago(end_year, start_year = 1999, delay=1, no_cache: bool = False) -> pd.DataFrame:
     """
     Fetch and aggregate SCImago Journal Rank (SJR) data across multiple years.
 
@@ -400,6 +896,9 @@ def collectall_scimago(end_year, start_year = 1999, delay=1) -> pd.DataFrame:
     delay : int or float, optional
         Delay in seconds between successive requests to avoid overloading the server.
         Default is 1.
+    no_cache : bool, optional
+        If True, every year is downloaded in full rather than revalidated from data/cache/scimago.sqlite.
+        Default is False.
 
     Returns
     -------
@@ -411,13 +910,17 @@ def collectall_scimago(end_year, start_year = 1999, delay=1) -> pd.DataFrame:
         - 'SJR' : float
         - 'SJR Best Quartile' : str
         - 'H index' : int
+        - 'Issn' : str
     """
     years = range(end_year, start_year, -1)
-    all_scimago = pd.DataFrame(columns=["Title", "SJR Best Quartile", "H index"])
+    all_scimago = pd.DataFrame(columns=["Title", "Issn", "SJR", "SJR Best Quartile", "H index"])
+    cache = ResultsCache("scimago", cache_disabled=no_cache)
 
     for year in years:
         # Add yearly data to the dictionary, only adding if Title of source has not yet been included in the dictionary
-        temp = collectyear_scimago(year)
+        temp = collectyear_scimago(year, cache)
+        if temp is None:
+            continue
         temp = temp[~temp['Title'].isin(all_scimago['Title'])]
         if all_scimago.empty:
             all_scimago = temp
@@ -427,562 +930,2012 @@ def collectall_scimago(end_year, start_year = 1999, delay=1) -> pd.DataFrame:
         # Pause
         time.sleep(delay)
 
+    cache.save_to_disk()
     return all_scimago
 
-## Main functions
-
-def readjson() -> dict:
+def emptyrow(doi: str, title: str) -> dict:
     """
-    Read configuration values from `config.json`.
+    Create a row of `data_dict` for a paper, with every metadata field set to None.
+
+    Parameters
+    ----------
+    doi : str
+        DOI of the paper, or "" if unknown.
+    title : str
+        Title of the paper, or "" if unknown.
 
     Returns
     -------
     dict
-        Dictionary with the following structure::
-
-            {
-                "csv_path": str
-                    Path to the CSV file(s).
-                "elsevier_apikey": str
-                    Elsevier API key.
-                "colname_title": str
-                    Column name containing titles.
-                "colname_DOI": str
-                    Column name containing DOIs.
-                "year": int
-                    The current year
-                "retain_all_columns": str
-                    Either "" or "True".
-                "no_cache": str
-                    Either "" or "True".
-                "skip_gender": str
-                    Either "" or "True".
-            }
-
-    Raises
-    ------
-    FileNotFoundError
-        If `config.json` does not exist.
-    ValueError
-        If `retain_all_columns` has an invalid value.
+        The row, ready to be enriched by the `get_*_data` functions.
     """
-
-    #Open the json file
-    try:
-        with open("config.json") as con_file:
-            con = json.load(con_file)
-    except Exception as e:
-        print("ERROR: Make sure there is a file name config.json in this folder. More information:\n")
-        raise
-
-    # Check appropriate input for boolean inputs, and the numeric input of year
-    for bool_parameter in ['retain_all_columns', 'no_cache', 'skip_gender']:
-        checkjsonbool(con[bool_parameter], bool_parameter)
-    if not con["year"].isnumeric():
-        raise ValueError(f"Invalid value for 'year': {con['year']}. Expected a number.")
-    else:
-        con['year'] = int(con['year'])
-
-    # Extract values and store in dictionary to return. Should have really used a function and loop for these.
-    data = {}
-    for key in con.keys():
-        data[key] = con[key]
-
-    # User communication
-    print("\n** Inputs read! Your inputs are: **")
-    for key in data.keys():
-        print(f'{key}: {data[key]}')
-    print("")
-
-    return data
-
-def readcsv(csv_path: str, colname_title: str, colname_DOI: str) -> tuple[dict, pd.DataFrame]:
+    return {"DOI": doi,
+            "Title": title,
+            "citationcount_elsevier": None,
+            "citationcount_semanticscholar": None,
+            "citationcount_openalex": None,
+            "authors_semanticscholar": None,                # Authors are listed in string format 'LastName,Firstname; LastName...'
+            "authors_openalex": None,                       # ^
+            "authorcount_semanticscholar": None,
+            "authorcount_openalex": None,
+            "firstlastauthor_openalex": None,
+            "journal_elsevier": None,
+            "journal_semanticscholar": None,
+            "journal_openalex": None,
+            "issn_elsevier": None,                          # ISSNs listed in string format 'ISSN1,ISSN2...'
+            "issn_openalex": None,                          # ^
+            "institutions_openalex": None,                  # All unique institutions listed in string format 'Institution1,type1,country1; Institution2...'
+            "authorcountries_openalex": None,               # All unique countries listed in string format 'Country1, Country2...'
+            "openaccess_openalex": None,
+            "FWCI_openalex": None,
+            "citationnormalisedpercentile_openalex": None,
+            "workscitedcount_openalex": None,
+            "retracted_openalex": None,
+            "SJR_scimago": None,
+            "Hindex_scimago": None,
+            "journalquartile_scimago": None
+           }
+
+def sniffcsv(csv_file: Path, colname_title: str, colname_DOI: str, sample_size: int = 65536) -> tuple[str, int]:
     """
-    Read a CSV file and extract metadata, DOIs, and titles.
+    Determine the encoding and header row of a CSV from the first few KB of the file.
 
     Parameters
     ----------
-    csv_path : str
+    csv_file : Path
         Path to the CSV file.
     colname_title : str
         Column name containing paper titles.
     colname_DOI : str
         Column name containing DOIs.
+    sample_size : int, optional
+        Number of bytes read from the start of the file (default 65536).
 
     Returns
     -------
-    tuple of (dict, pandas.DataFrame)
-        - dict : Dictionary containing DOI, title, and metadata fields for each paper.
-        - DataFrame : The full user-provided CSV loaded into a pandas DataFrame.
+    tuple of (str, int)
+        - str : Encoding to read the file with.
+        - int : Index of the row containing the headers (0 or 1).
 
-    Raises
-    ------
-    Exception
-        If the CSV file cannot be read or the specified columns are not found.
+    Notes
+    -----
+    If the headers cannot be found in the first or second row, 0 is returned and the
+    subsequent read will fail on the missing columns.
     """
-    ## Extract pd.Series object of the Titles and DOIs of all papers in the user provided csv
-    try:
-        csv_file = Path(csv_path)
+    with open(csv_file, 'rb') as f:
+        sample = f.read(sample_size)
 
-        # Try with default encoding first
+    # Files with a UTF-8 BOM are read as UTF-8, otherwise the default encoding is used
+    if sample.startswith(codecs.BOM_UTF8):
+        encode = "utf-8-sig"
+        print("Found a file with UTF-8 BOM. Reading CSV with UTF-8 encoding.")
+    else:
         encode = "unicode_escape"
-        full_dataframe = pd.read_csv(csv_file, encoding=encode)
-
-        # Handle UTF-8 BOM in first column
-        if full_dataframe.columns[0] == "ï»¿":
-            encode = "utf-8"
-            print("Found a file with UTF-8 BOM. Reloading CSV with UTF-8 encoding.")
-            full_dataframe = pd.read_csv(csv_file, encoding=encode)
-
-        # Handle case where headers are not in first row
-        header_row = 1
-        if colname_DOI not in full_dataframe.columns or colname_title not in full_dataframe.columns:
-            print("Headers not found in first row, retrying with skiprows=1.")
-            full_dataframe = pd.read_csv(csv_file, encoding=encode, skiprows=1)
-            header_row = 2
-            
-        DOIs = full_dataframe[colname_DOI]
-        Titles = full_dataframe[colname_title]
-    except Exception as e:
-        print("ERROR: Something went wrong when interacting with your csv. Please ensure your csv path is correct, and that you've correctly entered your title and DOI column headers. These headers must also be in the first or second row of your csv. Here's more information to help figure out what went wrong:\n")
-        raise
-
-    ## Communcate to user successful extraction
-    print("** Successfully read Title and DOI information from your provided CSV **\n")
-
-    ## Reformat the pd.Series object to be contained within a dictionary
-    # Convert missing values to empty strings
-    DOIs = DOIs.fillna("")
-    Titles = Titles.fillna("")
 
-    data_dict = {}
-    first_warning = True
-    for i in range(len(DOIs)):
-        # Check whether this row has DOI and title information. Communicate to user if it doesn't
-        if DOIs[i] == "" or Titles[i] == "":
-            if first_warning:
-                print("WARNING: rows detected that do not contain both DOI and Title data. Please refer to README.md to understand how this will limit program output.")
-                first_warning = False
-            print(f"In row {i+header_row+1} data was missing. DOI: {DOIs[i]}, Title: {Titles[i]}")
+    # Headers must be in the first or second row
+    rows = csv.reader(StringIO(sample.decode(encode, errors="replace")))
+    for header_index, row in enumerate(itertools.islice(rows, 2)):
+        if colname_DOI in row and colname_title in row:
+            if header_index == 1:
+                print("Headers not found in first row, reading with skiprows=1.")
+            return encode, header_index
 
-        data_dict[i] = {"DOI": DOIs[i],
-                        "Title": Titles[i],
-                        "citationcount_elsevier": None, 
-                        "citationcount_semanticscholar": None, 
-                        "citationcount_openalex": None,
-                        "authors_semanticscholar": None,                # Authors are listed in string format 'LastName,Firstname; LastName...'
-                        "authors_openalex": None,                       # ^
-                        "authorcount_semanticscholar": None,
-                        "authorcount_openalex": None,
-                        "firstlastauthor_openalex": None,
-                        "journal_elsevier": None,
-                        "journal_semanticscholar": None,
-                        "journal_openalex": None,
-                        "institutions_openalex": None,                  # All unique institutions listed in string format 'Institution1,type1,country1; Institution2...'
-                        "authorcountries_openalex": None,               # All unique countries listed in string format 'Country1, Country2...'
-                        "openaccess_openalex": None,
-                        "FWCI_openalex": None,
-                        "citationnormalisedpercentile_openalex": None,
-                        "workscitedcount_openalex": None,
-                        "retracted_openalex": None,
-                        "SJR_scimago": None,
-                        "Hindex_scimago": None,
-                        "journalquartile_scimago": None
-                       }
-        
-    return data_dict, full_dataframe
+    return encode, 0
 
-def get_elsevier_data(elsevier_apikey: str, data_dict: dict, no_cache: bool = False) -> dict:
+def castcolumns_output(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Retrieve citation counts and journal data from the Elsevier API.
+    Cast the columns of an output pd.DataFrame to the dtypes in `OUTPUT_DTYPES`.
 
     Parameters
     ----------
-    elsevier_apikey : str
-        Elsevier API key.
-    data_dict : dict
-        Dictionary containing DOI and title metadata.
+    df : pd.DataFrame
+        Output data, containing the extracted metadata columns and optionally the user's columns.
 
     Returns
     -------
-    dict
-        Updated dictionary with citation counts and journal data added.
+    pd.DataFrame
+        A copy of `df` with typed metadata columns. Columns not in `OUTPUT_DTYPES` that hold mixed
+        Python objects are cast to strings so they can be written to Parquet/Arrow.
+
+    Notes
+    -----
+    Numbers that cannot be parsed (e.g. Scimago's '-' placeholder) become missing values. Scimago
+    writes decimals with a comma, which is replaced with a point before parsing.
     """
-    #Instantiate the elsevier client and cache
-    els_client = instantiateclient_elsevier(elsevier_apikey)
-    cache = ResultsCache("elsevier", cache_disabled=no_cache)
-    c_hits = 0
+    df = df.copy()
+    for col in df.columns:
+        dtype = OUTPUT_DTYPES.get(col)
+        if dtype in ("Int64", "Float64"):
+            values = df[col].map(lambda v: v.replace(',', '.') if isinstance(v, str) else v)
+            values = pd.to_numeric(values, errors='coerce')
+            df[col] = values.round().astype(dtype) if dtype == "Int64" else values.astype(dtype)
+        elif dtype == "boolean":
+            # Booleans read back from a csv are strings, e.g. 'True' or R's 'TRUE'
+            values = df[col].map(lambda v: {'true': True, 'false': False}.get(v.lower()) if isinstance(v, str) else v)
+            df[col] = values.astype(dtype)
+        elif dtype is not None:
+            df[col] = df[col].astype(dtype)
+        elif df[col].dtype == object:
+            df[col] = df[col].astype("string")
+    return df
 
-    #Initialisation of variables for the progress statements to be printed to terminal, using print_progress()
-    total = len(data_dict)
-    proportion = 0.1
+def readprevious_output(output_format: str = "") -> Optional[pd.DataFrame]:
+    """
+    Read the output of a previous run, with metadata columns cast to the dtypes in `OUTPUT_DTYPES`.
+
+    Parameters
+    ----------
+    output_format : str, optional
+        Either "", "parquet" or "arrow". The typed output of this format is preferred
+        over `citation_counter_output.csv` if it exists (default: "").
+
+    Returns
+    -------
+    pd.DataFrame or None
+        The previous output, or None if there is no previous output in the current working directory.
+    """
+    typed_path = Path(f"citation_counter_output.{output_format}")
+    csv_path = Path("citation_counter_output.csv")
+    if output_format and typed_path.exists():
+        print(f"Reading previous output from {typed_path}")
+        if output_format == "parquet":
+            previous = pd.read_parquet(typed_path)
+        else:
+            previous = pyarrow.ipc.open_file(typed_path).read_pandas()
+    elif csv_path.exists():
+        print(f"Reading previous output from {csv_path}")
+        previous = pd.read_csv(csv_path, dtype=str, encoding='utf-8')
+    else:
+        return None
+
+    return castcolumns_output(previous)
+
+class RateLimiter:
+    """
+    Space out requests to an API so that no more than `rate` are made per second. One limiter may be shared by
+    threads, e.g. those of enrichment_service.py, which then make no more than `rate` requests per second together.
+
+    Attributes
+    ----------
+    interval : float
+        Minimum number of seconds between the start of successive requests.
+    """
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until the next request may be made."""
+        # Claim the next slot under the lock, then sleep until it outside the lock
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class LatencyTracker:
+    """
+    Track the latencies of recent successful requests to an API, to decide when to hedge a slow request.
+
+    Attributes
+    ----------
+    latencies : collections.deque
+        Latencies in seconds of the last `window` successful requests.
+    min_samples : int
+        Number of latencies needed before `p95` returns an estimate.
+    max_inflight : int
+        Most requests run in threads at once. No hedge is issued while this many are running.
+    inflight : int
+        Number of requests running in threads, including those whose result is no longer waited for.
+    abandoned : int
+        Number of requests still running when another request to the same row succeeded.
+    """
+    def __init__(self, window: int = 200, min_samples: int = 20, max_inflight: int = 4):
+        self.latencies = collections.deque(maxlen=window)
+        self.min_samples = min_samples
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.abandoned = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        """Record the latency of a successful request."""
+        self.latencies.append(latency)
+
+    def p95(self) -> Optional[float]:
+        """Return the 95th percentile of the recorded latencies, or None if too few have been recorded."""
+        if len(self.latencies) < self.min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+    def start(self) -> bool:
+        """Count a request started in a thread, returning False without counting it if `max_inflight` are running."""
+        with self._lock:
+            if self.inflight >= self.max_inflight:
+                return False
+            self.inflight += 1
+            return True
+
+    def end(self) -> None:
+        """Count a request ended in a thread."""
+        with self._lock:
+            self.inflight -= 1
+
+    def abandon(self) -> None:
+        """Count a request whose result is no longer waited for."""
+        with self._lock:
+            self.abandoned += 1
+
+    def report(self, provider: str) -> None:
+        """Print how many hedged requests to `provider` were abandoned, if any."""
+        if self.abandoned:
+            print(f"{self.abandoned} slow {provider} requests were hedged, and left to time out once the duplicate succeeded.")
+
+def hedgedcall_http(call: Callable, tracker: LatencyTracker, hedge: bool = False,
+                    may_hedge: Callable[[], bool] = lambda: True):
+    """
+    Make a request to an API, optionally issuing a duplicate if it is slower than usual, and return the first result.
+
+    If `hedge` is set and `tracker` has enough samples, a second request is issued once the first has been running
+    for the API's observed 95th percentile latency, and whichever succeeds first is returned. The slower request is
+    left to finish in its thread, so `call` must time out on its own. No hedge is issued while `tracker.max_inflight`
+    requests are running, so slow requests cannot pile up threads.
+
+    Parameters
+    ----------
+    call : callable
+        Function making the request and returning its result. Must be safe to call twice concurrently, and time out.
+    tracker : LatencyTracker
+        Latencies of the API. The latency of a successful request is recorded in it.
+    hedge : bool, optional
+        If True, a slow request is hedged (default: False).
+    may_hedge : callable, optional
+        Called before a duplicate request is issued. If it returns False, e.g. because the API's budget is spent,
+        no duplicate is issued (default: always True).
+
+    Returns
+    -------
+    Any
+        The result of the first successful request.
+
+    Raises
+    ------
+    Exception
+        The exception raised by the last request to fail, if every request failed.
+    """
+    hedge_after = tracker.p95() if hedge else None
+    start = time.monotonic()
+
+    ## Without a hedge, or with too many requests running, make the request in this thread
+    if hedge_after is None or not tracker.start():
+        result = call()
+        tracker.record(time.monotonic() - start)
+        return result
+
+    outcomes = queue.Queue()
+    def attempt(started):
+        try:
+            outcomes.put((True, call(), started))
+        except Exception as e:
+            outcomes.put((False, e, started))
+        finally:
+            tracker.end()
+
+    threading.Thread(target=attempt, args=(start,), daemon=True).start()
+    launched, failed = 1, 0
+    while failed < launched:
+        wait = max(start + hedge_after - time.monotonic(), 0) if hedge_after is not None else None
+        try:
+            succeeded, value, started = outcomes.get(timeout=wait)
+        except queue.Empty:
+            # Hedge, once, if the first request is slower than the 95th percentile
+            if tracker.start():
+                if may_hedge():
+                    threading.Thread(target=attempt, args=(time.monotonic(),), daemon=True).start()
+                    launched += 1
+                else:
+                    tracker.end()
+            hedge_after = None
+            continue
+        if succeeded:
+            tracker.record(time.monotonic() - started)
+            if launched - failed > 1:
+                tracker.abandon()
+            return value
+        failed += 1
+        error = value
+    raise error
+
+def firstname_gender(author: str) -> Optional[str]:
+    """
+    Extract the first name of an author in "Last,First" format, flattened to lower case ASCII for lookup.
+
+    Parameters
+    ----------
+    author : str
+        Author name in "Last,First" format, as written in `firstlastauthor_openalex`.
+
+    Returns
+    -------
+    str or None
+        The first name, or None if the author has no first name.
+    """
+    names = author.split(",")
+    if len(names) < 2:
+        return None
+    first = unicodedata.normalize("NFKD", names[1]).encode("ascii", "ignore").decode("ascii")
+    first = first.strip().lower()
+    return first or None
+
+def isinitials_gender(name: str) -> bool:
+    """
+    Check whether a first name is only initials (e.g. 'j.', 'j.r.' or the placeholder 'x.'), so its gender cannot be inferred.
+
+    Parameters
+    ----------
+    name : str
+        Lower case first name.
+
+    Returns
+    -------
+    bool
+        True if every part of the name is a single letter.
+    """
+    parts = [part for part in re.split(r"[.\s-]+", name) if part]
+    return all(len(part) == 1 for part in parts)
+
+def readnames_gender() -> tuple[dict, dict, dict]:
+    """
+    Read the name tables in name_csvs into hash indexes for lookup.
+
+    Returns
+    -------
+    tuple of (dict, dict, dict)
+        - dict : Lower case name -> (prob.m, prob.w), from CommonNamesDatabase.csv.
+        - dict : Lower case nickname -> list of lower case full names, from nicknames.csv.
+        - dict : Lower case nickname -> gender (0 for male, 1 for female), from nickname.gends.csv.
+    """
+    common = pd.read_csv("name_csvs/CommonNamesDatabase.csv")
+    commonnames = {}
+    for name, prob_m, prob_w in zip(common["name"], common["prob.m"], common["prob.w"]):
+        commonnames.setdefault(str(name).strip().lower(), (float(prob_m), float(prob_w)))
+
+    nicknames = {}
+    with open("name_csvs/nicknames.csv", newline="") as file:
+        for row in csv.reader(file):
+            if row:
+                full_names = [name.strip().lower() for name in row[1:] if name.strip()]
+                nicknames.setdefault(row[0].strip().lower(), []).extend(full_names)
+
+    gends = pd.read_csv("name_csvs/nickname.gends.csv")
+    nicknamegends = {str(name).strip().lower(): int(gend) for name, gend in zip(gends["name"], gends["gend"])}
+
+    return commonnames, nicknames, nicknamegends
+
+def lookupnickname_gender(name: str, commonnames: dict, nicknames: dict, nicknamegends: dict) -> Optional[tuple]:
+    """
+    Infer the gender probabilities of a nickname from the common names it is short for.
+
+    Full names are taken from nicknames.csv and looked up in CommonNamesDatabase.csv. If the nickname's
+    gender is known from nickname.gends.csv, only full names of that gender are used (e.g. 'chris' is
+    matched to 'christopher' but not 'christine').
+
+    Parameters
+    ----------
+    name : str
+        Lower case first name.
+    commonnames : dict
+        Common names index from `readnames_gender`.
+    nicknames : dict
+        Nickname index from `readnames_gender`.
+    nicknamegends : dict
+        Nickname gender index from `readnames_gender`.
+
+    Returns
+    -------
+    tuple of (float, float) or None
+        Mean (prob.m, prob.w) of the matching full names, or None if there are none.
+    """
+    probs = [commonnames[full] for full in nicknames.get(name, []) if full in commonnames]
+    gend = nicknamegends.get(name)
+    if gend is not None:
+        probs = [p for p in probs if (p[1] > p[0]) == (gend == 1)]
+    if not probs:
+        return None
+    return (sum(p[0] for p in probs) / len(probs), sum(p[1] for p in probs) / len(probs))
+
+def loadcache_gender() -> dict:
+    """
+    Load names whose genders were previously inferred, from data/cache/gender-api-names.csv.
+
+    This file is shared with authors_gender.R.
+
+    Returns
+    -------
+    dict
+        Lower case name -> (prob.m, prob.w).
+    """
+    cache_file = Path("data/cache/gender-api-names.csv")
+    if not cache_file.exists():
+        return {}
+    cached = pd.read_csv(cache_file, keep_default_na=False, na_values=[""])
+    cached = cached.dropna(subset=["prob.m", "prob.w"])
+    return {str(name).strip().lower(): (float(prob_m), float(prob_w))
+            for name, prob_m, prob_w in zip(cached["name"], cached["prob.m"], cached["prob.w"])}
+
+def savecache_gender(namegends: dict) -> None:
+    """
+    Save names whose genders have been inferred to data/cache/gender-api-names.csv.
+
+    Parameters
+    ----------
+    namegends : dict
+        Lower case name -> (prob.m, prob.w).
+    """
+    cache_file = Path("data/cache/gender-api-names.csv")
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    # Each writer uses its own temporary file, so concurrent writers never move or read each other's partial files
+    with tempfile.NamedTemporaryFile("w", dir=cache_file.parent, prefix="gender-api-names.", suffix=".tmp",
+                                     delete=False, newline="") as temp_file:
+        try:
+            pd.DataFrame([(name, p[0], p[1]) for name, p in namegends.items()],
+                         columns=["name", "prob.m", "prob.w"]).to_csv(temp_file, index=False)
+        except BaseException:
+            temp_file.close()
+            os.unlink(temp_file.name)
+            raise
+    os.replace(temp_file.name, cache_file)
+
+class NameCache:
+    """
+    Names whose genders were inferred with gender-api.com, loaded once from data/cache/gender-api-names.csv and kept
+    in memory, so processes enriching many small batches (e.g. enrichment_service.py) do not read the file each time.
+
+    One instance may be shared by threads: lookups and additions hold a lock, and the file is rewritten, by one
+    thread at a time, only when names are added.
+
+    Attributes
+    ----------
+    no_cache : bool
+        If True, the file is neither read nor written.
+    """
+    def __init__(self, no_cache: bool = False):
+        self.no_cache = no_cache
+        self._namegends = {} if no_cache else loadcache_gender()
+        self._lock = threading.Lock()
+
+    def lookup(self, names) -> dict:
+        """Return lower case name -> (prob.m, prob.w) for each of `names` in the cache."""
+        with self._lock:
+            return {name: self._namegends[name] for name in names if name in self._namegends}
+
+    def add(self, namegends: dict) -> None:
+        """Add names not yet in the cache, saving the file if there are any."""
+        with self._lock:
+            added = {name: probs for name, probs in namegends.items() if name not in self._namegends}
+            if not added:
+                return
+            self._namegends.update(added)
+            if not self.no_cache:
+                savecache_gender(self._namegends)
+
+def queryapi_gender(names: list, gender_apikey: str, namecache: NameCache, batch_size: int = 100,
+                    rate: float = 1.0, limiter: Optional[RateLimiter] = None) -> dict:
+    """
+    Infer the genders of first names with gender-api.com, querying up to `batch_size` names per request.
+
+    Parameters
+    ----------
+    names : list of str
+        Lower case ASCII first names to query.
+    gender_apikey : str
+        gender-api.com API key.
+    namecache : NameCache
+        Name cache the results of each request are added to.
+    batch_size : int, optional
+        Number of names per request. gender-api.com accepts up to 100 (default: 100).
+    rate : float, optional
+        Maximum number of requests per second, if no `limiter` is given (default: 1).
+    limiter : RateLimiter, optional
+        Limiter to share with other threads, from `warmresources` (default: None, one is created at `rate`).
+
+    Returns
+    -------
+    dict
+        Lower case name -> (prob.m, prob.w) of the queried names. Names the API could not assign a gender are
+        given (-1, -1). Names left unqueried because a request failed, or missing from the response, are left out.
+    """
+    limiter = limiter or RateLimiter(rate)
+    namegends = {}
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        limiter.wait()
+        try:
+            with TraceLog.call('gender-api', doi=batch[0]) as event:
+                response = requests.get("https://gender-api.com/get",
+                                        params={"name": ";".join(batch), "key": gender_apikey}, timeout=30)
+                event["status"], event["bytes"] = response.status_code, len(response.content)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"WARNING: gender-api.com request failed, {len(names) - start} names were not queried: {e}")
+            break
+        if "errno" in data:
+            print(f"WARNING: gender-api.com returned an error, {len(names) - start} names were not queried: "
+                  f"{data.get('errmsg')}")
+            break
+
+        # A single name is returned as one object, multiple names in a list under 'result'. Results are matched
+        # to the queried names by the name they return, as the response may be reordered, deduplicated or short
+        queried = set(batch)
+        for result in data.get("result", [data]):
+            name = str(result.get("name") or "").strip().lower()
+            if name not in queried:
+                continue
+            accuracy = (result.get("accuracy") or 0) / 100
+            if result.get("gender") == "male":
+                namegends[name] = (accuracy, round(1 - accuracy, 2))
+            elif result.get("gender") == "female":
+                namegends[name] = (round(1 - accuracy, 2), accuracy)
+            else:
+                namegends[name] = (-1, -1)
+        missing = [name for name in batch if name not in namegends]
+        if missing:
+            print(f"WARNING: gender-api.com returned no result for {len(missing)} names, which were not cached: "
+                  f"{', '.join(missing[:10])}{' ...' if len(missing) > 10 else ''}")
+
+        namecache.add({name: namegends[name] for name in batch if name in namegends})
+
+    return namegends
+
+## Main functions
+
+def readjson(config_path: str = "config.json") -> dict:
+    """
+    Read configuration values from `config.json`.
+
+    Parameters
+    ----------
+    config_path : str, optional
+        Path of the configuration file (default: "config.json").
+
+    Returns
+    -------
+    dict
+        Dictionary with the following structure::
+
+            {
+                "csv_path": str or list
+                    Path to the CSV file, or a glob or list of paths/globs of several CSV files. List entries
+                    may be {"path": str, "colname_title": str, "colname_DOI": str} to override the column names.
+                "elsevier_apikey": str
+                    Elsevier API key.
+                "colname_title": str
+                    Column name containing titles.
+                "colname_DOI": str
+                    Column name containing DOIs.
+                "year": int
+                    The current year
+                "retain_all_columns": str
+                    Either "" or "True".
+                "no_cache": str
+                    Either "" or "True".
+                "skip_gender": str
+                    Either "" or "True".
+                "output_format": str
+                    Either "", "parquet" or "arrow". Optional, defaults to "".
+                "incremental": str
+                    Either "" or "True". Optional, defaults to "".
+                "cache_limits": dict
+                    Maps cache names to {"max_entries": int, "max_bytes": int}. Optional, defaults to {}.
+                "cache_compression": str
+                    Either "", "zstd", "lz4" or "none". Optional, defaults to "".
+                "gender_engine": str
+                    Either "" (Python) or "R". Optional, defaults to "".
+                "gender_timeout": float or None
+                    Seconds after which authors_gender.R is cancelled. Optional, "" (no timeout) by default.
+                "trace_log": str
+                    Path of a JSON Lines file to trace every provider call to. Optional, "" (no trace) by default.
+                "budgets": dict
+                    Maps API names to {"limit": int, "period": "day", "week" or "month"}. Optional, defaults to {}.
+                "timeouts": dict
+                    Maps 'elsevier', 'semanticscholar' and 'openalex' to {"connect": float, "read": float}.
+                    Optional, missing entries default to PROVIDER_TIMEOUTS.
+                "rates": dict
+                    Maps API names to requests per second. Optional, missing entries default to PROVIDER_RATES.
+                "hedge": str
+                    Either "" or "True". Optional, defaults to "".
+                "openalex_snapshot": str
+                    Directory of a local OpenAlex works snapshot, used instead of the OpenAlex API. Optional, defaults to "".
+                "journal": str
+                    Either "" or "True". Optional, defaults to "".
+            }
+
+    Raises
+    ------
+    FileNotFoundError
+        If `config.json` does not exist.
+    ValueError
+        If a boolean parameter, `year` or `output_format` has an invalid value.
+    """
+
+    #Open the json file
+    try:
+        with open(config_path) as con_file:
+            con = json.load(con_file)
+    except Exception as e:
+        print("ERROR: Make sure there is a file name config.json in this folder. More information:\n")
+        raise
+
+    # Fill in optional parameters that may be missing from older config.json files
+    optional_parameters = {"output_format": "", "incremental": "", "cache_limits": {}, "cache_compression": "", "gender_engine": "", "gender_timeout": "", "trace_log": "", "budgets": {}, "timeouts": {}, "hedge": "", "openalex_snapshot": "", "journal": "", "rates": {}}
+    for key, default in optional_parameters.items():
+        con.setdefault(key, default)
+
+    # Check appropriate input for boolean inputs, and the numeric input of year
+    for bool_parameter in ['retain_all_columns', 'no_cache', 'skip_gender', 'incremental', 'hedge', 'journal']:
+        checkjsonbool(con[bool_parameter], bool_parameter)
+    if not con["year"].isnumeric():
+        raise ValueError(f"Invalid value for 'year': {con['year']}. Expected a number.")
+    else:
+        con['year'] = int(con['year'])
+    if con["output_format"] not in ("", "parquet", "arrow"):
+        raise ValueError(f"Invalid value for 'output_format': {con['output_format']!r}. Expected '', 'parquet' or 'arrow'.")
+    if con["gender_timeout"]:
+        try:
+            con["gender_timeout"] = float(con["gender_timeout"])
+        except ValueError:
+            raise ValueError(f"Invalid value for 'gender_timeout': {con['gender_timeout']!r}. Expected a number of seconds.")
+    else:
+        con["gender_timeout"] = None
+    if con["gender_engine"] not in ("", "R"):
+        raise ValueError(f"Invalid value for 'gender_engine': {con['gender_engine']!r}. Expected '' or 'R'.")
+    if isinstance(con["csv_path"], list):
+        for entry in con["csv_path"]:
+            if not (isinstance(entry, str) or (isinstance(entry, dict) and isinstance(entry.get("path"), str)
+                                               and set(entry) <= {"path", "colname_title", "colname_DOI"})):
+                raise ValueError(f"Invalid entry in 'csv_path': {entry!r}. Expected a path, or a dictionary with 'path' and optionally 'colname_title' and 'colname_DOI'.")
+    elif not isinstance(con["csv_path"], str):
+        raise ValueError(f"Invalid value for 'csv_path': {con['csv_path']!r}. Expected a path, or a list of paths.")
+    if isbatch(con["csv_path"]) and (con["incremental"] or (con["gender_engine"] and not con["skip_gender"])):
+        raise ValueError("'incremental', and 'gender_engine' unless 'skip_gender' is set, cannot be used with several csv files in 'csv_path'.")
+    for db_name, limits in con["cache_limits"].items():
+        if not set(limits) <= {"max_entries", "max_bytes"} or not all(isinstance(v, int) for v in limits.values()):
+            raise ValueError(f"Invalid value for 'cache_limits' of {db_name!r}: {limits!r}. Expected integer 'max_entries' and/or 'max_bytes'.")
+    for provider, timeout in con["timeouts"].items():
+        if provider not in PROVIDER_TIMEOUTS or not set(timeout) <= {"connect", "read"} \
+                or not all(isinstance(v, (int, float)) and v > 0 for v in timeout.values()):
+            raise ValueError(f"Invalid value for 'timeouts' of {provider!r}: {timeout!r}. Expected one of {list(PROVIDER_TIMEOUTS)} with positive 'connect' and/or 'read' seconds.")
+    con["timeouts"] = {provider: {**default, **con["timeouts"].get(provider, {})} for provider, default in PROVIDER_TIMEOUTS.items()}
+    for provider, rate in con["rates"].items():
+        if provider not in PROVIDER_RATES or not isinstance(rate, (int, float)) or rate <= 0:
+            raise ValueError(f"Invalid value for 'rates' of {provider!r}: {rate!r}. Expected one of {list(PROVIDER_RATES)} with a positive number of requests per second.")
+    con["rates"] = {**PROVIDER_RATES, **con["rates"]}
+
+    # Extract values and store in dictionary to return. Should have really used a function and loop for these.
+    data = {}
+    for key in con.keys():
+        data[key] = con[key]
+
+    # User communication
+    print("\n** Inputs read! Your inputs are: **")
+    for key in data.keys():
+        print(f'{key}: {data[key]}')
+    print("")
+
+    return data
+
+def readargs(args: Optional[list] = None) -> argparse.Namespace:
+    """
+    Read command line arguments, which control how the input is split across processes.
+
+    Parameters
+    ----------
+    args : list of str, optional
+        Arguments to parse. Defaults to `sys.argv`.
+
+    Returns
+    -------
+    argparse.Namespace
+        Namespace with the attributes `shard_index`, `shard_count`, `merge`, `workers` and `dry_run`.
+    """
+    parser = argparse.ArgumentParser(description="Extract metadata on the journal articles in the csv given in config.json.")
+    parser.add_argument("--shard-index", type=int, default=None,
+                        help="Index of the shard of rows to enrich, from 0 to shard-count - 1.")
+    parser.add_argument("--shard-count", type=int, default=None,
+                        help="Total number of shards the rows are split into.")
+    parser.add_argument("--merge", action="store_true",
+                        help="Merge the outputs of shard-count shards, then query Scimago and output the results.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Enrich the rows in this many worker processes, then merge their outputs.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print the number of requests each API would be sent, given the current caches, and an estimated run time, without making any requests.")
+    parsed = parser.parse_args(args)
+
+    # Check the combination of arguments
+    if parsed.workers is not None and (parsed.workers < 1 or parsed.shard_count is not None):
+        parser.error("--workers must be at least 1, and cannot be used with --shard-count")
+    if parsed.shard_count is not None:
+        if parsed.shard_count < 1:
+            parser.error("--shard-count must be at least 1")
+        if not parsed.merge and (parsed.shard_index is None or not 0 <= parsed.shard_index < parsed.shard_count):
+            parser.error("--shard-index must be given, from 0 to shard-count - 1, unless --merge is used")
+    elif parsed.shard_index is not None or parsed.merge:
+        parser.error("--shard-index and --merge require --shard-count")
+
+    return parsed
+
+def readcsv(csv_path: str, colname_title: str, colname_DOI: str, retain_all_columns: bool = False) -> tuple[dict, pd.DataFrame]:
+    """
+    Read a CSV file and extract metadata, DOIs, and titles.
+
+    The encoding and header row are sniffed from the start of the file so that it is only parsed once.
+
+    Parameters
+    ----------
+    csv_path : str
+        Path to the CSV file.
+    colname_title : str
+        Column name containing paper titles.
+    colname_DOI : str
+        Column name containing DOIs.
+    retain_all_columns : bool, optional
+        If True, every column of the CSV is loaded. Otherwise only the title and DOI columns are (default: False).
+
+    Returns
+    -------
+    tuple of (dict, pandas.DataFrame)
+        - dict : Dictionary containing DOI, title, and metadata fields for each paper.
+        - DataFrame : The user-provided CSV loaded into a pandas DataFrame.
+
+    Raises
+    ------
+    Exception
+        If the CSV file cannot be read or the specified columns are not found.
+    """
+    ## Extract pd.Series object of the Titles and DOIs of all papers in the user provided csv
+    try:
+        csv_file = Path(csv_path)
+        encode, header_index = sniffcsv(csv_file, colname_title, colname_DOI)
+        header_row = header_index + 1
+
+        # Only the title and DOI columns are needed unless all columns are retained in the output.
+        # The pyarrow engine applies skip_rows through the header argument, so header is used instead of skiprows.
+        usecols = None if retain_all_columns else [colname_title, colname_DOI]
+        full_dataframe = pd.read_csv(csv_file, encoding=encode, header=header_index, usecols=usecols,
+                                     engine="pyarrow" if pyarrow is not None else "c")
+
+        DOIs = full_dataframe[colname_DOI]
+        Titles = full_dataframe[colname_title]
+    except Exception as e:
+        print("ERROR: Something went wrong when interacting with your csv. Please ensure your csv path is correct, and that you've correctly entered your title and DOI column headers. These headers must also be in the first or second row of your csv. Here's more information to help figure out what went wrong:\n")
+        raise
+
+    ## Communcate to user successful extraction
+    print("** Successfully read Title and DOI information from your provided CSV **\n")
+
+    ## Reformat the pd.Series object to be contained within a dictionary
+    # Convert missing values to empty strings
+    DOIs = DOIs.fillna("")
+    Titles = Titles.fillna("")
+
+    data_dict = {}
+    first_warning = True
+    for i in range(len(DOIs)):
+        # Check whether this row has DOI and title information. Communicate to user if it doesn't
+        if DOIs[i] == "" or Titles[i] == "":
+            if first_warning:
+                print("WARNING: rows detected that do not contain both DOI and Title data. Please refer to README.md to understand how this will limit program output.")
+                first_warning = False
+            print(f"In row {i+header_row+1} data was missing. DOI: {DOIs[i]}, Title: {Titles[i]}")
+
+        data_dict[i] = emptyrow(DOIs[i], Titles[i])
+        
+    return data_dict, full_dataframe
+
+def isbatch(csv_path) -> bool:
+    """Return whether `csv_path` from config.json names several csv files: a list, or a glob."""
+    return isinstance(csv_path, list) or glob.has_magic(csv_path)
+
+def readbatch(csv_path, colname_title: str, colname_DOI: str, retain_all_columns: bool = False) -> list:
+    """
+    Read every csv file named by `csv_path`, each with its own column names.
+
+    Parameters
+    ----------
+    csv_path : str or list
+        A glob, or a list of paths/globs. List entries may be dictionaries with 'path', and optionally
+        'colname_title' and 'colname_DOI' to override the column names for those files.
+    colname_title : str
+        Default name of the title column.
+    colname_DOI : str
+        Default name of the DOI column.
+    retain_all_columns : bool, optional
+        If True, all columns of each csv are kept for output (default: False).
+
+    Returns
+    -------
+    list of dict
+        One dictionary per file, in order, with the keys 'path', 'output_name' (e.g.
+        'citation_counter_output_refs2024'), 'data_dict' and 'dataframe' (as returned by `readcsv`).
+
+    Raises
+    ------
+    FileNotFoundError
+        If a glob matches no files.
+    """
+    ## Expand the globs, keeping the first mention of each file
+    files = {}
+    for entry in (csv_path if isinstance(csv_path, list) else [csv_path]):
+        entry = {"path": entry} if isinstance(entry, str) else entry
+        matches = sorted(glob.glob(entry["path"])) if glob.has_magic(entry["path"]) else [entry["path"]]
+        if not matches:
+            raise FileNotFoundError(f"No csv files match {entry['path']!r}")
+        for path in matches:
+            files.setdefault(os.path.normpath(path), (entry.get("colname_title", colname_title), entry.get("colname_DOI", colname_DOI)))
+
+    ## Read each file, naming its output after it. Files with the same name in different folders are numbered
+    inputs = []
+    output_names = set()
+    for path, (title, doi) in files.items():
+        print(f"Reading {path}")
+        data_dict, dataframe = readcsv(path, title, doi, retain_all_columns)
+        output_name = f"citation_counter_output_{Path(path).stem}"
+        while output_name in output_names:
+            output_name += "_"
+        output_names.add(output_name)
+        inputs.append({"path": path, "output_name": output_name, "data_dict": data_dict, "dataframe": dataframe})
+
+    return inputs
+
+def dedupe_batch(inputs: list) -> tuple[dict, list]:
+    """
+    Combine the rows of several csv files into one dictionary with one row per unique DOI, so each DOI is enriched once.
+
+    DOIs are compared ignoring case and surrounding spaces. Rows without a DOI are kept as separate rows.
+
+    Parameters
+    ----------
+    inputs : list of dict
+        Files, as returned by `readbatch`.
+
+    Returns
+    -------
+    tuple of (dict, list)
+        - dict : Dictionary of the unique rows, to be enriched.
+        - list : For each file, the index in the first dictionary of each of its rows.
+    """
+    data_dict = {}
+    unique = {}
+    batch_rows = []
+    for file in inputs:
+        rows = []
+        for i in range(len(file["data_dict"])):
+            doi, title = file["data_dict"][i]["DOI"], file["data_dict"][i]["Title"]
+            key = doi.strip().lower()
+            if key and key in unique:
+                # Elsevier searches by title, so keep a title for the DOI if any file has one
+                if not data_dict[unique[key]]["Title"]:
+                    data_dict[unique[key]]["Title"] = title
+            else:
+                data_dict[len(data_dict)] = emptyrow(doi, title)
+                if key:
+                    unique[key] = len(data_dict) - 1
+            rows.append(unique[key] if key else len(data_dict) - 1)
+        batch_rows.append(rows)
+
+    total = sum(len(rows) for rows in batch_rows)
+    print(f"** {total} rows read from {len(inputs)} csv files, of which {len(data_dict)} are unique and will be enriched **\n")
+
+    return data_dict, batch_rows
+
+def output_batch(data_dict: dict, inputs: list, batch_rows: list, retain_all_columns: bool, output_format: str = "") -> None:
+    """
+    Write one output per csv file, copying the enriched data of each unique row to every file containing it.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of the enriched unique rows, from `dedupe_batch`.
+    inputs : list of dict
+        Files, as returned by `readbatch`.
+    batch_rows : list
+        For each file, the index in `data_dict` of each of its rows, from `dedupe_batch`.
+    retain_all_columns : bool
+        If True, extracted data columns are added to the original user data. Otherwise, only extracted data is output.
+    output_format : str, optional
+        Either "", "parquet" or "arrow" (default: "").
+    """
+    for file, rows in zip(inputs, batch_rows):
+        # Each file keeps its own spelling of the DOI and Title
+        file_dict = {i: dict(data_dict[row], DOI=file["data_dict"][i]["DOI"], Title=file["data_dict"][i]["Title"])
+                     for i, row in enumerate(rows)}
+        output_csv(file_dict, file["dataframe"], retain_all_columns, file["output_name"])
+        if output_format:
+            output_typed(file_dict, file["dataframe"], retain_all_columns, output_format, output_name=file["output_name"])
+
+def get_elsevier_data(elsevier_apikey: str, data_dict: dict, no_cache: bool = False,
+                      timeout: dict = PROVIDER_TIMEOUTS["elsevier"], hedge: bool = False,
+                      els_client: Optional[ElsClient] = None, journal: Optional[RunJournal] = None,
+                      cache: Optional[ResultsCache] = None, rate: float = PROVIDER_RATES["elsevier"],
+                      limiter: Optional[RateLimiter] = None) -> dict:
+    """
+    Retrieve citation counts and journal data from the Elsevier API.
+
+    Parameters
+    ----------
+    elsevier_apikey : str
+        Elsevier API key.
+    data_dict : dict
+        Dictionary containing DOI and title metadata.
+    no_cache : bool, optional
+        If True, the cache is neither read nor written (default: False).
+    timeout : dict, optional
+        Dictionary with the connect and read timeouts in seconds, under 'connect' and 'read'.
+    hedge : bool, optional
+        If True, a request slower than the 95th percentile is duplicated, and the first response used (default: False).
+    els_client : ElsClient, optional
+        Client to reuse, from `warmresources`. If None, a client is created and its connection tested.
+    journal : RunJournal, optional
+        Journal each completed row is recorded in. Rows it has recorded for Elsevier are skipped (default: None).
+    cache : ResultsCache, optional
+        Elsevier cache to reuse, from `warmresources`. If None, the cache is opened.
+    rate : float, optional
+        Searches per second, if no `limiter` is given (default: PROVIDER_RATES["elsevier"]).
+    limiter : RateLimiter, optional
+        Limiter of the searches to reuse, from `warmresources`, so concurrent calls share the rate (default: None, one is created at `rate`).
+
+    Returns
+    -------
+    dict
+        Updated dictionary with citation counts and journal data added.
+    """
+    #Instantiate the elsevier client and cache
+    els_client = els_client or instantiateclient_elsevier(elsevier_apikey)
+    cache = cache or ResultsCache("elsevier", cache_disabled=no_cache)
+    c_hits = 0
+    latency = LatencyTracker()
+    #Searches are spaced out to the rate, by default 1 second apart, as elsapy spaces them
+    limiter = limiter or RateLimiter(rate)
+
+    #Budget of requests for the API key. Rows are queried most cited first, so a spent budget leaves out the least cited
+    ledger = BudgetLedger()
+    deferred = ledger.deferred('elsevier')
+    over_budget = []
+
+    #Rows completed by an interrupted run are not searched again
+    journal = journal or RunJournal()
+    resumed = journal.rows('elsevier')
+
+    #Failed searches are retried with backoff after the other rows, rather than holding them up
+    retries = RetryQueue('elsevier')
+    def search_elsevier(i, doi, title, attempt=1):
+        limiter.wait()
+        with TraceLog.call('elsevier', i, doi, attempt=attempt) as event:
+            entries, event["bytes"] = hedgedcall_http(lambda: searchtitle_elsevier(els_client, cleantitle_elsevier(title, '()'), timeout),
+                                                     latency, hedge, may_hedge=lambda: ledger.take('elsevier', elsevier_apikey) == 1)
+        return entries
+
+    #Initialisation of variables for the progress statements to be printed to terminal, using print_progress()
+    total = len(data_dict)
+    proportion = 0.1
 
     #Message that the elsevier extraction is beginning
     print("** Extraction of data with Elsevier API is now beginning **")
     print("A message will be printed below every time a 10% portion of the total papers to analyse is completed.")
 
-    for i in range(len(data_dict)):
-        ## Extract title and DOI. Both must exist for the following code to work. Skip this loop iteration if either was not in the user csv
-        doi = data_dict[i]["DOI"]
-        title = data_dict[i]["Title"]
-        if doi == "" or title == "":
-            proportion = print_progress(i, proportion, total, 'Elsevier', c_hits)
+    for j, i in enumerate(prioritise_rows(data_dict, deferred, 'citationcount_openalex', 'elsevier')):
+        ## Extract title and DOI. Both must exist for the following code to work. Skip this loop iteration if either was not in the user csv
+        doi = data_dict[i]["DOI"]
+        title = data_dict[i]["Title"]
+        if doi == "" or title == "" or i in resumed:
+            proportion = print_progress(j, proportion, total, 'Elsevier', c_hits)
+            continue
+
+        ## Check cache first
+        if cache.has(doi):
+            with TraceLog.call('elsevier', i, doi, cache='hit') as event:
+                entries = searchentries_elsevier(cache.get(doi))
+                event["bytes"] = cache.last_nbytes
+            c_hits += 1
+        else:
+            # Defer the row to the next run if the budget of requests is spent
+            if not ledger.take('elsevier', elsevier_apikey):
+                over_budget.append(doi)
+                proportion = print_progress(j, proportion, total, 'Elsevier', c_hits)
+                continue
+
+            #Search for a paper with a title check by ensuring the DOI matches. Failed searches (e.g. due to special characters in the title) are retried later.
+            try:
+                entries = search_elsevier(i, doi, title)
+            except Exception as e:
+                retries.push(i, doi, e)
+                proportion = print_progress(j, proportion, total, 'Elsevier', c_hits)
+                continue
+
+        #Cache the search results after successful execution
+        cache.set(doi, entries)
+        data_dict = addsearch_elsevier(data_dict, i, doi, entries)
+        journal.record('elsevier', i, data_dict[i])
+
+        proportion = print_progress(j, proportion, total, 'Elsevier', c_hits)
+
+    #Retry the failed searches
+    if len(retries):
+        print(f"Retrying {len(retries)} failed Elsevier searches")
+    for i, doi, attempt in retries.drain():
+        if not ledger.take('elsevier', elsevier_apikey):
+            over_budget.append(doi)
+            continue
+        try:
+            entries = search_elsevier(i, doi, data_dict[i]["Title"], attempt)
+        except Exception as e:
+            retries.push(i, doi, e)
+            continue
+        cache.set(doi, entries)
+        data_dict = addsearch_elsevier(data_dict, i, doi, entries)
+        journal.record('elsevier', i, data_dict[i])
+
+    cache.save_to_disk()
+    updatebudget(ledger, 'elsevier', data_dict, deferred, over_budget)
+    ledger.defer('elsevier', retries.report())
+    latency.report('elsevier')
+    return data_dict
+
+def get_semanticscholar_data(data_dict: dict, no_cache: bool = False,
+                             timeout: dict = PROVIDER_TIMEOUTS["semanticscholar"], hedge: bool = False,
+                             journal: Optional[RunJournal] = None, cache: Optional[ResultsCache] = None,
+                             cache_authors: Optional[ResultsCache] = None) -> dict:
+    """
+    Retrieve citation counts, journal information, and author metadata from the Semantic Scholar API.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary containing DOI, title, and existing metadata.
+    no_cache : bool, optional
+        If True, the cache is neither read nor written (default: False).
+    timeout : dict, optional
+        Connect and read timeouts in seconds, under 'connect' and 'read'.
+    hedge : bool, optional
+        If True, a request slower than the 95th percentile is duplicated, and the first response used (default: False).
+    journal : RunJournal, optional
+        Journal each completed row is recorded in. Rows it has recorded for Semantic Scholar are skipped (default: None).
+    cache : ResultsCache, optional
+        Semantic Scholar paper cache to reuse, from `warmresources`. If None, the cache is opened.
+    cache_authors : ResultsCache, optional
+        Semantic Scholar author paper cache to reuse, from `warmresources`. If None, the cache is opened.
+
+    Returns
+    -------
+    dict
+        Updated dictionary with semantic scholar citation counts, journal, and author data added.
+    """
+    #Message that the semnatic scholar extraction is beginning
+    print("** Extraction of data with Semantic Scholar API is now beginning **")
+    print("A message will be printed below every time a 10% portion of the total papers to analyse is completed.")
+    print("Rows previously identified with a warning, because they did not contain one or both entries of DOI and/or Title for a paper will be skipped again.")
+
+    # Recent version of SemanticScholar doesn't like the publicationVenue arg or references so skip them
+    backup_fields_to_query = Paper.FIELDS.copy()
+    fields_to_remove = ['references',
+        'references.abstract',
+        'references.authors',
+        'references.citationCount',
+        'references.citationStyles',
+        'references.corpusId',
+        'references.externalIds',
+        'references.fieldsOfStudy',
+        'references.influentialCitationCount',
+        'references.isOpenAccess',
+        'references.journal',
+        'references.openAccessPdf',
+        'references.paperId',
+        'references.publicationDate',
+        'references.publicationTypes',
+        'references.publicationVenue',
+        'references.referenceCount',
+        'references.s2FieldsOfStudy',
+        'references.title',
+        'references.url',
+        'references.venue',
+        'references.year']
+    for field in fields_to_remove:
+        backup_fields_to_query.remove(field)
+
+    #Instantiate the SemanticScholar object and cache
+    sch = SemanticScholar(timeout=httpx.Timeout(timeout["read"], connect=timeout["connect"]))
+    cache = cache or ResultsCache("semanticscholar", cache_disabled=no_cache)
+    cache_authors = cache_authors or ResultsCache("semanticscholar_authors", cache_disabled=no_cache)
+    c_hits = 0
+    latency = LatencyTracker()
+
+    #Budget of requests. Rows are queried most cited first, so a spent budget leaves out the least cited
+    ledger = BudgetLedger()
+    deferred = ledger.deferred('semanticscholar')
+    over_budget = []
+
+    #Rows completed by an interrupted run are not queried again
+    journal = journal or RunJournal()
+    resumed = journal.rows('semanticscholar')
+
+    #Failed requests are retried with backoff after the other rows, rather than holding them up
+    retries = RetryQueue('semanticscholar')
+    def getpaper_semanticscholar(i, doi, attempt=1):
+        try:
+            with TraceLog.call('semanticscholar', i, doi, attempt=attempt):
+                paper_result = hedgedcall_http(lambda: sch.get_paper(doi), latency, hedge,
+                                               may_hedge=lambda: ledger.take('semanticscholar') == 1)
+        except ObjectNotFoundException:
+            raise
+        except Exception:
+            # Tries to query without missing fields, which is another request from the budget
+            if not ledger.take('semanticscholar'):
+                raise
+            with TraceLog.call('semanticscholar', i, doi, attempt=attempt):
+                paper_result = sch.get_paper(doi, fields=backup_fields_to_query)
+        return paper_result
+
+    #Variables for the progress statements to be printed to terminal, using print_progress()
+    total = len(data_dict)
+    proportion = 0.1
+
+    for j, i in enumerate(prioritise_rows(data_dict, deferred, ('citationcount_openalex', 'citationcount_elsevier'), 'semanticscholar')):
+        ## Check DOI, skip iteration if not present.
+        doi = data_dict[i]['DOI']
+        if doi == "" or i in resumed:
+            proportion = print_progress(j, proportion, total, 'Semantic Scholar', c_hits)
             continue
 
         ## Check cache first
         if cache.has(doi):
-            search = cache.get(doi)
+            with TraceLog.call('semanticscholar', i, doi, cache='hit') as event:
+                paper_result = cache.get(doi)
+                event["bytes"] = cache.last_nbytes
+            c_hits += 1
+        else:
+            # Defer the row to the next run if the budget of requests is spent
+            if not ledger.take('semanticscholar'):
+                over_budget.append(doi)
+                proportion = print_progress(j, proportion, total, 'Semantic Scholar', c_hits)
+                continue
+
+            ## Extraction of data
+            #Extract paper result with semantic scholar. Failed requests are retried later
+            try:
+                paper_result = getpaper_semanticscholar(i, doi)
+            except Exception as e:
+                retries.push(i, doi, e)
+                proportion = print_progress(j, proportion, total, 'Semantic Scholar', c_hits)
+                continue
+            
+            #Cache the paper_result after successful retrieval
+            cache.set(doi, paper_result)
+        
+        data_dict = addpaper_semanticscholar(data_dict, i, doi, paper_result, sch, cache_authors, ledger)
+        journal.record('semanticscholar', i, data_dict[i])
+
+        #Progress statements to be printed to the terminal
+        proportion = print_progress(j, proportion, total, 'Semantic Scholar', c_hits)
+
+    #Retry the failed requests
+    if len(retries):
+        print(f"Retrying {len(retries)} failed Semantic Scholar requests")
+    for i, doi, attempt in retries.drain():
+        if not ledger.take('semanticscholar'):
+            over_budget.append(doi)
+            continue
+        try:
+            paper_result = getpaper_semanticscholar(i, doi, attempt)
+        except Exception as e:
+            retries.push(i, doi, e)
+            continue
+        cache.set(doi, paper_result)
+        data_dict = addpaper_semanticscholar(data_dict, i, doi, paper_result, sch, cache_authors, ledger)
+        journal.record('semanticscholar', i, data_dict[i])
+
+    cache.save_to_disk()
+    cache_authors.save_to_disk()
+    updatebudget(ledger, 'semanticscholar', data_dict, deferred, over_budget)
+    ledger.defer('semanticscholar', retries.report())
+    latency.report('semanticscholar')
+    return data_dict
+
+def get_openalex_data(data_dict: dict, no_cache: bool = False,
+                      timeout: dict = PROVIDER_TIMEOUTS["openalex"], hedge: bool = False,
+                      journal: Optional[RunJournal] = None, cache: Optional[ResultsCache] = None) -> dict:
+    """
+    Extracts citation, authorship, and publication metadata for each paper in
+    the dataset using the OpenAlex API.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of paper metadata. Must include at least 'DOI' for each paper.
+    no_cache : bool, optional
+        If True, the cache is neither read nor written (default: False).
+    timeout : dict, optional
+        Connect and read timeouts in seconds, under 'connect' and 'read'.
+    hedge : bool, optional
+        If True, a request slower than the 95th percentile is duplicated, and the first response used (default: False).
+    journal : RunJournal, optional
+        Journal each completed row is recorded in. Rows it has recorded for OpenAlex are skipped (default: None).
+    cache : ResultsCache, optional
+        OpenAlex cache to reuse, from `warmresources`. If None, the cache is opened.
+
+    Returns
+    -------
+    dict
+        Updated dictionary containing additional OpenAlex-derived metadata.
+    """
+    # Initialisation of variables for progress updates and cache
+    cache = cache or ResultsCache("openalex", cache_disabled=no_cache)
+    c_hits = 0
+    latency = LatencyTracker()
+    ledger = BudgetLedger()
+    deferred = ledger.deferred('openalex')
+    over_budget = []
+    retries = RetryQueue('openalex')
+    journal = journal or RunJournal()
+    resumed = journal.rows('openalex')
+    total = len(data_dict)
+    proportion = 0.1
+
+    def getwork(i, DOI, attempt=1):
+        with TraceLog.call('openalex', i, DOI, attempt=attempt) as event:
+            w, event["bytes"] = hedgedcall_http(lambda: getwork_openalex('https://doi.org/' + DOI, timeout), latency, hedge,
+                                                may_hedge=lambda: ledger.take('openalex') == 1)
+        return w
+
+    print("** Extraction of data with OpenAlex API is now beginning **")
+    print("A message will be printed below every time a 10% portion of the "
+          "total papers to analyse is completed.")
+
+    # Iterate over all papers
+    for j, i in enumerate(prioritise_rows(data_dict, deferred)):
+        DOI = data_dict[i]["DOI"]
+
+        # Skip paper if no DOI stored, or if it was completed by an interrupted run
+        if DOI == "" or i in resumed:
+            proportion = print_progress(j, proportion, total, 'OpenAlex', c_hits)
+            continue
+
+        ## Check cache first
+        if cache.has(DOI):
+            with TraceLog.call('openalex', i, DOI, cache='hit') as event:
+                w = cache.get(DOI)
+                event["bytes"] = cache.last_nbytes
             c_hits += 1
         else:
-            # Start new search
-            ## Using the title and DOI informatino to extract citation count and journal
-            title = cleantitle_elsevier(title, '()')
+            # Defer the row to the next run if the budget of requests is spent
+            if not ledger.take('openalex'):
+                over_budget.append(DOI)
+                proportion = print_progress(j, proportion, total, 'OpenAlex', c_hits)
+                continue
+
+            # Attempt to query OpenAlex by DOI. Failed requests are retried later
+            try:
+                w = getwork(i, DOI)
+                # Cache the successful result
+                cache.set(DOI, w)
+            except Exception as e:
+                data_dict[i]['authors_openalex'] = "X.,X."
+                data_dict[i]["firstlastauthor_openalex"] = "X.,X.; X.,X."
+                retries.push(i, DOI, e)
+                proportion = print_progress(j, proportion, total, 'OpenAlex', c_hits)
+                continue
+
+        data_dict = addwork_openalex(data_dict, i, w)
+        journal.record('openalex', i, data_dict[i])
+
+        proportion = print_progress(j, proportion, total, 'OpenAlex', c_hits)
+
+    # Retry the failed requests
+    if len(retries):
+        print(f"Retrying {len(retries)} failed OpenAlex requests")
+    for i, DOI, attempt in retries.drain():
+        if not ledger.take('openalex'):
+            over_budget.append(DOI)
+            continue
+        try:
+            w = getwork(i, DOI, attempt)
+        except Exception as e:
+            retries.push(i, DOI, e)
+            continue
+        cache.set(DOI, w)
+        data_dict = addwork_openalex(data_dict, i, w)
+        journal.record('openalex', i, data_dict[i])
+
+    cache.save_to_disk()
+    updatebudget(ledger, 'openalex', data_dict, deferred, over_budget)
+    ledger.defer('openalex', retries.report())
+    latency.report('openalex')
+    return data_dict
+
+def get_openalexsnapshot_data(data_dict: dict, snapshot_dir: str) -> dict:
+    """
+    Extracts the same metadata as `get_openalex_data` from a local OpenAlex works snapshot, without network access.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of paper metadata. Must include at least 'DOI' for each paper.
+    snapshot_dir : str
+        Directory of the snapshot, containing data/works. The DOI index is built or updated first if needed.
+
+    Returns
+    -------
+    dict
+        Updated dictionary containing additional OpenAlex-derived metadata.
+    """
+    print("** Extraction of data from the OpenAlex snapshot is now beginning **")
+    snapshot = OpenAlexSnapshot(snapshot_dir)
+    files = snapshot.build_index()
+    print(f"{files} new or changed snapshot files indexed. The index holds {snapshot.size()} works.")
+
+    ## Look up every DOI at once, so each snapshot file is read at most once
+    start = time.perf_counter()
+    works = snapshot.get_many(data_dict[i]["DOI"] for i in range(len(data_dict)))
+    snapshot.close()
+    latency = (time.perf_counter() - start) / max(len(works), 1)
+
+    for i in range(len(data_dict)):
+        DOI = data_dict[i]["DOI"]
+        if DOI == "":
+            continue
+        w = works.get(DOI.lower())
+        TraceLog.record('openalex_snapshot', i, DOI, 'miss', status='ok' if w is not None else 'NotFound',
+                        latency=latency)
+        if w is None:
+            data_dict[i]['authors_openalex'] = "X.,X."
+            data_dict[i]["firstlastauthor_openalex"] = "X.,X.; X.,X."
+            continue
+        data_dict = addwork_openalex(data_dict, i, w)
+
+    print(f"{len(works)} of {len(data_dict)} papers found in the snapshot.")
+    print("** Extraction of data from the OpenAlex snapshot is complete! **\n")
+    return data_dict
+
+def loadindex_scimago(year: int, no_cache: bool = False) -> tuple[dict, dict]:
+    """
+    Download the Scimago tables up to `year` - 1 and index them by ISSN and journal name.
+
+    Parameters
+    ----------
+    year : int
+        The reference year. Tables from ``year - 1`` back to 2000 are used.
+    no_cache : bool, optional
+        If True, every table is downloaded in full rather than revalidated (default: False).
+
+    Returns
+    -------
+    tuple of (dict, dict)
+        Normalised ISSN -> row and cleaned journal name -> row, as returned by `indexjournals_scimago`.
+    """
+    print("Pulling Scimago data from online, collating into a dataframe...")
+    df = collectall_scimago(year - 1, no_cache=no_cache)
+    print("Scimago data retrieved!")
+    return indexjournals_scimago(df)
+
+def get_scimago_data(data_dict: dict, year: int, no_cache: bool = False, index: Optional[tuple] = None) -> dict:
+    """
+    Retrieve and enrich journal metadata from the SCImago Journal Rank (SJR) database.
+
+    This function downloads the most recent SCImago statistics, subsets them for the 
+    specified year minus one, computes quartile thresholds for each field, and attempts 
+    to enrich each journal entry in `data_dict` with its SJR, h-index, and quartile. 
+    Journals are matched by ISSN (OpenAlex, then Elsevier), falling back to cleaned
+    versions of their names across multiple sources (Elsevier, OpenAlex, Semantic Scholar).
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of extracted metadata for a set of journals. Each entry must include
+        journal names from at least one source under keys such as 
+        ``'journal_elsevier'``, ``'journal_semanticscholar'``, or ``'journal_openalex'``.
+    year : int
+        The reference year for filtering SCImago data. The function uses statistics from
+        ``year - 1`` (e.g., if year=2024, the function loads 2023 data).
+    no_cache : bool, optional
+        If True, disables use of the local cache and forces retrieval of fresh data.
+        Default is False.
+    index : tuple of (dict, dict), optional
+        Scimago index to reuse, from `loadindex_scimago`. If None, the Scimago tables are downloaded.
+
+    Returns
+    -------
+    dict
+        Updated `data_dict` where available journals have been enriched with:
+        
+        - ``SJR_openalex`` : float or None
+            SCImago Journal Rank (SJR) score.
+        - ``Hindex_openalex`` : float or None
+            Journal h-index.
+        - ``journalquartile_scimago`` : str or None
+            Quartile classification ('Q1', 'Q2', 'Q3', 'Q4') based on field-specific 
+            percentile thresholds.
+    """
+    # Initialisation of variables for progress updates and cache
+    #cache = ResultsCache("openalex", cache_disabled=no_cache)
+    #c_hits = 0
+    total = len(data_dict)
+    proportion = 0.1
+
+    ## User communication
+    print("** Extraction of data with Scimago API is now beginning **")
+    print("A message will be printed below every time a 10% portion of the "
+          "total papers to analyse is completed.")
+
+    ## Import the most recent Scimago statistics, indexed by ISSN, and by name for journals without a matching ISSN
+    issn_index, title_index = index or loadindex_scimago(year, no_cache)
+
+    ## For each journal/source attempt to review the SJR and h-index
+    for i in range(len(data_dict)):
+        # Look up the journal by ISSN first, from OpenAlex then Elsevier
+        record = None
+        for issns in (data_dict[i]['issn_openalex'], data_dict[i]['issn_elsevier']):
+            for issn in (issns or '').split(','):
+                record = record or issn_index.get(reformatissn_scimago(issn))
+
+        # Otherwise, by the standardised journal name from Elsevier, then OpenAlex, then Semantic Scholar
+        if record is None:
+            for journal in ('journal_elsevier', 'journal_openalex', 'journal_semanticscholar'):
+                record = record or title_index.get(reformatjournal_scimago(data_dict[i][journal]))
+
+        if record is not None:
+            data_dict = addjournalinfo_scimago(data_dict, i, record)
+
+        proportion = print_progress(i, proportion, total, 'Scimago')
+
+    return data_dict
+
+def split_incremental(data_dict: dict, previous: Optional[pd.DataFrame], redo: set = frozenset()) -> tuple[dict, dict, list]:
+    """
+    Fill rows of `data_dict` from the output of a previous run, and collect the new or changed rows that need enriching.
+
+    Rows are matched on their DOI and Title together, so a row whose DOI or Title has changed is enriched again.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of all rows, as returned by `readcsv`.
+    previous : pd.DataFrame or None
+        Output of a previous run, as returned by `readprevious_output`. If None, every row is new.
+    redo : set, optional
+        DOIs to enrich again even if they are in `previous`, e.g. rows deferred by `BudgetLedger` (default: none).
+
+    Returns
+    -------
+    tuple of (dict, dict, list)
+        - dict : `data_dict`, with the rows found in `previous` filled in.
+        - dict : Dictionary of the new or changed rows, re-indexed from 0 so it can be passed to the `get_*_data` functions.
+        - list : Index in `data_dict` of each row in the second dictionary.
+    """
+    ## Index the previous rows by (DOI, Title), keeping the first copy of any duplicates
+    previous_rows = {}
+    if previous is not None:
+        columns = [col for col in data_dict[0].keys() if col in previous.columns] if data_dict else []
+        previous = previous[columns].astype(object).where(previous[columns].notna(), None)
+        for row in previous.to_dict('records'):
+            key = (row.get("DOI") or "", row.get("Title") or "")
+            previous_rows.setdefault(key, row)
+
+    ## Fill rows found in the previous output, collect the rest
+    update_dict = {}
+    update_rows = []
+    for i in range(len(data_dict)):
+        key = (data_dict[i]["DOI"], data_dict[i]["Title"])
+        if key in previous_rows and key[0] not in redo:
+            data_dict[i].update(previous_rows[key])
+            data_dict[i]["DOI"], data_dict[i]["Title"] = key
+        else:
+            update_dict[len(update_rows)] = data_dict[i]
+            update_rows.append(i)
+
+    print(f"** Incremental run: {len(data_dict) - len(update_rows)} rows reused from the previous output, "
+          f"{len(update_rows)} new or changed rows to enrich **\n")
+
+    return data_dict, update_dict, update_rows
+
+def merge_rows(data_dict: dict, update_dict: dict, update_rows: list) -> dict:
+    """
+    Merge enriched rows back into `data_dict` in input order.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of all rows, as returned by `readcsv` or `split_incremental`.
+    update_dict : dict
+        Dictionary of enriched rows, as returned by `get_all_data` or `merge_shards`.
+    update_rows : list
+        Index in `data_dict` of each row in `update_dict`.
+
+    Returns
+    -------
+    dict
+        `data_dict` with the enriched rows merged in.
+    """
+    for j, i in enumerate(update_rows):
+        data_dict[i] = update_dict[j]
+    return data_dict
+
+def get_all_data(data_dict: dict, d: dict, scimago: bool = True, warm: Optional[dict] = None,
+                 journal: Optional[RunJournal] = None) -> dict:
+    """
+    Enrich every row of `data_dict` with each API in turn.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary containing DOI and title metadata, as returned by `readcsv`.
+    d : dict
+        User inputs, as returned by `readjson`.
+    scimago : bool, optional
+        If False, the Scimago stage is skipped, e.g. for shards that are merged before Scimago is queried (default: True).
+    warm : dict, optional
+        Clients, caches and indexes to reuse across calls, from `warmresources` (default: None, create them).
+    journal : RunJournal, optional
+        Journal of the run. Rows it recorded before an interruption are restored, its done stages are
+        skipped, and each stage is marked done in it as it completes (default: None).
+
+    Returns
+    -------
+    dict
+        Updated dictionary with data from every API added.
+    """
+    if not data_dict:
+        print("** There are no rows to enrich **\n")
+        return data_dict
+    journal = journal or RunJournal()
+    data_dict = journal.restore(data_dict)
+
+    # OpenAlex is queried first, so that Elsevier and Semantic Scholar can query the most cited rows first
+    warm = warm or {}
+    caches = warm.get("caches", {})
+    if not journal.done('openalex'):
+        if d["openalex_snapshot"]:
+            data_dict = get_openalexsnapshot_data(data_dict, d["openalex_snapshot"])
+        else:
+            data_dict = get_openalex_data(data_dict, d["no_cache"], d["timeouts"]["openalex"], d["hedge"], journal,
+                                          caches.get("openalex"))
+        journal.finish('openalex', data_dict)
+    if not journal.done('elsevier'):
+        data_dict = get_elsevier_data(d["elsevier_apikey"], data_dict, d["no_cache"], d["timeouts"]["elsevier"], d["hedge"],
+                                      warm.get("els_client"), journal, caches.get("elsevier"), d["rates"]["elsevier"],
+                                      warm.get("limiters", {}).get("elsevier"))
+        journal.finish('elsevier', data_dict)
+    if not journal.done('semanticscholar'):
+        data_dict = get_semanticscholar_data(data_dict, d["no_cache"], d["timeouts"]["semanticscholar"], d["hedge"], journal,
+                                             caches.get("semanticscholar"), caches.get("semanticscholar_authors"))
+        journal.finish('semanticscholar', data_dict)
+    if scimago and not journal.done('scimago'):
+        data_dict = get_scimago_data(data_dict, d["year"], d["no_cache"], warm.get("scimago_index"))
+        journal.finish('scimago', data_dict)
+
+    return data_dict
+
+def openjournal(data_dict: dict, d: dict, stage: str = "") -> RunJournal:
+    """
+    Open the journal of a run enriching `data_dict` with the settings in `d`, or a disabled journal if
+    `journal` is not set in config.json.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of the rows to enrich.
+    d : dict
+        User inputs, as returned by `readjson`.
+    stage : str, optional
+        Distinguishes runs over the same rows that should not resume each other, e.g. each shard (default: "").
+
+    Returns
+    -------
+    RunJournal
+        The journal.
+    """
+    if not d["journal"]:
+        return RunJournal()
+    settings = {key: d[key] for key in ("year", "openalex_snapshot", "skip_gender", "gender_engine")}
+    return RunJournal(RunJournal.fingerprint(data_dict, dict(settings, stage=stage)))
+
+def warmresources(d: dict) -> dict:
+    """
+    Create the clients, caches, indexes and name tables used by `get_all_data` and `get_gender_data`, so that
+    processes enriching many small batches (e.g. enrichment_service.py) only create them once.
+
+    Parameters
+    ----------
+    d : dict
+        User inputs, as returned by `readjson`.
+
+    Returns
+    -------
+    dict
+        Dictionary with the keys 'els_client' (ElsClient), 'caches' (cache name -> ResultsCache),
+        'limiters' (API name -> RateLimiter, for Elsevier and gender-api.com), 'scimago_index' (from
+        `loadindex_scimago`), 'names' (from `readnames_gender`) and 'namecache' (NameCache).
+    """
+    caches = {db_name: ResultsCache(db_name, cache_disabled=d["no_cache"])
+              for db_name in ("openalex", "elsevier", "semanticscholar", "semanticscholar_authors")}
+    return {"els_client": instantiateclient_elsevier(d["elsevier_apikey"]),
+            "caches": caches,
+            "limiters": {provider: RateLimiter(d["rates"][provider]) for provider in ("elsevier", "gender-api")},
+            "scimago_index": loadindex_scimago(d["year"], d["no_cache"]),
+            "names": readnames_gender(),
+            "namecache": NameCache(d["no_cache"])}
+
+def plan_requests(data_dict: dict, d: dict) -> dict:
+    """
+    Count the requests each API would be sent to enrich `data_dict`, given the current contents of the caches.
+
+    No network requests are made and the caches are not modified. The Semantic Scholar author and
+    gender-api.com counts depend on results that are not cached yet, so they are given as a range:
+    the lower bound counts only what is known from cached results, the upper bound assumes every
+    uncached paper needs an author request and two uncached names.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary containing DOI and title metadata, as returned by `readcsv`.
+    d : dict
+        User inputs, as returned by `readjson`.
+
+    Returns
+    -------
+    dict
+        API name -> (minimum requests, maximum requests).
+    """
+    no_cache = d["no_cache"]
+    caches = {name: ResultsCache(name, cache_disabled=no_cache)
+              for name in ("elsevier", "semanticscholar", "semanticscholar_authors", "openalex")}
+    dois = [data_dict[i]["DOI"] for i in range(len(data_dict))]
+
+    ## Elsevier is searched by title, Semantic Scholar and OpenAlex by DOI
+    elsevier = sum(1 for i, doi in enumerate(dois) if doi != "" and data_dict[i]["Title"] != "" and not caches["elsevier"].has(doi))
+    semanticscholar = [doi for doi in dois if doi != "" and not caches["semanticscholar"].has(doi)]
+    openalex = [doi for doi in dois if doi != "" and not caches["openalex"].has(doi)]
+
+    ## Author papers are requested for the first author of each paper, known only for cached papers
+    author_ids = set()
+    for doi in dois:
+        if doi != "" and caches["semanticscholar"].has(doi):
+            authors = caches["semanticscholar"].get(doi)['authors']
+            if authors:
+                author_ids.add(authors[0]['authorId'])
+    authors_known = sum(1 for author_id in author_ids if not caches["semanticscholar_authors"].has(author_id))
+
+    ## Names are known only for papers with a cached OpenAlex result
+    names_known, names_unknown = 0, 0
+    if not d["skip_gender"]:
+        names = set()
+        for doi in dois:
+            if doi != "" and caches["openalex"].has(doi):
+                w = caches["openalex"].get(doi)
+                positions = {authorship.get('author_position'): reformatauthor_openalex((authorship.get('author') or {}).get('display_name') or "X.,X.")
+                             for authorship in w.get('authorships', [])}
+                names.update(firstname_gender(positions.get(position, 'X.,X.')) for position in ('first', 'last'))
+        names.discard(None)
+        namegends = {} if no_cache else loadcache_gender()
+        commonnames, nicknames, nicknamegends = readnames_gender()
+        names_known = sum(1 for name in names if name not in namegends and not isinitials_gender(name)
+                          and name not in commonnames
+                          and lookupnickname_gender(name, commonnames, nicknames, nicknamegends) is None)
+        names_unknown = 2 * len(openalex)
+
+    plan = {"elsevier": (elsevier, elsevier),
+            "semanticscholar": (len(semanticscholar), len(semanticscholar)),
+            "semanticscholar_authors": (authors_known, authors_known + len(semanticscholar)),
+            "openalex": (len(openalex), len(openalex)),
+            "scimago": (max(d["year"] - 2000, 0),) * 2,
+            "gender-api": (-(-names_known // 100), -(-(names_known + names_unknown) // 100))}
+    if d["skip_gender"] or d["gender_engine"]:
+        plan["gender-api"] = (0, 0)
+    if d["openalex_snapshot"]:
+        plan["openalex"] = (0, 0)
 
-            #Search for a paper with a title check by ensuring the DOI matches. When errors arise, papers are skipped (due to special characters in the title).
-            search = ElsSearch("TITLE({})".format(title), 'scopus')
-            try:
-                search.execute(els_client)
-            except:
-                proportion = print_progress(i, proportion, total, 'Elsevier', c_hits)
-                continue
+    ## User communication
+    ledger = BudgetLedger()
+    print("** Dry run: requests that would be made, given the current caches **")
+    print(f"Rows to enrich: {len(data_dict)}")
+    total_min, total_max = 0.0, 0.0
+    for name, (low, high) in plan.items():
+        seconds_min, seconds_max = low / d["rates"][name], high / d["rates"][name]
+        total_min, total_max = total_min + seconds_min, total_max + seconds_max
+        count = f"{low}" if low == high else f"{low}-{high}"
+        left = ledger.remaining(name, {"elsevier": d["elsevier_apikey"], "gender-api": d["gender-api.com_apikey"]}.get(name, ""))
+        unit = "names" if name == "gender-api" else "requests"
+        budget = "" if left is None else f", {left} {unit} left in this {ledger.budgets[name]['period']}'s budget"
+        print(f"{name:<25} {count:>15} requests, ~{seconds_min / 60:.1f}-{seconds_max / 60:.1f} min{budget}")
+    print(f"Estimated wall time: {total_min / 3600:.1f}-{total_max / 3600:.1f} hours")
+    if d["gender_engine"] == "R" and not d["skip_gender"]:
+        print("Requests made by authors_gender.R are not included.")
+    print("")
 
-        #Cache the search object after successful execution
-        cache.set(doi, search)
+    return plan
 
-        #Use ElsSearch to extract citation count and journal. Author information can't be found reliably, due to how poor AbsDoc and Fulldoc perform.
-        for result in search.results:
-            if 'prism:doi' in result.keys():
-                if result['prism:doi'] == doi:
-                    #Get citation count
-                    data_dict[i]['citationcount_elsevier'] = int(result.get('citedby-count')) if result.get('citedby-count') else None
-                    #Get journal
-                    if 'prism:publicationName' in result.keys():
-                        data_dict[i]['journal_elsevier'] = result.get('prism:publicationName')
+def sharerates(rates: dict, shard_count: int) -> dict:
+    """
+    Return each shard's share of `rates`, so that shards running at once make no more requests than one process would.
 
-        proportion = print_progress(i, proportion, total, 'Elsevier', c_hits)
+    Parameters
+    ----------
+    rates : dict
+        API name -> requests per second, from `readjson`.
+    shard_count : int
+        Number of shards.
 
-    cache.save_to_disk()
-    return data_dict
+    Returns
+    -------
+    dict
+        API name -> requests per second of one shard.
+    """
+    return {provider: rate / shard_count for provider, rate in rates.items()}
 
-def get_semanticscholar_data(data_dict: dict, no_cache: bool = False) -> dict:
+def select_shard(data_dict: dict, rows: list, shard_index: int, shard_count: int) -> tuple[dict, list]:
     """
-    Retrieve citation counts, journal information, and author metadata from the Semantic Scholar API.
+    Select one contiguous shard of the rows to enrich.
 
     Parameters
     ----------
     data_dict : dict
-        Dictionary containing DOI, title, and existing metadata.
+        Dictionary of the rows to enrich, indexed from 0.
+    rows : list
+        Index in the full input of each row in `data_dict`.
+    shard_index : int
+        Index of the shard to select, from 0 to `shard_count` - 1.
+    shard_count : int
+        Total number of shards.
 
     Returns
     -------
-    dict
-        Updated dictionary with semantic scholar citation counts, journal, and author data added.
+    tuple of (dict, list)
+        - dict : Dictionary of the rows in the shard, re-indexed from 0.
+        - list : Index in the full input of each row in the shard.
     """
-    #Message that the semnatic scholar extraction is beginning
-    print("** Extraction of data with Semantic Scholar API is now beginning **")
-    print("A message will be printed below every time a 10% portion of the total papers to analyse is completed.")
-    print("Rows previously identified with a warning, because they did not contain one or both entries of DOI and/or Title for a paper will be skipped again.")
+    start = shard_index * len(data_dict) // shard_count
+    end = (shard_index + 1) * len(data_dict) // shard_count
+    shard_dict = {j: data_dict[i] for j, i in enumerate(range(start, end))}
 
-    # Recent version of SemanticScholar doesn't like the publicationVenue arg or references so skip them
-    backup_fields_to_query = Paper.FIELDS.copy()
-    fields_to_remove = ['references',
-        'references.abstract',
-        'references.authors',
-        'references.citationCount',
-        'references.citationStyles',
-        'references.corpusId',
-        'references.externalIds',
-        'references.fieldsOfStudy',
-        'references.influentialCitationCount',
-        'references.isOpenAccess',
-        'references.journal',
-        'references.openAccessPdf',
-        'references.paperId',
-        'references.publicationDate',
-        'references.publicationTypes',
-        'references.publicationVenue',
-        'references.referenceCount',
-        'references.s2FieldsOfStudy',
-        'references.title',
-        'references.url',
-        'references.venue',
-        'references.year']
-    for field in fields_to_remove:
-        backup_fields_to_query.remove(field)
+    print(f"** Shard {shard_index + 1} of {shard_count}: enriching {end - start} of {len(data_dict)} rows **\n")
 
-    #Instantiate the SemanticScholar object and cache
-    sch = SemanticScholar()
-    cache = ResultsCache("semanticscholar", cache_disabled=no_cache)
-    cache_authors = ResultsCache("semanticscholar_authors", cache_disabled=no_cache)
-    c_hits = 0
+    return shard_dict, rows[start:end]
 
-    #Variables for the progress statements to be printed to terminal, using print_progress()
-    total = len(data_dict)
-    proportion = 0.1
+def shard_path(shard_index: int, shard_count: int) -> Path:
+    """Return the path of the file that shard `shard_index` of `shard_count` is written to."""
+    return Path("data/shards") / f"shard_{shard_index}_of_{shard_count}.pkl"
 
-    for i in range(len(data_dict)):
-        ## Check DOI, skip iteration if not present.
-        doi = data_dict[i]['DOI']
-        if doi == "":
-            proportion = print_progress(i, proportion, total, 'Semantic Scholar', c_hits)
-            continue
+def output_shard(shard_dict: dict, shard_rows: list, shard_index: int, shard_count: int) -> None:
+    """
+    Write an enriched shard to `data/shards` so it can be merged by `merge_shards`.
 
-        ## Check cache first
-        if cache.has(doi):
-            paper_result = cache.get(doi)
-            c_hits += 1
-        else:
-            ## Extraction of data
-            #Extract paper result with semantic scholar, skip if an error is thrown when retrieving it
-            try:
-                paper_result = sch.get_paper(doi)
-            except Exception as e:
-                try:
-                    # Tries to query without missing fields
-                    paper_result = sch.get_paper(doi, fields=backup_fields_to_query)
-                except ObjectNotFoundException as e:
-                    proportion = print_progress(i, proportion, total, 'Semantic Scholar', c_hits)
-                    continue
-                except httpx.ReadTimeout as e:
-                    proportion = print_progress(i, proportion, total, 'Semantic Scholar', c_hits)
-                    print("WARNING: Semantic Scholar API request timed out. Check your internet connection.")
-                    continue
-                except Exception as e:
-                    proportion = print_progress(i, proportion, total, 'Semantic Scholar', c_hits)
-                    import traceback
-                    traceback.print_exc()
-                    continue
-            
-            #Cache the paper_result after successful retrieval
-            cache.set(doi, paper_result)
-        
-        #Extract citation count. Method is looking at the papers author1 has published, and matching according to title. Take max citation count. JUSTIFICATION FOR THIS PROCESS: This is more complicated than the semanticscholar documentation may suggest. Semantic scholar can give two copies of the same paper, with different citation counts, eg: 'Local Transformed Features for Epileptic Seizure Detection in EEG Signal.' Type that into https://www.semanticscholar.org and see what you get. This is managed by taking the first author, seeing all the papers they're authored on, and then taking the one with a matching title and greatest citation count.        
-        citation_count = None
-        authors = paper_result['authors']
-        #Some papers, erroneously, may not have a listed author in Semantic Scholar, eg: https://www.semanticscholar.org/paper/EEG-Signal-Research-for-Identification-of-Epilepsy/140ee25d5ca5dbdf65dafc57f422f00366137bc8
-        #If there are authors, check through author1 papers to manage paper duplication problems leading to erroneous citation counts:
-        if authors:
-            author1_papers = getauthorpapers_semanticscholar(sch, authors[0]['authorId'], cache=cache_authors)
-            for author1_paper in author1_papers.raw_data:
-                if 'DOI' in author1_paper['externalIds'].keys():                                # A couple things to note here. Because sometimes the titles extracted have strange characters, I'm only checking to see if the DOI.lower() matches. .lower() is needed because sometimes pre-prints have a letter of lower case and they get chosen instead of the peer-reviewed published paper, which has the citations.
-                    if author1_paper['externalIds']['DOI'].lower() == doi.lower():
-                        if citation_count != None:
-                            citation_count = max(citation_count, author1_paper['citationCount'])
-                        else:
-                            citation_count = author1_paper['citationCount']
-        #If there aren't any authors, assume no paper duplication problems:
-        else:
-            citation_count = paper_result['citationCount']
-        #Save the citation count
-        data_dict[i]['citationcount_semanticscholar'] = citation_count
-    
-        #Extract journal information
-        if paper_result['venue']:
-            data_dict[i]['journal_semanticscholar'] = paper_result['venue']
-        
-        #Extract author information, including authors and author count
-        if paper_result['authors']:
-            authors = paper_result['authors']
-            authors = [a['name'] for a in paper_result['authors']]
-            num_authors = len(authors)
-            data_dict[i]['authorcount_semanticscholar'] = num_authors
-            authors = reformatauthors_semanticscholar(authors)
-            data_dict[i]['authors_semanticscholar'] = authors
-        else:
-            data_dict[i]['authors_semanticscholar'] = 'X.,X.'
+    Parameters
+    ----------
+    shard_dict : dict
+        Dictionary of the enriched rows in the shard.
+    shard_rows : list
+        Index in the full input of each row in the shard.
+    shard_index : int
+        Index of the shard.
+    shard_count : int
+        Total number of shards.
 
-        #Progress statements to be printed to the terminal
-        proportion = print_progress(i, proportion, total, 'Semantic Scholar', c_hits)
+    Returns
+    -------
+    None
+    """
+    path = shard_path(shard_index, shard_count)
+    path.parent.mkdir(parents=True, exist_ok=True)
 
-    cache.save_to_disk()
-    cache_authors.save_to_disk()
-    return data_dict
+    # Write to a temporary file first, so a merge never reads a partially written shard
+    temp_file = path.with_suffix('.tmp')
+    with open(temp_file, 'wb') as file:
+        pickle.dump({"rows": shard_rows, "data": shard_dict}, file)
+    os.replace(temp_file, path)
 
-def get_openalex_data(data_dict: dict, no_cache: bool = False) -> dict:
+    print(f"** Shard {shard_index + 1} of {shard_count} has been successfully output to '{path}'! **\n")
+
+    return None
+
+def merge_shards(shard_count: int) -> tuple[dict, list]:
     """
-    Extracts citation, authorship, and publication metadata for each paper in
-    the dataset using the OpenAlex API.
+    Combine the outputs of every shard, in input order.
 
     Parameters
     ----------
-    data_dict : dict
-        Dictionary of paper metadata. Must include at least 'DOI' for each paper.
+    shard_count : int
+        Total number of shards.
 
     Returns
     -------
-    dict
-        Updated dictionary containing additional OpenAlex-derived metadata.
+    tuple of (dict, list)
+        - dict : Dictionary of the enriched rows of every shard, indexed from 0.
+        - list : Index in the full input of each row in the dictionary.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the output of any shard is missing.
     """
-    # Initialisation of variables for progress updates and cache
-    cache = ResultsCache("openalex", cache_disabled=no_cache)
-    c_hits = 0
-    total = len(data_dict)
-    proportion = 0.1
+    missing = [str(shard_path(k, shard_count)) for k in range(shard_count) if not shard_path(k, shard_count).exists()]
+    if missing:
+        raise FileNotFoundError(f"Cannot merge shards, the following shard outputs are missing: {', '.join(missing)}")
 
-    print("** Extraction of data with OpenAlex API is now beginning **")
-    print("A message will be printed below every time a 10% portion of the "
-          "total papers to analyse is completed.")
+    # Shards are contiguous slices of the input, so concatenating them in shard order keeps input order
+    merged_dict = {}
+    merged_rows = []
+    for k in range(shard_count):
+        with open(shard_path(k, shard_count), 'rb') as file:
+            shard = pickle.load(file)
+        for j in range(len(shard["rows"])):
+            merged_dict[len(merged_rows)] = shard["data"][j]
+            merged_rows.append(shard["rows"][j])
 
-    # Iterate over all papers
-    for i in range(len(data_dict)):
-        DOI = data_dict[i]["DOI"]
+    print(f"** Merged {len(merged_rows)} rows from {shard_count} shards **\n")
 
-        # Skip paper if no DOI stored
-        if DOI == "":
-            proportion = print_progress(i, proportion, total, 'OpenAlex', c_hits)
-            continue
+    return merged_dict, merged_rows
 
-        ## Check cache first
-        if cache.has(DOI):
-            w = cache.get(DOI)
-            c_hits += 1
-        else:
-            # Attempt to query OpenAlex by DOI
-            try:
-                DOI_link = 'https://doi.org/' + DOI
-                w = pa.Works()[DOI_link]
-                # Cache the successful result
-                cache.set(DOI, w)
-            except Exception:
-                data_dict[i]['authors_openalex'] = "X.,X."
-                data_dict[i]["firstlastauthor_openalex"] = "X.,X.; X.,X."
-                proportion = print_progress(i, proportion, total, 'OpenAlex', c_hits)
-                continue
+def run_workers(workers: int) -> None:
+    """
+    Enrich the input in `workers` shards, each in its own process running `citation_counter.py`.
 
-        ## Author associated data
-        authors = []
-        first = 'X.,X.'
-        last = 'X.,X.'
-        countries = set()
-        institutions = set()
-
-        for authorship in w.get('authorships', []):
-            # Author name
-            name = reformatauthor_openalex(
-                (authorship.get('author') or {})
-                .get('display_name') or "X.,X."
-            )
-            authors.append(name)
-
-            # First and last authors
-            position = authorship.get('author_position')
-            if position == 'first':
-                first = name
-            elif position == 'last':
-                last = name
-
-            # Countries
-            for country in authorship.get('countries', []) or []:
-                countries.add(country)
-
-            # Institutions
-            for institution in authorship.get('institutions', []) or []:
-                ins = f"{institution.get('display_name')},{institution.get('type')},{institution.get('country_code')}"
-                institutions.add(ins)
-
-        data_dict[i]["authorcountries_openalex"] = ", ".join(list(countries)) if countries else None
-        data_dict[i]["institutions_openalex"] = "; ".join(list(institutions)) if institutions else None
-        data_dict[i]["authorcount_openalex"] = len(authors) if authors else None
-        data_dict[i]["authors_openalex"] = "; ".join(authors) if authors else None
-        data_dict[i]["firstlastauthor_openalex"] = first + "; " + last
-
-        ## Citing information
-        data_dict[i]["citationcount_openalex"] = w.get('cited_by_count')
-        data_dict[i]["workscitedcount_openalex"] = len(w.get('referenced_works') or [])
-        data_dict[i]["FWCI_openalex"] = w.get('fwci')
-        citation_normalised_percentile = w.get('citation_normalized_percentile') or {}
-        data_dict[i]["citationnormalisedpercentile_openalex"] = citation_normalised_percentile.get('value')
-
-        ## Publishing information
-        primary_location = w.get('primary_location') or {}
-        source = primary_location.get('source') or {}
-        data_dict[i]["journal_openalex"] = source.get('display_name')
-        openaccess = w.get('open_access') or {}
-        data_dict[i]["openaccess_openalex"] = openaccess.get('is_oa')
-        data_dict[i]["retracted_openalex"] = w.get('is_retracted')
-
-        proportion = print_progress(i, proportion, total, 'OpenAlex', c_hits)
+    Parameters
+    ----------
+    workers : int
+        Number of worker processes, and so shards.
 
-    cache.save_to_disk()
-    return data_dict
+    Returns
+    -------
+    None
 
-def get_scimago_data(data_dict: dict, year: int, no_cache: bool = False) -> dict:
+    Raises
+    ------
+    RuntimeError
+        If any worker process fails.
     """
-    Retrieve and enrich journal metadata from the SCImago Journal Rank (SJR) database.
+    # Remove shard outputs left by an earlier run, so they cannot be merged by mistake
+    for k in range(workers):
+        shard_path(k, workers).unlink(missing_ok=True)
+
+    print(f"** Starting {workers} worker processes **\n")
+    processes = [subprocess.Popen([sys.executable, "citation_counter.py",
+                                   "--shard-index", str(k), "--shard-count", str(workers)])
+                 for k in range(workers)]
+    failed = [k for k, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        raise RuntimeError(f"Worker processes for shards {failed} failed. Re-run them with --shard-index and "
+                           f"--shard-count {workers}, then merge with --shard-count {workers} --merge.")
 
-    This function downloads the most recent SCImago statistics, subsets them for the 
-    specified year minus one, computes quartile thresholds for each field, and attempts 
-    to enrich each journal entry in `data_dict` with its SJR, h-index, and quartile. 
-    Journals are matched using cleaned versions of their names across multiple sources 
-    (Elsevier, Semantic Scholar, OpenAlex).
+    return None
+
+def get_gender_data(data_dict: dict, gender_apikey: str, no_cache: bool = False, names_tables: Optional[tuple] = None,
+                    rate: float = PROVIDER_RATES["gender-api"], namecache: Optional[NameCache] = None,
+                    limiter: Optional[RateLimiter] = None) -> dict:
+    """
+    Infer the probability that the first and last author's first names are male or female.
+
+    Names are looked up, in order, in the name cache (data/cache/gender-api-names.csv), the common
+    names database, and the nickname tables. Remaining names are queried with gender-api.com in batches.
 
     Parameters
     ----------
     data_dict : dict
-        Dictionary of extracted metadata for a set of journals. Each entry must include
-        journal names from at least one source under keys such as 
-        ``'journal_elsevier'``, ``'journal_semanticscholar'``, or ``'journal_openalex'``.
-    year : int
-        The reference year for filtering SCImago data. The function uses statistics from
-        ``year - 1`` (e.g., if year=2024, the function loads 2023 data).
+        Dictionary of extracted metadata, including 'firstlastauthor_openalex'.
+    gender_apikey : str
+        gender-api.com API key.
     no_cache : bool, optional
-        If True, disables use of the local cache and forces retrieval of fresh data.
-        Default is False.
+        If True, the name cache is neither read nor written (default: False).
+    names_tables : tuple, optional
+        Name tables to reuse, from `readnames_gender`. If None, they are read from name_csvs.
+    rate : float, optional
+        Requests per second made to gender-api.com, if no `limiter` is given (default: PROVIDER_RATES["gender-api"]).
+    namecache : NameCache, optional
+        Name cache to reuse, from `warmresources`. If None, it is read from data/cache/gender-api-names.csv.
+    limiter : RateLimiter, optional
+        Limiter of the requests to gender-api.com to reuse, from `warmresources` (default: None, one is created at `rate`).
 
     Returns
     -------
     dict
-        Updated `data_dict` where available journals have been enriched with:
-        
-        - ``SJR_openalex`` : float or None
-            SCImago Journal Rank (SJR) score.
-        - ``Hindex_openalex`` : float or None
-            Journal h-index.
-        - ``journalquartile_scimago`` : str or None
-            Quartile classification ('Q1', 'Q2', 'Q3', 'Q4') based on field-specific 
-            percentile thresholds.
+        Updated dictionary with 'first_prob_male', 'first_prob_female', 'last_prob_male' and
+        'last_prob_female' added. Probabilities are -1 where the gender could not be inferred with
+        sufficient certainty, and None where the author has no first name.
     """
-    # Initialisation of variables for progress updates and cache
-    #cache = ResultsCache("openalex", cache_disabled=no_cache)
-    #c_hits = 0
-    total = len(data_dict)
-    proportion = 0.1
+    print("** Inference of first and last author genders is now beginning **")
 
-    ## User communication
-    print("** Extraction of data with Scimago API is now beginning **")
-    print("A message will be printed below every time a 10% portion of the "
-          "total papers to analyse is completed.")
+    ## Extract the first names of the first and last authors of each paper
+    first_last = []
+    for i in range(len(data_dict)):
+        authors = (data_dict[i]["firstlastauthor_openalex"] or "").split("; ")
+        first_last.append((firstname_gender(authors[0]), firstname_gender(authors[-1])))
+    names = {name for pair in first_last for name in pair if name is not None}
+
+    ## Look up each unique name: initials, then the cache, common names and nicknames
+    namecache = namecache or NameCache(no_cache)
+    namegends = namecache.lookup(names)
+    commonnames, nicknames, nicknamegends = names_tables or readnames_gender()
+    c_hits = sum(1 for name in names if name in namegends)
+    remaining = []
+    for name in sorted(names):
+        if name in namegends:
+            continue
+        if isinitials_gender(name):
+            namegends[name] = (-1, -1)
+        elif name in commonnames:
+            namegends[name] = commonnames[name]
+        elif lookupnickname_gender(name, commonnames, nicknames, nicknamegends) is not None:
+            namegends[name] = lookupnickname_gender(name, commonnames, nicknames, nicknamegends)
+        else:
+            remaining.append(name)
+
+    print(f"Unique names: {len(names)}, of which {c_hits} were found in the cache, "
+          f"{len(names) - c_hits - len(remaining)} in the name tables and {len(remaining)} remain for gender-api.com")
+
+    ## Spend the gender-api.com budget, counted in names, on names deferred by an earlier run, then the most frequent
+    ledger = BudgetLedger()
+    deferred = ledger.deferred('gender-api')
+    frequency = collections.Counter(name for pair in first_last for name in pair)
+    remaining.sort(key=lambda name: (name not in deferred, -frequency[name]))
+    granted = ledger.take('gender-api', gender_apikey, len(remaining))
+    if granted < len(remaining):
+        budget = ledger.budgets['gender-api']
+        print(f"WARNING: The gender-api budget of {budget['limit']} names per {budget['period']} is spent. "
+              f"{len(remaining) - granted} names were deferred and will be queried first in the next run.")
+
+    ## Query gender-api.com for the remaining names. The name cache is saved as names are added
+    if granted:
+        namegends.update(queryapi_gender(remaining[:granted], gender_apikey, namecache, rate=rate, limiter=limiter))
+
+    # Names left without a result, because the budget is spent or a request failed, are queried first in the next run
+    unanswered = [name for name in remaining if name not in namegends]
+    ledger.resume('gender-api', deferred & (names - set(unanswered)))
+    ledger.defer('gender-api', unanswered)
+
+    ## Assign probabilities to each paper
+    for i, (first, last) in enumerate(first_last):
+        first_probs = namegends.get(first, (None, None))
+        last_probs = namegends.get(last, (None, None))
+        data_dict[i]["first_prob_male"], data_dict[i]["first_prob_female"] = first_probs
+        data_dict[i]["last_prob_male"], data_dict[i]["last_prob_female"] = last_probs
+
+    print("** Inference of first and last author genders is complete! **\n")
 
-    ## Import the most recent Scimago statistics as a pd.Dataframe
-    print("Pulling Scimago data from online, collating into a dataframe...")
-    df = collectall_scimago(year - 1)
-    print("Scimago data retrieved!")
+    return data_dict
 
-    ## Create a list of the stored journals. Clean strings are the keys, values are the original strings for lookup
-    journals = {}
-    for journal in df['Title']:
-        journals[reformatjournal_scimago(journal)] = journal
+def collate_output(data_dict: dict, all_user_data: pd.DataFrame, retain_all_columns: bool) -> pd.DataFrame:
+    """
+    Collate extracted data into the pd.DataFrame that is output.
 
-    ## For each journal/source attempt to review the SJR and h-index
-    for i in range(len(data_dict)):
-        # Extract and standardise the associated journal
-        el_journal = reformatjournal_scimago(data_dict[i]['journal_elsevier'])
-        ss_journal = reformatjournal_scimago(data_dict[i]['journal_semanticscholar'])
-        oa_journal = reformatjournal_scimago(data_dict[i]['journal_openalex'])
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of all extracted data.
+    all_user_data : pandas.DataFrame
+        Original user CSV data.
+    retain_all_columns : bool
+        If True, extracted data columns are added to the original user data. Otherwise, only extracted data is output.
 
-        # Check whether there is a matching journal stored in the elsevier journal field
-        if el_journal in journals.keys():
-            data_dict = addjournalinfo_scimago(df, data_dict, i, journals, el_journal)
-        elif oa_journal in journals.keys():
-            data_dict = addjournalinfo_scimago(df, data_dict, i, journals, oa_journal)
-        elif ss_journal in journals.keys():
-            data_dict = addjournalinfo_scimago(df, data_dict, i, journals, ss_journal)
+    Returns
+    -------
+    pandas.DataFrame
+        The data to output.
+    """
+    #Instantiate citation data as data frame
+    data = pd.DataFrame(data_dict)
+    data = data.T
 
-        proportion = print_progress(i, proportion, total, 'OpenAlex')
+    if not retain_all_columns:
+        return data
 
-    return data_dict
+    #Otherwise, add citation data columns to user dataframe
+    for col in data.columns:
+        all_user_data[col] = data[col]
+    return all_user_data
 
-def output_csv(data_dict: dict, all_user_data: pd.DataFrame, retain_all_columns: bool) -> None:
+def output_csv(data_dict: dict, all_user_data: pd.DataFrame, retain_all_columns: bool,
+               output_name: str = "citation_counter_output") -> None:
     """
     Write citation and metadata results to a CSV file.
 
@@ -994,6 +2947,8 @@ def output_csv(data_dict: dict, all_user_data: pd.DataFrame, retain_all_columns:
         Original user CSV data.
     retain_all_columns : bool
         If True, output results into a new CSV file. Otherwise, append results to the original user data.
+    output_name : str, optional
+        Name of the output file, without extension (default: "citation_counter_output").
 
     Returns
     -------
@@ -1001,47 +2956,159 @@ def output_csv(data_dict: dict, all_user_data: pd.DataFrame, retain_all_columns:
 
     Notes
     -----
-    The output file is always saved as `citation_counter_output.csv` 
-    in the current working directory.
+    The output file is saved as `<output_name>.csv` in the current working directory.
     """
-    #Instantiate citation data as data frame
-    data = pd.DataFrame(data_dict)
-    data = data.T
+    data = collate_output(data_dict, all_user_data, retain_all_columns)
+    data.to_csv(f"{output_name}.csv", header = True, index = False, encoding = 'utf-8')
 
-    if not retain_all_columns:
-        #Output immediately if create separate csv
-        data.to_csv("citation_counter_output.csv", header = True, index = False, encoding = 'utf-8')
+    # Communicate to user successful output of the csv
+    print(f"** '{output_name}.csv' has been successfully output! **\n")
+
+    return None
+
+def output_typed(data_dict: dict, all_user_data: pd.DataFrame, retain_all_columns: bool, output_format: str,
+                 row_group_size: int = 65536, output_name: str = "citation_counter_output") -> None:
+    """
+    Write citation and metadata results with typed columns to a Parquet or Arrow IPC file.
+
+    Citation counts are written as integers, SJR/FWCI as floats and the open access and
+    retracted flags as booleans (see `OUTPUT_DTYPES`). Rows are written in row groups
+    (record batches for Arrow) of `row_group_size` rows.
+
+    Parameters
+    ----------
+    data_dict : dict
+        Dictionary of all extracted data.
+    all_user_data : pandas.DataFrame
+        Original user CSV data.
+    retain_all_columns : bool
+        If True, extracted data columns are added to the original user data. Otherwise, only extracted data is output.
+    output_format : str
+        Either "parquet" or "arrow".
+    row_group_size : int, optional
+        Number of rows in each row group (default 65536).
+    output_name : str, optional
+        Name of the output file, without extension (default: "citation_counter_output").
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    ImportError
+        If pyarrow is not installed.
+
+    Notes
+    -----
+    The output file is saved as `<output_name>.parquet` or `<output_name>.arrow`
+    in the current working directory. The gender columns added to the CSV by `authors_gender.R`
+    are not included.
+    """
+    if pyarrow is None:
+        raise ImportError(f"pyarrow is required to output_format '{output_format}'. Install it with 'pip install pyarrow'.")
+    import pyarrow.parquet as pq
+
+    data = castcolumns_output(collate_output(data_dict, all_user_data, retain_all_columns))
+    table = pyarrow.Table.from_pandas(data, preserve_index=False)
+
+    output_path = f"{output_name}.{output_format}"
+    if output_format == "parquet":
+        with pq.ParquetWriter(output_path, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=row_group_size):
+                writer.write_batch(batch, row_group_size=row_group_size)
     else:
-        #Otherwise, add citation data columns to user dataframe and output this
-        for col in data.columns:
-            all_user_data[col] = data[col]
-        all_user_data.to_csv("citation_counter_output.csv", header = True, index = False, encoding = 'utf-8')
+        with pyarrow.ipc.new_file(output_path, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=row_group_size):
+                writer.write_batch(batch)
 
-    # Communicate to user successful output of the csv
-    print("** 'citation_counter_output.csv' has been successfully output! **\n")
+    # Communicate to user successful output of the file
+    print(f"** '{output_path}' has been successfully output! **\n")
 
     return None
 
-def execute_gender_script():
+def execute_gender_script(timeout: Optional[float] = None, grace: float = 10.0) -> None:
+    """
+    Run authors_gender.R, which adds author gender columns to citation_counter_output.csv.
+
+    The script's output is streamed line by line as it runs. Its 'PROGRESS i/n' lines are reported
+    with `print_progress`, in the same way as the Python stages.
+
+    Parameters
+    ----------
+    timeout : float, optional
+        Number of seconds after which the script is cancelled. Defaults to no timeout.
+    grace : float, optional
+        Number of seconds the script is given to exit after being asked to terminate,
+        before it is killed (default 10).
+
+    Returns
+    -------
+    None
+
+    Notes
+    -----
+    If the script is cancelled, by the timeout or by Ctrl+C, names already queried remain in
+    data/cache/gender-api-names.csv, but citation_counter_output.csv will not contain gender columns.
+    """
     # Check if Rscript is available
     if shutil.which("Rscript") is None:
         print("WARNING: Rscript not found. Skipping gender analysis.")
         print("To install R, visit: https://www.r-project.org/")
-    else:
-        try:
-            print("** Running gender analysis script in background. Output will be displayed upon completion... **")
-            result = subprocess.run(["Rscript", "authors_gender.R"],
-                                    capture_output=True, text=True)
-            
-            # Print the R script output
-            if result.stdout:
-                print(result.stdout)
-            
-            if result.returncode == 0:
-                print("** Gender analysis completed successfully **")
+        return None
+
+    print("** Running gender analysis script. Its output will be displayed as it runs... **")
+    try:
+        process = subprocess.Popen(["Rscript", "authors_gender.R"], stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, text=True, bufsize=1)
+    except Exception as e:
+        print(f"WARNING: Failed to run gender script: {e}")
+        return None
+
+    # Lines are read in a separate thread, so the timeout is enforced even while the script is silent
+    lines = queue.Queue()
+    def read_lines():
+        for line in process.stdout:
+            lines.put(line)
+        lines.put(None)
+    threading.Thread(target=read_lines, daemon=True).start()
+
+    deadline = time.monotonic() + timeout if timeout else None
+    proportion = 0.1
+    try:
+        while True:
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError
+            try:
+                line = lines.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError
+            if line is None:
+                break
+            progress = re.match(r"PROGRESS (\d+)/(\d+)", line)
+            if progress:
+                i, total = int(progress.group(1)), int(progress.group(2))
+                proportion = print_progress(i - 1, proportion, total, 'gender-api.com')
             else:
-                print(f"WARNING: Gender script failed with return code {result.returncode}")
-                if result.stderr:
-                    print(f"Error output: {result.stderr}")
-        except Exception as e:
-            print(f"WARNING: Failed to run gender script: {e}")
\ No newline at end of file
+                print(line, end='')
+        process.wait()
+    except (TimeoutError, KeyboardInterrupt) as e:
+        reason = f"timed out after {timeout} seconds" if isinstance(e, TimeoutError) else "was interrupted"
+        print(f"WARNING: Gender script {reason}. Stopping it...")
+        process.terminate()
+        try:
+            process.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        if isinstance(e, KeyboardInterrupt):
+            raise
+        return None
+
+    if process.returncode == 0:
+        print("** Gender analysis completed successfully **")
+    else:
+        print(f"WARNING: Gender script failed with return code {process.returncode}")
+
+    return None
@@ -0,0 +1,161 @@
+'''
+A long-running enrichment service. Clients, caches and the Scimago index are created once, then DOIs are enriched
+on request through a local HTTP API. See "Running as a service" in README.md.
+'''
+
+#imports
+import json
+import threading
+import argparse
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import citation_counter_functions as f
+
+class Enricher:
+    """
+    Enrich papers with every API, reusing clients, caches and the Scimago index across calls.
+
+    Concurrent calls for the same DOI are coalesced: the DOI is enriched once, by the first call, and
+    the other calls wait for and share its result. `enrich` is safe to call from multiple threads.
+
+    Attributes
+    ----------
+    d : dict
+        User inputs, as returned by `readjson`.
+    warm : dict
+        Clients, caches and indexes, as returned by `warmresources`, shared by every call.
+    """
+    def __init__(self, d: dict):
+        self.d = d
+        f.ResultsCache.configure(d["cache_limits"], d["cache_compression"])
+        f.TraceLog.configure(d["trace_log"])
+        f.BudgetLedger.configure(d["budgets"])
+        self.warm = f.warmresources(d)
+        self._inflight = {}                 # DOI -> Future of the row, for DOIs being enriched
+        self._lock = threading.Lock()
+
+    def _enrich_rows(self, pairs: list) -> list:
+        """Enrich (DOI, Title) pairs, returning one row of `data_dict` per pair."""
+        data_dict = {i: f.emptyrow(doi, title) for i, (doi, title) in enumerate(pairs)}
+        data_dict = f.get_all_data(data_dict, self.d, warm=self.warm)
+        if not self.d["skip_gender"] and not self.d["gender_engine"]:
+            data_dict = f.get_gender_data(data_dict, self.d["gender-api.com_apikey"], self.d["no_cache"], self.warm["names"],
+                                           self.d["rates"]["gender-api"], self.warm["namecache"], self.warm["limiters"]["gender-api"])
+        return [data_dict[i] for i in range(len(pairs))]
+
+    def enrich(self, pairs: list) -> list:
+        """
+        Enrich papers, waiting for any of their DOIs already being enriched by another call.
+
+        Parameters
+        ----------
+        pairs : list of (str, str)
+            (DOI, Title) of each paper. The title is only used by Elsevier, and may be "".
+
+        Returns
+        -------
+        list of dict
+            One record per pair, in order, with the columns of citation_counter_output.csv.
+        """
+        ## Claim the DOIs nobody is enriching yet, and collect the futures of the rest
+        own, futures = {}, []
+        with self._lock:
+            for doi, title in pairs:
+                key = doi if doi else object()      # Rows without a DOI are never coalesced
+                if key not in self._inflight:
+                    self._inflight[key] = Future()
+                    own[key] = (doi, title)
+                futures.append(self._inflight[key])
+
+        ## Enrich the claimed DOIs, and release them to the waiting calls
+        if own:
+            try:
+                rows = self._enrich_rows(list(own.values()))
+                for key, row in zip(own, rows):
+                    self._inflight[key].set_result(row)
+            except Exception as e:
+                for key in own:
+                    if not self._inflight[key].done():
+                        self._inflight[key].set_exception(e)
+            finally:
+                with self._lock:
+                    for key in own:
+                        del self._inflight[key]
+
+        return [dict(future.result(), Title=title) for future, (doi, title) in zip(futures, pairs)]
+
+def tojson(records: list) -> bytes:
+    """Serialise records to JSON, converting numpy scalars (e.g. from the Scimago tables) to Python numbers."""
+    return json.dumps({"records": records}, default=lambda value: value.item() if hasattr(value, "item") else str(value)).encode("utf-8")
+
+class EnrichmentHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API of the service.
+
+    GET  /health                          -> {"status": "ok"}
+    GET  /enrich?doi=10.1000/xyz&title=.. -> {"records": [record]}
+    POST /enrich with {"doi": "...", "title": "..."} or {"records": [{"doi": "...", "title": "..."}, ...]}
+                                          -> {"records": [record, ...]}
+    """
+    enricher: Enricher = None
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _enrich(self, records: list) -> None:
+        if not isinstance(records, list) or not all(isinstance(r, dict) and isinstance(r.get("doi", ""), str)
+                                                    and isinstance(r.get("title", ""), str) for r in records):
+            self._send(400, json.dumps({"error": "Expected records with string 'doi' and 'title' fields"}).encode("utf-8"))
+            return
+        try:
+            results = self.enricher.enrich([(r.get("doi", "").strip(), r.get("title", "").strip()) for r in records])
+        except Exception as e:
+            self._send(500, json.dumps({"error": f"{type(e).__name__}: {e}"}).encode("utf-8"))
+            return
+        self._send(200, tojson(results))
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send(200, b'{"status": "ok"}')
+        elif url.path == "/enrich":
+            query = parse_qs(url.query)
+            self._enrich([{"doi": query.get("doi", [""])[0], "title": query.get("title", [""])[0]}])
+        else:
+            self._send(404, b'{"error": "Not found"}')
+
+    def do_POST(self) -> None:
+        if urlparse(self.path).path != "/enrich":
+            self._send(404, b'{"error": "Not found"}')
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._send(400, b'{"error": "Invalid JSON"}')
+            return
+        self._enrich(body.get("records", [body]) if isinstance(body, dict) else body)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve enrichment of DOIs over HTTP, with the settings in config.json.")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Address to listen on (default: 127.0.0.1, this machine only).")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="Port to listen on (default: 8765).")
+    args = parser.parse_args()
+
+    EnrichmentHandler.enricher = Enricher(f.readjson())
+    server = ThreadingHTTPServer((args.host, args.port), EnrichmentHandler)
+    print(f"** Enrichment service listening on http://{args.host}:{args.port} **")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        f.TraceLog.close()
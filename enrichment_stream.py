@@ -0,0 +1,122 @@
+'''
+Streaming API, to embed the enrichment in other pipelines. Papers are read from any iterable or async iterable of
+(DOI, Title) pairs, and enriched records are yielded batch by batch, so the full dataset is never held in memory.
+
+Example
+-------
+import enrichment_stream as es
+for record in es.enrich_stream(pairs, es.readjson("config.json")):
+    ...
+
+async for record in es.aenrich_stream(pairs, es.readjson("config.json"), concurrency=4):
+    ...
+'''
+
+#imports
+import asyncio
+import itertools
+import threading
+import collections
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional, Union
+from citation_counter_functions import readjson
+from enrichment_service import Enricher
+
+def enrich_stream(pairs: Iterable[tuple], d: Optional[dict] = None, batch_size: int = 50,
+                  enricher: Optional[Enricher] = None) -> Iterator[dict]:
+    """
+    Enrich (DOI, Title) pairs, yielding one record per pair, in order.
+
+    Pairs are read `batch_size` at a time, and only when the records of the previous batch have been
+    consumed, so a slow consumer holds back the reading of its input.
+
+    Parameters
+    ----------
+    pairs : iterable of (str, str)
+        (DOI, Title) of each paper. The title is only used by Elsevier, and may be "".
+    d : dict, optional
+        User inputs, as returned by `readjson`. Read from config.json if neither `d` nor `enricher` is given.
+    batch_size : int, optional
+        Number of pairs enriched together. Smaller batches yield their first records sooner, larger
+        batches make fewer passes through each API stage (default: 50).
+    enricher : Enricher, optional
+        Enricher to reuse, e.g. across several streams. Created from `d` if None.
+
+    Yields
+    ------
+    dict
+        Record with the columns of citation_counter_output.csv.
+    """
+    enricher = enricher or Enricher(d or readjson())
+    pairs = iter(pairs)
+    while True:
+        batch = [(doi or "", title or "") for doi, title in itertools.islice(pairs, batch_size)]
+        if not batch:
+            return
+        yield from enricher.enrich(batch)
+
+async def _abatches(pairs: Union[AsyncIterable, Iterable], batch_size: int) -> AsyncIterator[list]:
+    """Group an async or plain iterable of (DOI, Title) pairs into lists of `batch_size` pairs."""
+    batch = []
+    if hasattr(pairs, "__aiter__"):
+        async for doi, title in pairs:
+            batch.append((doi or "", title or ""))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    else:
+        for doi, title in pairs:
+            batch.append((doi or "", title or ""))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+async def aenrich_stream(pairs: Union[AsyncIterable, Iterable], d: Optional[dict] = None, batch_size: int = 50,
+                         concurrency: int = 1, enricher: Optional[Enricher] = None) -> AsyncIterator[dict]:
+    """
+    Enrich (DOI, Title) pairs from an async or plain iterable, yielding one record per pair, in order.
+
+    Batches are enriched in worker threads, so the event loop is not blocked. At most `concurrency`
+    batches are read ahead and enriched at once; no more pairs are read until the consumer takes the
+    records of the oldest batch. If the consumer stops early, batches that have not started are skipped,
+    but a batch already being enriched runs to the end in its thread, as threads cannot be interrupted.
+
+    Parameters
+    ----------
+    pairs : async iterable or iterable of (str, str)
+        (DOI, Title) of each paper. The title is only used by Elsevier, and may be "".
+    d : dict, optional
+        User inputs, as returned by `readjson`. Read from config.json if neither `d` nor `enricher` is given.
+    batch_size : int, optional
+        Number of pairs enriched together (default: 50).
+    concurrency : int, optional
+        Number of batches enriched at once (default: 1).
+    enricher : Enricher, optional
+        Enricher to reuse, e.g. across several streams. Created from `d` if None.
+
+    Yields
+    ------
+    dict
+        Record with the columns of citation_counter_output.csv.
+    """
+    if enricher is None:
+        enricher = await asyncio.to_thread(Enricher, d or readjson())
+    pending = collections.deque()
+    stopped = threading.Event()
+    def enrich(batch):
+        return [] if stopped.is_set() else enricher.enrich(batch)
+    try:
+        async for batch in _abatches(pairs, batch_size):
+            pending.append(asyncio.ensure_future(asyncio.to_thread(enrich, batch)))
+            if len(pending) >= concurrency:
+                for record in await pending.popleft():
+                    yield record
+        while pending:
+            for record in await pending.popleft():
+                yield record
+    finally:
+        # If the consumer stops early, skip the batches not yet started, and do not wait for those running
+        stopped.set()
+        for future in pending:
+            future.cancel()
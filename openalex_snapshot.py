@@ -0,0 +1,196 @@
+import re
+import gzip
+import json
+import time
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+# The DOI of a work, read from its JSON line without parsing the rest of the line
+DOI_PATTERN = re.compile(rb'"doi":\s*"https://doi\.org/((?:[^"\\]|\\.)+)"')
+
+class OpenAlexSnapshot:
+    """
+    Look up works by DOI in a locally downloaded OpenAlex works snapshot, without network access.
+
+    The snapshot is the gzipped JSON Lines files under `<snapshot>/data/works/updated_date=*/part_*.gz`,
+    as downloaded with `aws s3 sync s3://openalex/data/works <snapshot>/data/works --no-sign-request`.
+    Each line is one work, in the same format as the OpenAlex API.
+
+    An index of DOI -> (file, offset, length) is kept in an SQLite database, by default at
+    `data/cache/openalex_snapshot.sqlite`. Building it reads every file once, extracting only the DOI of
+    each line. Files already indexed are skipped, so after the snapshot is updated only new or changed
+    files are read. A work updated in several files has an entry for each copy, and lookups read the copy
+    in the file with the latest update date, so files can be re-indexed or removed in any order.
+    Lookups are grouped by file, and each file is opened once, seeking from one requested line to the
+    next and parsing only the requested lines.
+
+    Attributes
+    ----------
+    snapshot_dir : Path
+        Directory of the snapshot, containing data/works
+    index_file : Path
+        Path to the SQLite index
+    """
+
+    def __init__(self, snapshot_dir: str, index_file: Path = Path("data/cache/openalex_snapshot.sqlite")):
+        """
+        Initialize the OpenAlexSnapshot, creating the index database if needed. The index is not built until `build_index` is called.
+
+        Parameters
+        ----------
+        snapshot_dir : str
+            Directory of the snapshot, containing data/works
+        index_file : Path, optional
+            Path to the SQLite index (default: data/cache/openalex_snapshot.sqlite)
+        """
+        self._logger = logging.getLogger("OpenAlex-snapshot")
+        self.snapshot_dir = Path(snapshot_dir)
+        self.index_file = index_file
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.index_file, timeout=60)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, "
+                               "size INTEGER NOT NULL, mtime REAL NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS works (doi TEXT NOT NULL, file_id INTEGER NOT NULL, "
+                               "offset INTEGER NOT NULL, length INTEGER NOT NULL, PRIMARY KEY (doi, file_id))")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS works_file_id ON works (file_id)")
+
+    def _part_files(self) -> list:
+        """Return the gzipped part files of the snapshot, oldest update first."""
+        works_dir = self.snapshot_dir / "data" / "works"
+        if not works_dir.is_dir():
+            raise FileNotFoundError(f"No OpenAlex works snapshot found at {works_dir}")
+        return sorted(works_dir.glob("updated_date=*/part_*.gz"))
+
+    def build_index(self) -> int:
+        """
+        Index the DOIs of every part file that is new or has changed since it was last indexed.
+
+        The entries of a changed or removed file are replaced or deleted without touching the copies of its
+        works in other files, so a lookup still finds the latest copy that remains in the snapshot.
+
+        Returns
+        -------
+        int
+            Number of files indexed
+
+        Raises
+        ------
+        FileNotFoundError
+            If the snapshot has no data/works directory
+        """
+        indexed = {row[0]: (row[1], row[2], row[3]) for row in self._conn.execute("SELECT path, id, size, mtime FROM files")}
+        part_files = self._part_files()
+        count = 0
+
+        # Forget files that have been removed from the snapshot
+        current = {str(part_file.relative_to(self.snapshot_dir)) for part_file in part_files}
+        with self._conn:
+            for path in set(indexed) - current:
+                self._conn.execute("DELETE FROM works WHERE file_id = ?", (indexed.pop(path)[0],))
+                self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        for n, part_file in enumerate(part_files):
+            stat = part_file.stat()
+            path = str(part_file.relative_to(self.snapshot_dir))
+            if path in indexed and indexed[path][1:] == (stat.st_size, stat.st_mtime):
+                continue
+
+            start = time.time()
+            with self._conn:
+                if path in indexed:
+                    self._conn.execute("DELETE FROM works WHERE file_id = ?", (indexed[path][0],))
+                    self._conn.execute("DELETE FROM files WHERE id = ?", (indexed[path][0],))
+                file_id = self._conn.execute("INSERT INTO files (path, size, mtime) VALUES (?, ?, ?)",
+                                             (path, stat.st_size, stat.st_mtime)).lastrowid
+                self._conn.executemany("INSERT OR REPLACE INTO works VALUES (?, ?, ?, ?)", self._scan(part_file, file_id))
+            count += 1
+            self._logger.info(f"Indexed {path} ({n + 1}/{len(part_files)}) in {time.time() - start:.1f}s")
+
+        return count
+
+    @staticmethod
+    def _scan(part_file: Path, file_id: int) -> Iterable[tuple]:
+        """Yield (doi, file_id, offset, length) for each line of `part_file` with a DOI. Offsets are in the decompressed stream."""
+        offset = 0
+        with gzip.open(part_file, 'rb') as f:
+            for line in f:
+                match = DOI_PATTERN.search(line)
+                if match:
+                    doi = json.loads(b'"' + match.group(1) + b'"').lower()
+                    yield doi, file_id, offset, len(line)
+                offset += len(line)
+
+    def size(self) -> int:
+        """Return the number of works indexed."""
+        return self._conn.execute("SELECT COUNT(DISTINCT doi) FROM works").fetchone()[0]
+
+    def get_many(self, dois: Iterable[str]) -> Dict[str, dict]:
+        """
+        Look up works by DOI.
+
+        Parameters
+        ----------
+        dois : iterable of str
+            DOIs, without 'https://doi.org/'. Case is ignored
+
+        Returns
+        -------
+        dict
+            Lower case DOI -> work, as a dictionary in the format of the OpenAlex API. DOIs not in the snapshot are left out
+        """
+        ## Find the location of each DOI, in batches to stay within SQLite's limit on parameters
+        dois = sorted({doi.lower() for doi in dois if doi})
+        copies = []
+        for start in range(0, len(dois), 500):
+            batch = dois[start:start + 500]
+            copies += self._conn.execute(
+                "SELECT works.doi, files.path, works.offset, works.length FROM works JOIN files ON works.file_id = files.id "
+                f"WHERE works.doi IN ({','.join('?' * len(batch))})", batch).fetchall()
+
+        # Paths sort by update date, so the last copy of each work is the latest
+        latest = {}
+        for doi, path, offset, length in sorted(copies, key=lambda copy: copy[1]):
+            latest[doi] = (doi, path, offset, length)
+
+        ## Read the lines of each file in order, so each file is decompressed at most once
+        works = {}
+        locations = sorted(latest.values(), key=lambda location: (location[1], location[2]))
+        f, open_path = None, None
+        try:
+            for doi, path, offset, length in locations:
+                if path != open_path or f.tell() > offset:
+                    if f is not None:
+                        f.close()
+                    f, open_path = gzip.open(self.snapshot_dir / path, 'rb'), path
+                f.seek(offset)
+                works[doi] = json.loads(f.read(length))
+        finally:
+            if f is not None:
+                f.close()
+
+        return works
+
+    def get(self, doi: str) -> Optional[dict]:
+        """Look up one work by DOI, returning None if it is not in the snapshot."""
+        return self.get_many([doi]).get(doi.lower())
+
+    def close(self) -> None:
+        """Close the index database."""
+        self._conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='[%(name)s][%(levelname)s]: %(message)s')
+    parser = argparse.ArgumentParser(description="Build the DOI index of a local OpenAlex works snapshot, so later runs can start enriching immediately.")
+    parser.add_argument("--snapshot", required=True,
+                        help="Directory of the snapshot, containing data/works.")
+    parsed = parser.parse_args()
+
+    snapshot = OpenAlexSnapshot(parsed.snapshot)
+    files = snapshot.build_index()
+    print(f"Indexed {files} new or changed files. The index holds {snapshot.size()} works.")
+    snapshot.close()
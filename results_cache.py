@@ -1,8 +1,23 @@
 import pickle
 import os
+import time
+import sqlite3
 import logging
+import threading
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Magic numbers at the start of compressed frames, used to detect how a value or file was written
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+LZ4_MAGIC = b'\x04\x22\x4d\x18'
 
 # Configure logging to show on console
 logging.basicConfig(level=logging.INFO, format='[%(name)s][%(levelname)s]: %(message)s')
@@ -13,68 +28,377 @@ logger_tmp.propagate = False
 logger_tmp = logging.getLogger('httpx')
 logger_tmp.propagate = False  # Remove this if you want to diagnose why SemanticScholar is not working
 
+def default_codec() -> str:
+    """Return the fastest available compression codec: 'zstd', then 'lz4', otherwise 'none'."""
+    if zstandard is not None:
+        return "zstd"
+    if lz4 is not None:
+        return "lz4"
+    return "none"
+
+def compress(data: bytes, codec: str) -> bytes:
+    """
+    Compress `data` with `codec`.
+
+    Parameters
+    ----------
+    data : bytes
+        The bytes to compress
+    codec : str
+        One of 'zstd', 'lz4' or 'none'
+
+    Returns
+    -------
+    bytes
+        A zstd or lz4 frame, or `data` itself if `codec` is 'none'
+    """
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == "lz4":
+        return lz4.frame.compress(data)
+    return data
+
+def decompress(data: bytes) -> bytes:
+    """
+    Decompress `data`, detecting from its first bytes whether it is a zstd frame, an lz4 frame or uncompressed.
+
+    Raises
+    ------
+    pickle.UnpicklingError
+        If `data` is compressed with a codec that is not installed
+    """
+    magic = data[:4]
+    if magic == ZSTD_MAGIC:
+        if zstandard is None:
+            raise pickle.UnpicklingError("Value is zstd compressed, but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if magic == LZ4_MAGIC:
+        if lz4 is None:
+            raise pickle.UnpicklingError("Value is lz4 compressed, but lz4 is not installed")
+        return lz4.frame.decompress(data)
+    return data
+
+def load_compressed(path: Path) -> Any:
+    """
+    Unpickle `path`, detecting from its first bytes whether it is zstd, lz4 or uncompressed.
+
+    Used to import pickle caches written by earlier versions.
+
+    Parameters
+    ----------
+    path : Path
+        Path of the file to read
+
+    Returns
+    -------
+    Any
+        The unpickled object
+
+    Raises
+    ------
+    pickle.PickleError
+        If the file is compressed with a codec that is not installed
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+        f.seek(0)
+        if magic == ZSTD_MAGIC:
+            if zstandard is None:
+                raise pickle.UnpicklingError(f"{path} is zstd compressed, but zstandard is not installed")
+            with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                return pickle.load(reader)
+        if magic == LZ4_MAGIC:
+            if lz4 is None:
+                raise pickle.UnpicklingError(f"{path} is lz4 compressed, but lz4 is not installed")
+            with lz4.frame.LZ4FrameFile(f, 'rb') as reader:
+                return pickle.load(reader)
+        return pickle.load(f)
+
+def cache_names(cache_dir: Path = Path("data/cache")) -> list:
+    """Return the names of the ResultsCache databases in `cache_dir`, leaving out other databases kept there (e.g. budgets)."""
+    names = []
+    for path in sorted(cache_dir.glob("*.sqlite")):
+        conn = sqlite3.connect(path)
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entries'").fetchone():
+                names.append(path.stem)
+        finally:
+            conn.close()
+    return names
+
 class ResultsCache:
     """
     A caching system for storing search results by DOI.
-    
+
+    Results are stored in an SQLite database at `data/cache/<db_name>.sqlite`, indexed by DOI.
+    Opening the cache does not read any results; each is unpickled when `get()` is called for it,
+    so startup time and memory depend on the rows processed rather than on the size of the cache.
+
+    The cache can be shared by concurrent processes. Each `set()` is committed in its own
+    transaction, so entries are never overwritten by another process's copy of the cache, and
+    are visible to other processes as soon as they are set.
+
+    The time and run in which each entry was last used, and its stored size, are recorded. If a
+    limit on the number of entries or bytes is set, the least recently used entries are evicted
+    when the cache is saved. A run is one invocation of the pipeline: a process counts as a new run
+    only once `start_run` is called, and every other process (e.g. a dry run, worker, service or
+    stream) joins the latest run, so `compact` measures age in pipeline runs.
+
+    Values are compressed with `compression` (zstd or lz4 where installed). Values are read
+    according to how they were written, so the codec can be changed at any time.
+
+    Pickle caches written by earlier versions (`data/cache/<db_name>.pkl`) are imported the first
+    time the cache is opened, and the pickle file is renamed to `<db_name>.pkl.imported`.
+
     Attributes
     ----------
     db_name : str
         Name of the database (e.g., 'elsevier', 'semanticscholar', 'openalex')
-    cache : Dict[str, Any]
-        Dictionary mapping DOI to stored objects
+    run : int
+        Number of the run entries used by this process are recorded in. The new run of the process if
+        `start_run` was called, otherwise the latest run
     cache_file : Path
-        Path to the pickle file for persistent storage
+        Path to the SQLite database for persistent storage
     cache_disabled : bool
         If True, all cache operations are bypassed
+    last_nbytes : int or None
+        Stored (compressed) size of the value last returned by `get`, e.g. to trace it without measuring it again
+    max_entries : int or None
+        Maximum number of entries kept on disk
+    max_bytes : int or None
+        Maximum total size of the stored (compressed) entries kept on disk
+    limits : Dict[str, Dict[str, int]]
+        Class attribute mapping db_name to default `max_entries`/`max_bytes`, set with `configure`
+    compression : str
+        Class attribute, codec used to compress values: 'zstd', 'lz4' or 'none'. Set with `configure`
+    counting : bool
+        Class attribute, whether this process counts as a new run. Set with `start_run`
     """
-    
-    def __init__(self, db_name: str, cache_disabled: bool = False):
+
+    limits: Dict[str, Dict[str, int]] = {}
+    compression: str = default_codec()
+    counting: bool = False
+    _runs: Dict[str, int] = {}       # db_name -> run number of this process, for caches numbered since `start_run`
+
+    @classmethod
+    def configure(cls, limits: Optional[Dict[str, Dict[str, int]]] = None, compression: str = "") -> None:
+        """
+        Set the default size limits and compression of caches created afterwards.
+
+        Parameters
+        ----------
+        limits : dict, optional
+            Dictionary mapping db_name to a dictionary with optional keys 'max_entries' and 'max_bytes',
+            e.g. {"semanticscholar_authors": {"max_bytes": 2000000000}}
+        compression : str, optional
+            One of 'zstd', 'lz4' or 'none'. If "", the fastest installed codec is used (default: "")
+
+        Raises
+        ------
+        ValueError
+            If `compression` is unknown, or its library is not installed
+        """
+        cls.limits = limits or {}
+        if compression not in ("", "zstd", "lz4", "none"):
+            raise ValueError(f"Invalid cache compression {compression!r}. Expected '', 'zstd', 'lz4' or 'none'.")
+        if (compression == "zstd" and zstandard is None) or (compression == "lz4" and lz4 is None):
+            raise ValueError(f"Cache compression {compression!r} requires the {'zstandard' if compression == 'zstd' else 'lz4'} package.")
+        cls.compression = compression or default_codec()
+
+    @classmethod
+    def start_run(cls, cache_dir: Path = Path("data/cache")) -> None:
+        """
+        Count this process as one new run of the pipeline. Call once per invocation, e.g. from citation_counter.py.
+
+        Every existing cache is given its next run number now, so worker processes started afterwards join this
+        run rather than starting their own. Caches created later by this process are numbered when first opened.
+        Every instance created by this process afterwards reuses the run number of its cache.
+
+        Parameters
+        ----------
+        cache_dir : Path, optional
+            Directory of the caches (default: data/cache)
+        """
+        cls.counting = True
+        cls._runs = {}
+        for db_name in cache_names(cache_dir):
+            conn = sqlite3.connect(cache_dir / f"{db_name}.sqlite", timeout=60)
+            try:
+                cls._runs[db_name] = cls._next_run(conn)
+            finally:
+                conn.close()
+
+    @staticmethod
+    def _next_run(conn: sqlite3.Connection) -> int:
+        """Count a new run in the cache open on `conn`, in one statement so concurrent processes never share it, and return its number."""
+        with conn:
+            conn.execute("INSERT INTO meta VALUES ('run', 1) ON CONFLICT (key) DO UPDATE SET value = value + 1")
+            return conn.execute("SELECT value FROM meta WHERE key = 'run'").fetchone()[0]
+
+    def __init__(self, db_name: str, cache_disabled: bool = False,
+                 max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
         """
         Initialize the ResultsCache.
-        
+
         Parameters
         ----------
         db_name : str
             Name of the database (e.g., 'elsevier')
         cache_disabled : bool, optional
             If True, disable all caching operations (default: False)
+        max_entries : int, optional
+            Maximum number of entries kept on disk (default: the limit set with `configure`, or no limit)
+        max_bytes : int, optional
+            Maximum total size in bytes of the entries kept on disk (default: the limit set with `configure`, or no limit)
         """
         self._logger = logging.getLogger(f"Cache-{db_name}")
         self.db_name = db_name
         self.cache_disabled = cache_disabled
-        self.cache: Dict[str, Any] = {}
-        
+        limits = self.limits.get(db_name, {})
+        self.max_entries = max_entries if max_entries is not None else limits.get("max_entries")
+        self.max_bytes = max_bytes if max_bytes is not None else limits.get("max_bytes")
+        self.run = 1
+        self.last_nbytes = None
+        self._touched: Dict[str, float] = {}  # Access times of entries read by this process, not yet on disk
+        self._unsaved = 0                     # Number of entries set since access times were last saved
+        self._conn = None
+        self._lock = threading.RLock()       # One instance may be shared by threads, e.g. of enrichment_service.py
+
         if not self.cache_disabled:
             # Create cache directory if it doesn't exist
             cache_dir = Path("data/cache")
             cache_dir.mkdir(parents=True, exist_ok=True)
-            
-            self.cache_file = cache_dir / f"{db_name}.pkl"
+
+            self.cache_file = cache_dir / f"{db_name}.sqlite"
             self._load_cache()
         else:
             self._logger.info(f"Cache disabled for {db_name}")
             self.cache_file = None
-    
+
     def _load_cache(self) -> None:
-        """Load cache from pickle file if it exists."""
-        self._logger.info(f"Checking for an existing cache at {self.cache_file}")
-        if self.cache_file.exists():
-            try:
-                with open(self.cache_file, 'rb') as f:
-                    self.cache = pickle.load(f)
-                num_cache = str(len(self.cache))
-                self._logger.info(f"Loaded {num_cache} values from the {self.db_name} cache on disk.")
-            except (pickle.PickleError, EOFError, FileNotFoundError):
-                self.cache = {}
-                self._logger.error(f"Could not load the cache for {self.db_name} from {self.cache_file}."
-                                   f" Starting a new cache...")
+        """Open the database, creating it and importing any pickle cache from an earlier version if needed."""
+        self._logger.info(f"Opening the cache at {self.cache_file}")
+        # A generous timeout, as other processes may be writing to the same cache
+        self._conn = sqlite3.connect(self.cache_file, timeout=60, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                               "last_access REAL NOT NULL, last_run INTEGER NOT NULL, nbytes INTEGER NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # Running totals of the entries and their sizes, kept by triggers so writes by every process count,
+            # and so `_evict` need not scan the table. Counted from the table after the triggers exist, for
+            # caches written before them.
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN "
+                               "UPDATE meta SET value = value + 1 WHERE key = 'entries'; "
+                               "UPDATE meta SET value = value + NEW.nbytes WHERE key = 'bytes'; END")
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN "
+                               "UPDATE meta SET value = value - 1 WHERE key = 'entries'; "
+                               "UPDATE meta SET value = value - OLD.nbytes WHERE key = 'bytes'; END")
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF nbytes ON entries BEGIN "
+                               "UPDATE meta SET value = value + NEW.nbytes - OLD.nbytes WHERE key = 'bytes'; END")
+            self._conn.execute("INSERT OR IGNORE INTO meta SELECT 'entries', COUNT(*) FROM entries")
+            self._conn.execute("INSERT OR IGNORE INTO meta SELECT 'bytes', COALESCE(SUM(nbytes), 0) FROM entries")
+
+        self._import_pickle()
+        if self.db_name in self._runs:
+            self.run = self._runs[self.db_name]
+        elif self.counting:
+            self.run = self._runs[self.db_name] = self._next_run(self._conn)
         else:
-            self._logger.info(f"No existing cache found for {self.db_name}. Starting a new cache...")
-    
+            self.run = self._last_run()
+        self._logger.info(f"Opened the {self.db_name} cache with {self.size()} values on disk.")
+
+    def _import_pickle(self) -> None:
+        """Import the pickle cache written by an earlier version, if there is one."""
+        legacy_file = self.cache_file.with_suffix('.pkl')
+        if not legacy_file.exists():
+            return
+
+        # BEGIN IMMEDIATE takes the write lock, so only one process imports the file
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not legacy_file.exists():
+                self._conn.rollback()
+                return
+            try:
+                legacy = load_compressed(legacy_file)
+            except (pickle.PickleError, EOFError) as e:
+                self._logger.error(f"Could not import the cache for {self.db_name} from {legacy_file}: {e}")
+                self._conn.rollback()
+                return
+            # Access times were kept in a sidecar file, if the pickle cache recorded them
+            legacy_meta_file = legacy_file.with_suffix('.meta.pkl')
+            legacy_meta, legacy_run = {}, 0
+            if legacy_meta_file.exists():
+                try:
+                    data = load_compressed(legacy_meta_file)
+                    legacy_meta, legacy_run = data["meta"], data["run"]
+                except (pickle.PickleError, EOFError, KeyError):
+                    pass
+
+            rows = []
+            for key, result in legacy.items():
+                value = compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), self.compression)
+                last_access, last_run = (legacy_meta.get(key) or [0.0, 0])[:2]
+                rows.append((key, value, last_access, last_run, len(value)))
+            self._conn.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('run', ?)", (legacy_run,))
+            self._conn.commit()
+            os.replace(legacy_file, legacy_file.with_suffix('.pkl.imported'))
+            if legacy_meta_file.exists():
+                os.replace(legacy_meta_file, legacy_meta_file.with_suffix('.pkl.imported'))
+        except BaseException:
+            self._conn.rollback()
+            raise
+        self._logger.info(f"Imported {len(rows)} values from {legacy_file} into the {self.db_name} cache.")
+
+    def _last_run(self) -> int:
+        """Return the number of the latest run of the cache, or 0."""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'run'").fetchone()
+        return row[0] if row else 0
+
+    def _totals(self) -> Tuple[int, int]:
+        """Return the number of entries and their total stored size in bytes."""
+        totals = dict(self._conn.execute("SELECT key, value FROM meta WHERE key IN ('entries', 'bytes')"))
+        return totals["entries"], totals["bytes"]
+
+    def _evict(self) -> int:
+        """
+        Evict the least recently used entries until the cache is within `max_entries` and `max_bytes`.
+        Must be called within a transaction.
+
+        Returns
+        -------
+        int
+            Number of entries evicted
+        """
+        if self.max_entries is None and self.max_bytes is None:
+            return 0
+
+        count, total_bytes = self._totals()
+        if (self.max_entries is None or count <= self.max_entries) and \
+                (self.max_bytes is None or total_bytes <= self.max_bytes):
+            return 0
+
+        evict = []
+        for key, nbytes in self._conn.execute("SELECT key, nbytes FROM entries ORDER BY last_access"):
+            over_entries = self.max_entries is not None and count > self.max_entries
+            over_bytes = self.max_bytes is not None and total_bytes > self.max_bytes
+            if not over_entries and not over_bytes:
+                break
+            evict.append((key,))
+            count -= 1
+            total_bytes -= nbytes
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evict)
+
+        if evict:
+            self._logger.info(f"Evicted {len(evict)} least recently used values from the {self.db_name} cache.")
+        return len(evict)
+
     def _save_cache(self, force_save = False) -> None:
         """
-        Save cache to pickle file. By default, it will do this every 25th entry
+        Save the access times of entries read by this process, and evict entries over the size limits.
+        By default, it will do this every 25th new entry. Entries themselves are saved as they are set.
 
         Parameters
         ----------
@@ -83,44 +407,69 @@ class ResultsCache:
         """
         if self.cache_disabled:
             return
-            
-        if self.size() % 25 != 0 and not force_save:
+
+        if self._unsaved < 25 and not force_save:
             return
-        
-        temp_file = self.cache_file.with_suffix('.tmp')
+
         try:
-            # Write to temporary file first
-            with open(temp_file, 'wb') as f:
-                pickle.dump(self.cache, f)
-            
-            # Atomically replace the old file with the new one
-            if self.cache_file.exists():
-                os.remove(self.cache_file)
-            os.rename(temp_file, self.cache_file)
-            
-        except Exception as e:
-            # Clean up temp file if it exists
-            if temp_file.exists():
-                try:
-                    os.remove(temp_file)
-                except:
-                    pass
+            with self._lock:
+                with self._conn:
+                    self._conn.executemany("UPDATE entries SET last_access = ?, last_run = ? WHERE key = ?",
+                                           [(access, self.run, key) for key, access in self._touched.items()])
+                    self._evict()
+                    self._conn.execute("INSERT INTO meta VALUES ('run', ?) ON CONFLICT (key) DO UPDATE "
+                                       "SET value = MAX(value, excluded.value)", (self.run,))
+                self._touched.clear()
+                self._unsaved = 0
+
+        except sqlite3.Error as e:
             print(f"Warning: Could not save cache to {self.cache_file}: {e}")
 
+    def compact(self, unused_runs: int) -> tuple:
+        """
+        Drop entries that have not been used in the last `unused_runs` runs, and reclaim their disk space.
+
+        Parameters
+        ----------
+        unused_runs : int
+            Entries last used more than this many runs before the latest run are dropped
+
+        Returns
+        -------
+        tuple of (int, int)
+            Number of entries dropped, and the number of bytes reclaimed on disk
+        """
+        if self.cache_disabled:
+            return 0, 0
+
+        # Compacting does not count as a run. Entries used by this process are recorded first
+        if self._touched or self._unsaved:
+            self._save_cache(force_save=True)
+        latest_run = self._last_run()
+
+        size_before = self.cache_file.stat().st_size
+        with self._lock:
+            with self._conn:
+                dropped = self._conn.execute("DELETE FROM entries WHERE ? - last_run >= ?",
+                                             (latest_run, unused_runs)).rowcount
+            self._conn.execute("VACUUM")
+
+        return dropped, size_before - self.cache_file.stat().st_size
+
     def save_to_disk(self):
         """Ensures the latest copy of the cache is saved to disk."""
         if not self.cache_disabled:
             self._save_cache(force_save=True)
-    
+
     def get(self, doi: str) -> Optional[Any]:
         """
         Get cached result for a DOI.
-        
+
         Parameters
         ----------
         doi : str
             The DOI to look up
-            
+
         Returns
         -------
         Any or None
@@ -128,12 +477,18 @@ class ResultsCache:
         """
         if self.cache_disabled:
             return None
-        return self.cache.get(doi)
-    
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (doi,)).fetchone()
+            if row is None:
+                return None
+            self._touched[doi] = time.time()
+            self.last_nbytes = len(row[0])
+        return pickle.loads(decompress(row[0]))
+
     def set(self, doi: str, result: Any) -> None:
         """
         Store a result in the cache.
-        
+
         Parameters
         ----------
         doi : str
@@ -143,18 +498,31 @@ class ResultsCache:
         """
         if self.cache_disabled:
             return
-        self.cache[doi] = result
-        self._save_cache()
-    
+        value = compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), self.compression)
+        with self._lock:
+            try:
+                with self._conn:
+                    # An upsert rather than INSERT OR REPLACE, whose implicit delete would not fire the delete trigger
+                    self._conn.execute("INSERT INTO entries VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                                       "value = excluded.value, last_access = excluded.last_access, "
+                                       "last_run = excluded.last_run, nbytes = excluded.nbytes",
+                                       (doi, value, time.time(), self.run, len(value)))
+            except sqlite3.Error as e:
+                print(f"Warning: Could not save {doi} to cache {self.cache_file}: {e}")
+                return
+            self._touched.pop(doi, None)
+            self._unsaved += 1
+            self._save_cache()
+
     def has(self, doi: str) -> bool:
         """
         Check if DOI exists in cache.
-        
+
         Parameters
         ----------
         doi : str
             The DOI to check
-            
+
         Returns
         -------
         bool
@@ -162,17 +530,83 @@ class ResultsCache:
         """
         if self.cache_disabled:
             return False
-        return doi in self.cache
-    
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM entries WHERE key = ?", (doi,)).fetchone() is not None
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Yield every (key, result) in the cache, e.g. to export it. Entries read this way are not counted as used.
+        """
+        if self.cache_disabled:
+            return
+        # Read in pages, so other threads can use the cache between them
+        last_key = None
+        while True:
+            with self._lock:
+                rows = self._conn.execute("SELECT key, value FROM entries WHERE ? IS NULL OR key > ? ORDER BY key LIMIT 1000",
+                                          (last_key, last_key)).fetchall()
+            if not rows:
+                return
+            for key, value in rows:
+                yield key, pickle.loads(decompress(value))
+            last_key = rows[-1][0]
+
+    def merge(self, items: Iterable[Tuple[str, Any]]) -> int:
+        """
+        Add results for keys not yet in the cache, in one transaction. Results already cached are kept.
+
+        Parameters
+        ----------
+        items : iterable of (str, Any)
+            (key, result) pairs, e.g. read from a cache bundle
+
+        Returns
+        -------
+        int
+            Number of results added
+        """
+        if self.cache_disabled:
+            return 0
+        now = time.time()
+        rows = []
+        for key, result in items:
+            value = compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), self.compression)
+            rows.append((key, value, now, self.run, len(value)))
+        with self._lock:
+            with self._conn:
+                # rowcount, as total_changes would also count the updates made by the triggers
+                added = self._conn.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?)", rows).rowcount
+            self._unsaved += added
+        return added
+
     def clear(self) -> None:
-        """Clear all cached results."""
+        """Clear all cached results, including those written by other processes."""
         if self.cache_disabled:
             return
-        self.cache.clear()
-        self._save_cache()
-    
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM entries")
+            self._touched.clear()
+
     def size(self) -> int:
         """Return the number of cached items."""
         if self.cache_disabled:
             return 0
-        return len(self.cache)
\ No newline at end of file
+        with self._lock:
+            return self._totals()[0]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compact the caches in data/cache, dropping entries that have not been used recently.")
+    parser.add_argument("--unused-runs", type=int, required=True,
+                        help="Drop entries that have not been used in this many runs.")
+    parser.add_argument("--db", nargs="*", default=None,
+                        help="Names of the caches to compact (e.g. semanticscholar_authors). Defaults to every cache.")
+    args = parser.parse_args()
+
+    db_names = args.db or cache_names()
+    for db_name in db_names:
+        entries, reclaimed = ResultsCache(db_name).compact(args.unused_runs)
+        print(f"{db_name}: dropped {entries} entries, reclaimed {reclaimed / 1e6:.1f} MB")
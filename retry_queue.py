@@ -0,0 +1,134 @@
+import re
+import time
+import heapq
+import random
+import httpx
+import requests
+from typing import Dict, Iterator, Tuple
+from semanticscholar.SemanticScholarException import GatewayTimeoutException, InternalServerErrorException, ServerErrorException
+
+# HTTP status codes worth retrying: the request may succeed later
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+def istransient(error: Exception) -> bool:
+    """
+    Return whether a failed request may succeed if retried later, e.g. a timeout, a dropped connection,
+    'HTTP 429 Too Many Requests' or a server error. Not found, bad requests and errors reading the
+    response are permanent.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError, requests.Timeout, requests.ConnectionError,
+                          httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError,
+                          GatewayTimeoutException, InternalServerErrorException, ServerErrorException)):
+        # semanticscholar raises ConnectionRefusedError for HTTP 429
+        return True
+    if isinstance(error, (requests.HTTPError, httpx.HTTPStatusError)):
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+        if status is None:
+            # elsapy raises HTTPError("HTTP 429 Error from ...") without the response
+            match = re.match(r"HTTP (\d{3})", str(error))
+            status = int(match.group(1)) if match else None
+        return status in TRANSIENT_STATUS
+    return False
+
+class RetryQueue:
+    """
+    Lookups of one API that failed, to be retried with backoff once the other rows have been queried.
+
+    A failed row is pushed rather than retried at once, so a slow or failing API does not hold up the
+    rows behind it. Transient failures are retried after an exponentially growing, jittered delay, up to
+    `max_attempts` attempts in total. Permanent failures, and rows still failing after the last attempt,
+    are kept in `failed` so that they can be reported rather than left as silent gaps.
+
+    Attributes
+    ----------
+    provider : str
+        API name, e.g. 'elsevier'
+    failed : Dict[str, Tuple[int, str, bool]]
+        DOI -> (row, class name of the last error, whether it was transient), for rows given up on
+    """
+
+    def __init__(self, provider: str, max_attempts: int = 4, backoff: float = 2.0, max_backoff: float = 60.0):
+        """
+        Initialize an empty RetryQueue.
+
+        Parameters
+        ----------
+        provider : str
+            API name, e.g. 'elsevier'
+        max_attempts : int, optional
+            Attempts made at each row, including the first (default: 4)
+        backoff : float, optional
+            Seconds before the first retry, doubled for each later retry (default: 2.0)
+        max_backoff : float, optional
+            Longest delay before a retry, in seconds (default: 60.0)
+        """
+        self.provider = provider
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failed: Dict[str, Tuple[int, str, bool]] = {}
+        self._attempts: Dict[str, int] = {}
+        self._heap = []
+
+    def __len__(self) -> int:
+        """Number of rows waiting to be retried."""
+        return len(self._heap)
+
+    def push(self, row: int, doi: str, error: Exception) -> bool:
+        """
+        Record a failed attempt at a row, scheduling a retry if the error is transient and attempts are left.
+
+        Parameters
+        ----------
+        row : int
+            Index of the row in data_dict
+        doi : str
+            DOI of the row
+        error : Exception
+            The exception the attempt raised
+
+        Returns
+        -------
+        bool
+            True if a retry was scheduled, False if the row was given up on
+        """
+        attempt = self._attempts.get(doi, 1)
+        transient = istransient(error)
+        if not transient or attempt >= self.max_attempts:
+            self.failed[doi] = (row, type(error).__name__, transient)
+            return False
+        self._attempts[doi] = attempt + 1
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff) * random.uniform(0.5, 1.0)
+        heapq.heappush(self._heap, (time.monotonic() + delay, row, doi))
+        return True
+
+    def drain(self) -> Iterator[Tuple[int, str, int]]:
+        """
+        Yield (row, doi, attempt) for each scheduled retry, earliest first, sleeping until it is due.
+        Rows pushed again while draining are yielded again when their next retry is due.
+        """
+        while self._heap:
+            due, row, doi = heapq.heappop(self._heap)
+            time.sleep(max(due - time.monotonic(), 0))
+            yield row, doi, self._attempts[doi]
+
+    def report(self) -> list:
+        """
+        Print a warning listing the rows given up on, and return the DOIs of those that failed transiently,
+        which may succeed in a later run.
+        """
+        if not self.failed:
+            return []
+        transient = [doi for doi, (_, _, is_transient) in self.failed.items() if is_transient]
+        print(f"WARNING: {len(self.failed)} rows could not be retrieved from {self.provider} "
+              f"({len(transient)} after {self.max_attempts} attempts, {len(self.failed) - len(transient)} not found or invalid). "
+              f"Their {self.provider} columns are empty:")
+        # Rows are indices of the rows being enriched, which may be a subset or merge of the csvs, so DOIs are listed instead
+        for doi, (_, error, _) in sorted(self.failed.items(), key=lambda item: item[1][0])[:10]:
+            print(f"DOI: {doi}, error: {error}")
+        if len(self.failed) > 10:
+            print(f"... and {len(self.failed) - 10} more.")
+        if transient:
+            print("Rows that failed after retrying will be queried first in the next run.")
+        return transient
@@ -0,0 +1,172 @@
+import json
+import time
+import atexit
+import pickle
+import sqlite3
+import hashlib
+from pathlib import Path
+from typing import Any, Dict
+
+class RunJournal:
+    """
+    A crash-safe record of the progress of a run, so that an interrupted run resumes where it stopped.
+
+    The values extracted for each row are written to an SQLite database at `data/cache/journal.sqlite`
+    as each stage (e.g. 'openalex', 'elsevier') completes the row, and each stage is marked done once
+    every row has been through it. A run with the same rows and settings as an interrupted one skips its
+    done stages, restores the rows it had extracted, and continues each unfinished stage from the first
+    row not yet recorded. The records of a run are deleted once it completes.
+
+    Rows are written in batches, every `flush_rows` rows or `flush_seconds` seconds, and when the program
+    exits, so at most one batch of rows is extracted again after a crash.
+
+    A journal created with an empty run key is disabled: nothing is read or written.
+
+    Attributes
+    ----------
+    run_key : str
+        Fingerprint of the rows and settings of the run, from `fingerprint`
+    journal_file : Path
+        Path to the SQLite database
+    """
+
+    def __init__(self, run_key: str = "", journal_file: Path = Path("data/cache/journal.sqlite"),
+                 flush_rows: int = 100, flush_seconds: float = 5.0):
+        """
+        Initialize the RunJournal, creating the database if needed.
+
+        Parameters
+        ----------
+        run_key : str, optional
+            Fingerprint of the run, from `fingerprint`. If empty, the journal is disabled (default: "")
+        journal_file : Path, optional
+            Path to the SQLite database (default: data/cache/journal.sqlite)
+        flush_rows : int, optional
+            Rows recorded before they are written (default: 100)
+        flush_seconds : float, optional
+            Seconds after which recorded rows are written, however few (default: 5.0)
+        """
+        self.run_key = run_key
+        self.journal_file = journal_file
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._conn = None
+        if not run_key:
+            return
+        self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.journal_file, timeout=60)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS stages (run TEXT NOT NULL, stage TEXT NOT NULL, "
+                               "finished REAL NOT NULL, PRIMARY KEY (run, stage))")
+            # Replacing a row gives it a new rowid, so ordering by rowid gives the latest values of each row last
+            self._conn.execute("CREATE TABLE IF NOT EXISTS rows (id INTEGER PRIMARY KEY AUTOINCREMENT, run TEXT NOT NULL, "
+                               "stage TEXT NOT NULL, row INTEGER NOT NULL, data BLOB NOT NULL, UNIQUE (run, stage, row))")
+        atexit.register(self.flush)
+
+    @staticmethod
+    def fingerprint(data_dict: dict, settings: Dict[str, Any]) -> str:
+        """
+        Return a key identifying a run by the DOI and title of each of its rows, in order, and the settings that
+        change what is extracted (e.g. the Scimago year). Runs with the same key can resume each other.
+        """
+        digest = hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+        for i in range(len(data_dict)):
+            digest.update(json.dumps([data_dict[i]["DOI"], data_dict[i]["Title"]]).encode("utf-8"))
+        return digest.hexdigest()[:32]
+
+    def enabled(self) -> bool:
+        """Whether progress is being recorded."""
+        return self._conn is not None
+
+    def done(self, stage: str) -> bool:
+        """Return whether `stage` was completed by this run, or the interrupted run it resumes."""
+        if not self.enabled():
+            return False
+        return self._conn.execute("SELECT 1 FROM stages WHERE run = ? AND stage = ?", (self.run_key, stage)).fetchone() is not None
+
+    def rows(self, stage: str) -> set:
+        """Return the indices of the rows already recorded for `stage`, to be skipped when it is resumed."""
+        if not self.enabled():
+            return set()
+        self.flush()
+        return {row[0] for row in self._conn.execute("SELECT row FROM rows WHERE run = ? AND stage = ?", (self.run_key, stage))}
+
+    def restore(self, data_dict: dict) -> dict:
+        """
+        Replace each row of `data_dict` recorded by an interrupted run with its latest recorded values.
+
+        Parameters
+        ----------
+        data_dict : dict
+            Dictionary of the rows of the run, as read from the csv.
+
+        Returns
+        -------
+        dict
+            Updated `data_dict`.
+        """
+        if not self.enabled():
+            return data_dict
+        self.flush()
+        restored = {}
+        for row, data in self._conn.execute("SELECT row, data FROM rows WHERE run = ? ORDER BY id", (self.run_key,)):
+            restored[row] = data
+        for row, data in restored.items():
+            data_dict[row] = pickle.loads(data)
+        if restored:
+            stages = [row[0] for row in self._conn.execute("SELECT stage FROM stages WHERE run = ? ORDER BY finished", (self.run_key,))]
+            print(f"** Resuming an interrupted run: {len(restored)} rows restored"
+                  f"{', stages done: ' + ', '.join(stages) if stages else ''} **\n")
+        return data_dict
+
+    def record(self, stage: str, row: int, values: dict) -> None:
+        """Record that `stage` has completed row `row`, with the row's values after the stage."""
+        if not self.enabled():
+            return
+        self._pending.append((self.run_key, stage, row, pickle.dumps(values)))
+        if len(self._pending) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the recorded rows, in one transaction."""
+        if not self.enabled():
+            return
+        if self._pending:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO rows (run, stage, row, data) VALUES (?, ?, ?, ?)", self._pending)
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def finish(self, stage: str, data_dict: dict) -> None:
+        """
+        Mark `stage` done, recording every row of `data_dict`. The rows recorded by earlier stages are
+        then superseded, and deleted.
+        """
+        if not self.enabled():
+            return
+        self._pending = []
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO rows (run, stage, row, data) VALUES (?, ?, ?, ?)",
+                                   [(self.run_key, stage, i, pickle.dumps(data_dict[i])) for i in range(len(data_dict))])
+            self._conn.execute("DELETE FROM rows WHERE run = ? AND stage != ?", (self.run_key, stage))
+            self._conn.execute("INSERT OR REPLACE INTO stages VALUES (?, ?, ?)", (self.run_key, stage, time.time()))
+
+    def complete(self) -> None:
+        """Delete the records of the run, once its output has been written."""
+        if not self.enabled():
+            return
+        self._pending = []
+        with self._conn:
+            self._conn.execute("DELETE FROM rows WHERE run = ?", (self.run_key,))
+            self._conn.execute("DELETE FROM stages WHERE run = ?", (self.run_key,))
+
+    def close(self) -> None:
+        """Write the recorded rows and close the database."""
+        if not self.enabled():
+            return
+        self.flush()
+        atexit.unregister(self.flush)
+        self._conn.close()
+        self._conn = None
@@ -0,0 +1,14 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The modules are at the top level of the repository, rather than in a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run the test in an empty directory, as the caches, journal and outputs are written relative to it."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,66 @@
+import pytest
+
+from budget_ledger import BudgetLedger
+
+
+@pytest.fixture
+def ledger(workdir, monkeypatch):
+    monkeypatch.setattr(BudgetLedger, "budgets", {})
+    return BudgetLedger()
+
+
+def test_take_within_budget(ledger):
+    BudgetLedger.configure({"elsevier": {"limit": 5, "period": "week"}})
+
+    assert ledger.take("elsevier", "key", 3) == 3
+    assert ledger.take("elsevier", "key", 3) == 2
+    assert ledger.take("elsevier", "key") == 0
+    assert ledger.remaining("elsevier", "key") == 0
+    # Budgets are counted per API key, and shared by every ledger
+    assert ledger.take("elsevier", "other key") == 1
+    assert BudgetLedger().used("elsevier", "key") == 5
+
+
+def test_take_without_budget_is_not_counted(ledger):
+    BudgetLedger.configure({"elsevier": {"limit": 5, "period": "day"}})
+
+    assert ledger.take("openalex", n=1000) == 1000
+    assert ledger.used("openalex") == 0
+    assert ledger.remaining("openalex") is None
+
+
+def test_configure_rejects_invalid_budgets():
+    with pytest.raises(ValueError):
+        BudgetLedger.configure({"elsevier": {"limit": "many", "period": "week"}})
+    with pytest.raises(ValueError):
+        BudgetLedger.configure({"elsevier": {"limit": 5, "period": "year"}})
+
+
+def test_deferred_until_resumed(ledger):
+    ledger.defer("elsevier", ["10.1000/a", "10.1000/b"])
+    ledger.defer("gender-api", ["ana"])
+    ledger.defer("elsevier", [])
+
+    assert BudgetLedger().deferred("elsevier") == {"10.1000/a", "10.1000/b"}
+    assert ledger.deferred() == {"10.1000/a", "10.1000/b", "ana"}
+
+    ledger.resume("elsevier", ["10.1000/a"])
+    assert ledger.deferred("elsevier") == {"10.1000/b"}
+
+
+def test_prioritise_rows(ledger, capsys):
+    import citation_counter_functions as f
+    data_dict = {i: f.emptyrow(f"10.1000/{i}", "") for i in range(4)}
+    data_dict[1]["citationcount_openalex"] = 50
+    data_dict[2]["citationcount_elsevier"] = 20
+    data_dict[3]["citationcount_openalex"] = 10
+
+    # Deferred rows first, then the most cited, falling back to later columns, then input order
+    order = f.prioritise_rows(data_dict, {"10.1000/3"}, ("citationcount_openalex", "citationcount_elsevier"))
+    assert order == [3, 1, 2, 0]
+
+    # Without counts, e.g. if OpenAlex has not been queried, rows keep their input order
+    BudgetLedger.configure({"elsevier": {"limit": 5, "period": "day"}})
+    rows = {i: f.emptyrow(f"10.1000/{i}", "") for i in range(3)}
+    assert f.prioritise_rows(rows, set(), "citationcount_openalex", "elsevier") == [0, 1, 2]
+    assert "input order" in capsys.readouterr().out
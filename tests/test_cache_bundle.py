@@ -0,0 +1,105 @@
+import gzip
+import json
+
+import pyalex as pa
+import pytest
+from semanticscholar.Paper import Paper
+
+import cache_bundle
+from citation_counter_functions import loadcache_gender, savecache_gender
+from results_cache import ResultsCache
+
+PAPER = {"paperId": "abc", "title": "A paper", "citationCount": 12, "externalIds": {"DOI": "10.1000/a"}}
+AUTHOR_PAPERS = [{"paperId": "abc", "citationCount": 12, "externalIds": {"DOI": "10.1000/a"}}]
+SEARCH_ENTRIES = [{"dc:title": "A paper", "citedby-count": "7", "prism:issn": "12345678"}]
+WORK = {"id": "https://openalex.org/W1", "doi": "https://doi.org/10.1000/a", "cited_by_count": 5}
+SCIMAGO = {"content": b"Rank;Title\n1;Journal\n", "etag": '"v1"', "last_modified": None}
+
+
+@pytest.fixture(autouse=True)
+def cache_settings(workdir, monkeypatch):
+    monkeypatch.setattr(ResultsCache, "counting", False)
+    monkeypatch.setattr(ResultsCache, "_runs", {})
+
+
+def fill_caches():
+    ResultsCache("elsevier").set("10.1000/a", SEARCH_ENTRIES)
+    ResultsCache("semanticscholar").set("10.1000/a", Paper(PAPER))
+    ResultsCache("semanticscholar_authors").set("author1", AUTHOR_PAPERS)
+    ResultsCache("openalex").set("10.1000/a", pa.Work(WORK))
+    ResultsCache("scimago").set("https://www.scimagojr.com/journalrank.php?year=2024", SCIMAGO)
+    savecache_gender({"ana": (0.01, 0.99)})
+
+
+def test_export_import_round_trip(workdir, monkeypatch):
+    fill_caches()
+
+    counts = cache_bundle.export_bundle(str(workdir / "bundle.jsonl.gz"))
+    assert counts == {"elsevier": 1, "semanticscholar": 1, "semanticscholar_authors": 1, "openalex": 1, "scimago": 1, "gender": 1}
+
+    # Import into a new machine, with empty caches
+    new_node = workdir / "new_node"
+    new_node.mkdir()
+    monkeypatch.chdir(new_node)
+    added = cache_bundle.import_bundle(str(workdir / "bundle.jsonl.gz"))
+
+    assert added == counts
+    assert ResultsCache("elsevier").get("10.1000/a") == SEARCH_ENTRIES
+    paper = ResultsCache("semanticscholar").get("10.1000/a")
+    assert isinstance(paper, Paper) and paper.raw_data == PAPER
+    assert ResultsCache("semanticscholar_authors").get("author1") == AUTHOR_PAPERS
+    work = ResultsCache("openalex").get("10.1000/a")
+    assert isinstance(work, pa.Work) and work == WORK
+    assert ResultsCache("scimago").get("https://www.scimagojr.com/journalrank.php?year=2024") == SCIMAGO
+    assert loadcache_gender() == {"ana": (0.01, 0.99)}
+
+    # Importing again keeps the results already cached
+    assert sum(cache_bundle.import_bundle(str(workdir / "bundle.jsonl.gz")).values()) == 0
+
+
+def test_export_some_caches(workdir):
+    fill_caches()
+
+    counts = cache_bundle.export_bundle(str(workdir / "bundle.jsonl.gz"), ["openalex", "gender"])
+
+    assert counts == {"openalex": 1, "gender": 1}
+    with pytest.raises(ValueError):
+        cache_bundle.export_bundle(str(workdir / "bundle.jsonl.gz"), ["crossref"])
+
+
+def write_bundle(path, header, entries=()):
+    with gzip.open(path, "wt", encoding="utf-8") as bundle:
+        bundle.write(json.dumps(header) + "\n")
+        for entry in entries:
+            bundle.write(json.dumps(entry) + "\n")
+
+
+def test_import_refuses_other_files(workdir):
+    write_bundle(workdir / "other.jsonl.gz", {"format": "something else"})
+    with pytest.raises(ValueError, match="not a cache bundle"):
+        cache_bundle.import_bundle(str(workdir / "other.jsonl.gz"))
+
+    write_bundle(workdir / "newer.jsonl.gz", {"format": cache_bundle.BUNDLE_FORMAT, "version": cache_bundle.BUNDLE_VERSION + 1})
+    with pytest.raises(ValueError, match="version"):
+        cache_bundle.import_bundle(str(workdir / "newer.jsonl.gz"))
+
+
+def test_import_refuses_values_of_the_wrong_shape(workdir):
+    header = {"format": cache_bundle.BUNDLE_FORMAT, "version": cache_bundle.BUNDLE_VERSION, "counts": {"openalex": 1}}
+    write_bundle(workdir / "bundle.jsonl.gz", header, [{"cache": "openalex", "key": "10.1000/a", "value": ["not", "a", "work"]}])
+
+    with pytest.raises(ValueError, match="openalex"):
+        cache_bundle.import_bundle(str(workdir / "bundle.jsonl.gz"))
+
+
+def test_import_legacy_shapes(workdir):
+    header = {"format": cache_bundle.BUNDLE_FORMAT, "version": cache_bundle.BUNDLE_VERSION, "counts": {}}
+    write_bundle(workdir / "bundle.jsonl.gz", header, [
+        {"cache": "elsevier", "key": "10.1000/a", "value": {"results": SEARCH_ENTRIES}},
+        {"cache": "semanticscholar_authors", "key": "author1", "value": {"data": AUTHOR_PAPERS}},
+    ])
+
+    cache_bundle.import_bundle(str(workdir / "bundle.jsonl.gz"))
+
+    assert ResultsCache("elsevier").get("10.1000/a") == SEARCH_ENTRIES
+    assert ResultsCache("semanticscholar_authors").get("author1") == AUTHOR_PAPERS
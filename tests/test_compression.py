@@ -0,0 +1,49 @@
+import pickle
+
+import pytest
+
+import results_cache
+from results_cache import ResultsCache, compress, decompress, load_compressed
+
+
+@pytest.fixture(autouse=True)
+def cache_settings(workdir, monkeypatch):
+    monkeypatch.setattr(ResultsCache, "limits", {})
+    monkeypatch.setattr(ResultsCache, "compression", results_cache.default_codec())
+    monkeypatch.setattr(ResultsCache, "counting", False)
+    monkeypatch.setattr(ResultsCache, "_runs", {})
+
+
+@pytest.mark.parametrize("codec", ["zstd", "lz4", "none"])
+def test_decompress_detects_codec(codec):
+    data = pickle.dumps(list(range(1000)))
+    assert decompress(compress(data, codec)) == data
+
+
+def test_values_written_with_any_codec_can_be_read():
+    for codec in ("zstd", "lz4", "none"):
+        ResultsCache.configure(compression=codec)
+        ResultsCache("test").set(codec, codec)
+
+    ResultsCache.configure(compression="none")
+    cache = ResultsCache("test")
+    assert [cache.get(codec) for codec in ("zstd", "lz4", "none")] == ["zstd", "lz4", "none"]
+
+
+def test_configure_rejects_unknown_codec():
+    with pytest.raises(ValueError):
+        ResultsCache.configure(compression="gzip")
+
+
+@pytest.mark.parametrize("codec", ["zstd", "lz4", "none"])
+def test_legacy_pickle_cache_is_imported(codec):
+    cache_dir = results_cache.Path("data/cache")
+    cache_dir.mkdir(parents=True)
+    (cache_dir / "test.pkl").write_bytes(compress(pickle.dumps({"a": 1, "b": 2}), codec))
+    assert load_compressed(cache_dir / "test.pkl") == {"a": 1, "b": 2}
+
+    cache = ResultsCache("test")
+
+    assert cache.get("a") == 1 and cache.get("b") == 2
+    assert not (cache_dir / "test.pkl").exists()
+    assert (cache_dir / "test.pkl.imported").exists()
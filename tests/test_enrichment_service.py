@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+import citation_counter_functions as f
+import enrichment_service
+from results_cache import ResultsCache
+
+CONFIG = {"cache_limits": {}, "cache_compression": "", "trace_log": "", "budgets": {}, "no_cache": False,
+          "elsevier_apikey": "", "year": 2024, "openalex_snapshot": "", "hedge": "",
+          "timeouts": f.PROVIDER_TIMEOUTS, "rates": f.PROVIDER_RATES, "skip_gender": "True", "gender_engine": ""}
+
+
+@pytest.fixture
+def enricher(workdir, monkeypatch):
+    """An Enricher whose rows are enriched by a stub that waits for `release` and records each batch."""
+    monkeypatch.setattr(ResultsCache, "counting", False)
+    monkeypatch.setattr(ResultsCache, "_runs", {})
+    monkeypatch.setattr(f, "warmresources", lambda d: {})
+    enricher = enrichment_service.Enricher(dict(CONFIG))
+    enricher.batches = []
+    enricher.release = threading.Event()
+
+    def enrich_rows(pairs):
+        enricher.batches.append([doi for doi, _ in pairs])
+        enricher.release.wait(5)
+        if any(doi == "10.1000/error" for doi, _ in pairs):
+            raise RuntimeError("API down")
+        return [dict(f.emptyrow(doi, title), citationcount_openalex=len(doi)) for doi, title in pairs]
+    enricher._enrich_rows = enrich_rows
+    return enricher
+
+
+def run_in_thread(enricher, pairs, results):
+    def run():
+        try:
+            results.append(enricher.enrich(pairs))
+        except Exception as e:
+            results.append(e)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_for_batches(enricher, n):
+    for _ in range(500):
+        if len(enricher.batches) >= n:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"Expected {n} batches, got {enricher.batches}")
+
+
+def test_concurrent_calls_for_the_same_doi_are_coalesced(enricher):
+    first, second = [], []
+    thread = run_in_thread(enricher, [("10.1000/a", "A"), ("10.1000/b", "B")], first)
+    wait_for_batches(enricher, 1)
+    other = run_in_thread(enricher, [("10.1000/b", "B again"), ("10.1000/c", "C")], second)
+    wait_for_batches(enricher, 2)
+    enricher.release.set()
+    thread.join()
+    other.join()
+
+    # 10.1000/b is enriched once, by the first call, and the second call only enriches 10.1000/c
+    assert enricher.batches == [["10.1000/a", "10.1000/b"], ["10.1000/c"]]
+    assert [row["DOI"] for row in second[0]] == ["10.1000/b", "10.1000/c"]
+    # Each caller gets its own title back
+    assert [row["Title"] for row in second[0]] == ["B again", "C"]
+    assert first[0][1]["citationcount_openalex"] == second[0][0]["citationcount_openalex"]
+    assert enricher._inflight == {}
+
+
+def test_rows_without_doi_are_not_coalesced(enricher):
+    enricher.release.set()
+
+    rows = enricher.enrich([("", "A"), ("", "B")])
+
+    assert enricher.batches == [["", ""]]
+    assert [row["Title"] for row in rows] == ["A", "B"]
+
+
+def test_errors_reach_every_waiting_call(enricher):
+    first, second = [], []
+    thread = run_in_thread(enricher, [("10.1000/error", "")], first)
+    wait_for_batches(enricher, 1)
+    other = run_in_thread(enricher, [("10.1000/error", "")], second)
+    # The second call claims nothing, so give it time to start waiting for the first
+    threading.Event().wait(0.2)
+    enricher.release.set()
+    thread.join()
+    other.join()
+
+    assert isinstance(first[0], RuntimeError) and isinstance(second[0], RuntimeError)
+    assert enricher.batches == [["10.1000/error"]]
+    assert enricher._inflight == {}
+
+
+def test_warm_caches_are_passed_to_each_api(workdir, monkeypatch):
+    monkeypatch.setattr(ResultsCache, "counting", False)
+    monkeypatch.setattr(ResultsCache, "_runs", {})
+    monkeypatch.setattr(f, "instantiateclient_elsevier", lambda apikey: "client")
+    monkeypatch.setattr(f, "loadindex_scimago", lambda year, no_cache: ({}, {}))
+    monkeypatch.setattr(f, "readnames_gender", lambda: None)
+    warm = f.warmresources(CONFIG)
+
+    used = {}
+    def stage(name, data_index=0):
+        def get_data(*args):
+            used[name] = [arg for arg in args if isinstance(arg, ResultsCache)]
+            return args[data_index]
+        return get_data
+    monkeypatch.setattr(f, "get_openalex_data", stage("openalex"))
+    monkeypatch.setattr(f, "get_elsevier_data", stage("elsevier", data_index=1))
+    monkeypatch.setattr(f, "get_semanticscholar_data", stage("semanticscholar"))
+    monkeypatch.setattr(f, "get_scimago_data", stage("scimago"))
+
+    f.get_all_data({0: f.emptyrow("10.1000/a", "A")}, CONFIG, warm=warm)
+
+    caches = warm["caches"]
+    assert used == {"openalex": [caches["openalex"]], "elsevier": [caches["elsevier"]],
+                    "semanticscholar": [caches["semanticscholar"], caches["semanticscholar_authors"]], "scimago": []}
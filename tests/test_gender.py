@@ -0,0 +1,110 @@
+import json
+import threading
+
+import pytest
+import requests
+
+import citation_counter_functions as f
+
+
+def fake_get(payload):
+    def get(url, params, timeout):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(payload).encode("utf-8")
+        return response
+    return get
+
+
+def test_queryapi_gender_matches_results_by_name(workdir, monkeypatch):
+    # Results reordered, with a name in another case, and one name missing
+    monkeypatch.setattr(f.requests, "get", fake_get({"result": [
+        {"name": "Maria", "gender": "female", "accuracy": 98},
+        {"name": "john", "gender": "male", "accuracy": 99},
+        {"name": "someone else", "gender": "male", "accuracy": 50},
+    ]}))
+
+    namegends = f.queryapi_gender(["john", "alex", "maria"], "key", f.NameCache(), rate=1000)
+
+    assert namegends == {"john": (0.99, 0.01), "maria": (0.02, 0.98)}
+    assert f.loadcache_gender() == namegends
+
+
+def test_queryapi_gender_single_name(workdir, monkeypatch):
+    monkeypatch.setattr(f.requests, "get", fake_get({"name": "kim", "gender": "unknown", "accuracy": 0}))
+
+    assert f.queryapi_gender(["kim"], "key", f.NameCache(no_cache=True), rate=1000) == {"kim": (-1, -1)}
+    assert f.loadcache_gender() == {}
+
+
+def make_rows(*authors):
+    data_dict = {i: f.emptyrow(f"10.1000/{i}", "") for i in range(len(authors))}
+    for i, author in enumerate(authors):
+        data_dict[i]["firstlastauthor_openalex"] = author
+    return data_dict
+
+
+def test_get_gender_data_does_not_rewrite_an_unchanged_cache(workdir, monkeypatch):
+    f.savecache_gender({"john": (0.99, 0.01)})
+    cache_file = workdir / "data" / "cache" / "gender-api-names.csv"
+    written = cache_file.stat().st_mtime_ns
+    monkeypatch.setattr(f.requests, "get", lambda *args, **kwargs: pytest.fail("No names should be queried"))
+
+    data_dict = f.get_gender_data(make_rows("Smith,John"), "key", names_tables=({}, {}, {}))
+
+    assert data_dict[0]["first_prob_male"] == 0.99
+    assert cache_file.stat().st_mtime_ns == written
+    assert list(cache_file.parent.glob("*.tmp")) == []
+
+
+def test_get_gender_data_defers_unanswered_names(workdir, monkeypatch):
+    def get(url, params, timeout):
+        raise requests.ConnectionError("connection reset")
+    monkeypatch.setattr(f.requests, "get", get)
+    monkeypatch.setattr(f.BudgetLedger, "budgets", {})
+
+    f.get_gender_data(make_rows("Smith,Zelda"), "key", names_tables=({}, {}, {}))
+
+    assert f.BudgetLedger().deferred("gender-api") == {"zelda"}
+    assert not (workdir / "data" / "cache" / "gender-api-names.csv").exists()
+
+    # Once answered, the name is no longer deferred
+    monkeypatch.setattr(f.requests, "get", fake_get({"name": "zelda", "gender": "female", "accuracy": 97}))
+    f.get_gender_data(make_rows("Smith,Zelda"), "key", names_tables=({}, {}, {}))
+
+    assert f.BudgetLedger().deferred("gender-api") == set()
+    assert f.loadcache_gender() == {"zelda": (0.03, 0.97)}
+
+
+def test_name_cache_shared_between_threads(workdir):
+    namecache = f.NameCache()
+
+    def add(k):
+        for j in range(30):
+            namecache.add({f"name{k}-{j}": (0.5, 0.5)})
+    threads = [threading.Thread(target=add, args=(k,)) for k in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(f.loadcache_gender()) == 240
+    assert namecache.lookup(["name0-0", "unknown"]) == {"name0-0": (0.5, 0.5)}
+    assert list((workdir / "data" / "cache").glob("*.tmp")) == []
+
+
+def test_rate_limiter_shared_between_threads(monkeypatch):
+    now = [0.0]
+    slots = []
+    monkeypatch.setattr(f.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(f.time, "sleep", lambda seconds: slots.append(seconds))
+    limiter = f.RateLimiter(2.0)
+
+    threads = [threading.Thread(target=limiter.wait) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Four requests at once are spaced 0.5 s apart, as if made by one thread
+    assert sorted(slots) == [0.5, 1.0, 1.5]
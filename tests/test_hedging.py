@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+import citation_counter_functions as f
+
+
+def warm_tracker(latency=0.01, **kwargs):
+    """Return a tracker that has seen enough requests to hedge after `latency` seconds."""
+    tracker = f.LatencyTracker(min_samples=1, **kwargs)
+    tracker.record(latency)
+    return tracker
+
+
+class SlowThenFast:
+    """A request whose first call hangs until released, and whose later calls return at once."""
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if call == 1:
+            self.release.wait(5)
+            return "slow"
+        return "fast"
+
+
+def test_without_hedge_calls_once():
+    tracker = f.LatencyTracker()
+    calls = []
+
+    assert f.hedgedcall_http(lambda: calls.append(1) or "result", tracker) == "result"
+    assert calls == [1]
+    assert len(tracker.latencies) == 1
+
+
+def test_slow_request_is_hedged():
+    tracker = warm_tracker()
+    call = SlowThenFast()
+
+    assert f.hedgedcall_http(call, tracker, hedge=True) == "fast"
+    call.release.set()
+
+    assert call.calls == 2
+    assert tracker.abandoned == 1
+
+
+def test_no_hedge_when_refused():
+    tracker = warm_tracker()
+    call = SlowThenFast()
+    threading.Timer(0.1, call.release.set).start()
+
+    assert f.hedgedcall_http(call, tracker, hedge=True, may_hedge=lambda: False) == "slow"
+    assert call.calls == 1
+    assert tracker.inflight == 0
+
+
+def test_no_hedge_while_too_many_requests_run():
+    tracker = warm_tracker(max_inflight=1)
+    call = SlowThenFast()
+    threading.Timer(0.1, call.release.set).start()
+
+    assert f.hedgedcall_http(call, tracker, hedge=True) == "slow"
+    assert call.calls == 1
+
+
+def test_every_request_failing_raises():
+    tracker = warm_tracker()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise TimeoutError(f"attempt {len(calls)}")
+
+    with pytest.raises(TimeoutError):
+        f.hedgedcall_http(fail, tracker, hedge=True)
+    assert len(tracker.latencies) == 1
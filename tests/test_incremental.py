@@ -0,0 +1,55 @@
+import pandas as pd
+
+import citation_counter_functions as f
+
+
+def make_rows(pairs):
+    return {i: f.emptyrow(doi, title) for i, (doi, title) in enumerate(pairs)}
+
+
+def test_split_incremental_without_previous_output():
+    data_dict = make_rows([("10.1000/a", "A"), ("10.1000/b", "B")])
+
+    data_dict, update_dict, update_rows = f.split_incremental(data_dict, None)
+
+    assert update_rows == [0, 1]
+    assert [update_dict[j]["DOI"] for j in range(2)] == ["10.1000/a", "10.1000/b"]
+
+
+def test_split_incremental_reuses_unchanged_rows():
+    data_dict = make_rows([("10.1000/a", "A"), ("10.1000/b", "B changed"), ("10.1000/c", "C"), ("10.1000/d", "D")])
+    previous = pd.DataFrame({"DOI": ["10.1000/a", "10.1000/b", "10.1000/d", "10.1000/a"],
+                             "Title": ["A", "B", "D", "A"],
+                             "citationcount_openalex": [5, 6, None, 99],
+                             "Year": [2020, 2021, 2022, 2023]})
+    previous = f.castcolumns_output(previous)
+
+    data_dict, update_dict, update_rows = f.split_incremental(data_dict, previous)
+
+    # A and D are reused, B's title changed and C is new
+    assert update_rows == [1, 2]
+    assert [update_dict[j]["DOI"] for j in range(2)] == ["10.1000/b", "10.1000/c"]
+    # The first copy of a duplicate is used, and missing values are None rather than pd.NA
+    assert data_dict[0]["citationcount_openalex"] == 5
+    assert data_dict[3]["citationcount_openalex"] is None
+    # Only the metadata columns are copied
+    assert "Year" not in data_dict[0]
+
+
+def test_split_incremental_redo():
+    data_dict = make_rows([("10.1000/a", "A"), ("10.1000/b", "B")])
+    previous = pd.DataFrame({"DOI": ["10.1000/a", "10.1000/b"], "Title": ["A", "B"], "citationcount_openalex": [1, 2]})
+
+    data_dict, update_dict, update_rows = f.split_incremental(data_dict, previous, redo={"10.1000/b"})
+
+    assert update_rows == [1]
+    assert data_dict[0]["citationcount_openalex"] == 1
+
+
+def test_merge_rows_in_input_order():
+    data_dict = make_rows([("10.1000/a", "A"), ("10.1000/b", "B"), ("10.1000/c", "C")])
+    update_dict = {0: dict(data_dict[2], citationcount_openalex=3), 1: dict(data_dict[0], citationcount_openalex=1)}
+
+    data_dict = f.merge_rows(data_dict, update_dict, [2, 0])
+
+    assert [data_dict[i]["citationcount_openalex"] for i in range(3)] == [1, None, 3]
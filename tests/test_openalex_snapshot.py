@@ -0,0 +1,65 @@
+import gzip
+import json
+
+import pytest
+
+from openalex_snapshot import OpenAlexSnapshot
+
+
+def write_part(snapshot_dir, updated_date, works):
+    part_dir = snapshot_dir / "data" / "works" / f"updated_date={updated_date}"
+    part_dir.mkdir(parents=True, exist_ok=True)
+    part_file = part_dir / "part_000.gz"
+    with gzip.open(part_file, "wt", encoding="utf-8") as f:
+        for work in works:
+            f.write(json.dumps(work) + "\n")
+    return part_file
+
+
+def work(doi, cited_by_count):
+    return {"id": f"https://openalex.org/W{cited_by_count}", "doi": f"https://doi.org/{doi}" if doi else None,
+            "cited_by_count": cited_by_count}
+
+
+@pytest.fixture
+def snapshot(workdir):
+    snapshot_dir = workdir / "snapshot"
+    write_part(snapshot_dir, "2024-01-01", [work("10.1000/A", 1), work("10.1000/b", 2), work(None, 3)])
+    write_part(snapshot_dir, "2024-06-01", [work("10.1000/c", 4), work("10.1000/a", 5)])
+    snapshot = OpenAlexSnapshot(str(snapshot_dir), workdir / "index.sqlite")
+    snapshot.build_index()
+    yield snapshot
+    snapshot.close()
+
+
+def test_get_many_reads_the_latest_copy(snapshot):
+    works = snapshot.get_many(["10.1000/a", "10.1000/B", "10.1000/c", "10.1000/missing", ""])
+
+    assert {doi: w["cited_by_count"] for doi, w in works.items()} == {"10.1000/a": 5, "10.1000/b": 2, "10.1000/c": 4}
+    assert snapshot.size() == 3
+    assert snapshot.get("10.1000/A")["cited_by_count"] == 5
+    assert snapshot.get("10.1000/missing") is None
+
+
+def test_latest_copy_whatever_order_files_are_indexed(snapshot, workdir):
+    # A newer file added after the index was built is indexed on its own, and still wins
+    write_part(workdir / "snapshot", "2024-09-01", [work("10.1000/b", 6)])
+
+    assert snapshot.build_index() == 1
+    assert snapshot.get("10.1000/b")["cited_by_count"] == 6
+    assert snapshot.get("10.1000/a")["cited_by_count"] == 5
+
+
+def test_removed_file_falls_back_to_earlier_copy(snapshot, workdir):
+    (workdir / "snapshot" / "data" / "works" / "updated_date=2024-06-01" / "part_000.gz").unlink()
+
+    assert snapshot.build_index() == 0
+    assert snapshot.get("10.1000/a")["cited_by_count"] == 1
+    assert snapshot.get("10.1000/c") is None
+
+
+def test_missing_snapshot(workdir):
+    snapshot = OpenAlexSnapshot(str(workdir / "nowhere"), workdir / "index.sqlite")
+    with pytest.raises(FileNotFoundError):
+        snapshot.build_index()
+    snapshot.close()
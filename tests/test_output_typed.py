@@ -0,0 +1,66 @@
+import pandas as pd
+import pyarrow
+import pytest
+
+import citation_counter_functions as f
+
+
+def make_rows():
+    data_dict = {0: f.emptyrow("10.1000/a", "A paper"), 1: f.emptyrow("10.1000/b", "Another paper")}
+    data_dict[0].update({"citationcount_openalex": 12, "FWCI_openalex": 1.5, "openaccess_openalex": True,
+                         "SJR_scimago": "1,234", "Hindex_scimago": "-"})
+    data_dict[1].update({"citationcount_openalex": None, "openaccess_openalex": False})
+    return data_dict
+
+
+def test_castcolumns_output_dtypes():
+    df = pd.DataFrame({"DOI": ["10.1000/a", None],
+                       "citationcount_elsevier": ["3", "4.0"],
+                       "SJR_scimago": ["1,5", "-"],
+                       "retracted_openalex": ["TRUE", "False"],
+                       "Year": [2020, 2021],
+                       "Notes": [["mixed"], "objects"]})
+
+    typed = f.castcolumns_output(df)
+
+    assert str(typed["DOI"].dtype) == "string"
+    assert typed["citationcount_elsevier"].tolist() == [3, 4]
+    assert str(typed["citationcount_elsevier"].dtype) == "Int64"
+    assert typed["SJR_scimago"][0] == 1.5
+    assert typed["SJR_scimago"].isna()[1]
+    assert typed["retracted_openalex"].tolist() == [True, False]
+    assert str(typed["retracted_openalex"].dtype) == "boolean"
+    # Columns that are not metadata keep their type, unless they hold Python objects
+    assert str(typed["Year"].dtype) == "int64"
+    assert str(typed["Notes"].dtype) == "string"
+    # The input is not modified
+    assert df["citationcount_elsevier"].tolist() == ["3", "4.0"]
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "arrow"])
+def test_output_typed_round_trip(workdir, output_format):
+    user_data = pd.DataFrame({"Title": ["A paper", "Another paper"], "DOI": ["10.1000/a", "10.1000/b"]})
+
+    f.output_typed(make_rows(), user_data, False, output_format, row_group_size=1)
+
+    if output_format == "parquet":
+        output = pd.read_parquet("citation_counter_output.parquet")
+    else:
+        output = pyarrow.ipc.open_file("citation_counter_output.arrow").read_pandas()
+    assert str(output["citationcount_openalex"].dtype) == "Int64"
+    assert output["citationcount_openalex"][0] == 12
+    assert output["citationcount_openalex"].isna()[1]
+    assert str(output["FWCI_openalex"].dtype) == "Float64"
+    assert output["SJR_scimago"][0] == pytest.approx(1.234)
+    assert output["Hindex_scimago"].isna()[0]
+    assert output["openaccess_openalex"].tolist() == [True, False]
+    assert output["DOI"].tolist() == ["10.1000/a", "10.1000/b"]
+
+
+def test_output_typed_parquet_row_groups(workdir):
+    import pyarrow.parquet as pq
+    user_data = pd.DataFrame({"Title": ["A paper", "Another paper"], "DOI": ["10.1000/a", "10.1000/b"]})
+
+    f.output_typed(make_rows(), user_data, False, "parquet", row_group_size=1)
+
+    assert pq.ParquetFile("citation_counter_output.parquet").num_row_groups == 2
@@ -0,0 +1,52 @@
+import codecs
+
+import citation_counter_functions as f
+
+
+def test_sniffcsv_header_in_first_row(tmp_path):
+    csv_file = tmp_path / "papers.csv"
+    csv_file.write_text("Title,DOI\nA paper,10.1000/a\n")
+    assert f.sniffcsv(csv_file, "Title", "DOI") == ("unicode_escape", 0)
+
+
+def test_sniffcsv_header_in_second_row(tmp_path):
+    csv_file = tmp_path / "papers.csv"
+    csv_file.write_text("Exported from Scopus,,\nTitle,DOI,Year\nA paper,10.1000/a,2020\n")
+    assert f.sniffcsv(csv_file, "Title", "DOI") == ("unicode_escape", 1)
+
+
+def test_sniffcsv_bom(tmp_path):
+    csv_file = tmp_path / "papers.csv"
+    csv_file.write_bytes(codecs.BOM_UTF8 + "Title,DOI\nÉtude,10.1000/a\n".encode("utf-8"))
+    assert f.sniffcsv(csv_file, "Title", "DOI") == ("utf-8-sig", 0)
+
+
+def test_sniffcsv_missing_headers(tmp_path):
+    csv_file = tmp_path / "papers.csv"
+    csv_file.write_text("a,b\nc,d\nTitle,DOI\n")
+    assert f.sniffcsv(csv_file, "Title", "DOI") == ("unicode_escape", 0)
+
+
+def test_readcsv_bom_and_second_row_header(tmp_path):
+    csv_file = tmp_path / "papers.csv"
+    content = "Exported from Scopus,,\nTitle,DOI,Year\nÉtude des citations,10.1000/a,2020\nNo DOI,,2021\n"
+    csv_file.write_bytes(codecs.BOM_UTF8 + content.encode("utf-8"))
+
+    data_dict, full_dataframe = f.readcsv(str(csv_file), "Title", "DOI")
+
+    assert list(full_dataframe.columns) == ["Title", "DOI"]
+    assert len(data_dict) == 2
+    assert data_dict[0]["Title"] == "Étude des citations"
+    assert data_dict[0]["DOI"] == "10.1000/a"
+    assert data_dict[1]["DOI"] == ""
+    assert data_dict[1]["citationcount_openalex"] is None
+
+
+def test_readcsv_retain_all_columns(tmp_path):
+    csv_file = tmp_path / "papers.csv"
+    csv_file.write_text("Title,DOI,Year\nA paper,10.1000/a,2020\n")
+
+    data_dict, full_dataframe = f.readcsv(str(csv_file), "Title", "DOI", retain_all_columns=True)
+
+    assert list(full_dataframe.columns) == ["Title", "DOI", "Year"]
+    assert data_dict[0]["DOI"] == "10.1000/a"
@@ -0,0 +1,167 @@
+import itertools
+import threading
+
+import pytest
+
+import results_cache
+from results_cache import ResultsCache
+
+
+@pytest.fixture(autouse=True)
+def cache_settings(workdir, monkeypatch):
+    """Give each test the default limits and codec, outside any run, and a clock that ticks once per call."""
+    monkeypatch.setattr(ResultsCache, "limits", {})
+    monkeypatch.setattr(ResultsCache, "compression", results_cache.default_codec())
+    monkeypatch.setattr(ResultsCache, "counting", False)
+    monkeypatch.setattr(ResultsCache, "_runs", {})
+    clock = itertools.count(1000)
+    monkeypatch.setattr(results_cache.time, "time", lambda: float(next(clock)))
+
+
+def new_run():
+    """Start a new run, as a new execution of citation_counter.py would."""
+    ResultsCache.counting = False
+    ResultsCache._runs = {}
+    ResultsCache.start_run()
+
+
+def test_get_set_has():
+    cache = ResultsCache("test")
+    cache.set("10.1000/a", {"cited_by_count": 3})
+
+    assert cache.has("10.1000/a")
+    assert cache.get("10.1000/a") == {"cited_by_count": 3}
+    assert not cache.has("10.1000/b")
+    assert cache.get("10.1000/b") is None
+    assert ResultsCache("test").get("10.1000/a") == {"cited_by_count": 3}
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResultsCache("test", cache_disabled=True)
+    cache.set("10.1000/a", 1)
+
+    assert cache.get("10.1000/a") is None
+    assert cache.size() == 0
+    assert not (results_cache.Path("data/cache") / "test.sqlite").exists()
+
+
+def test_eviction_by_entries_keeps_recently_used():
+    cache = ResultsCache("test", max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    cache.get("a")
+    cache.save_to_disk()
+
+    assert sorted(key for key, _ in cache.items()) == ["a", "c"]
+
+
+def test_eviction_by_bytes():
+    ResultsCache.configure({"test": {"max_bytes": 250}}, "none")
+    cache = ResultsCache("test")
+    for key in ("a", "b", "c"):
+        cache.set(key, b"x" * 100)
+    cache.save_to_disk()
+
+    assert sorted(key for key, _ in cache.items()) == ["b", "c"]
+
+
+def test_totals_follow_writes_of_every_instance():
+    ResultsCache.configure(compression="none")
+    cache, other = ResultsCache("test"), ResultsCache("test")
+    cache.set("a", b"x" * 100)
+    other.set("b", b"x" * 100)
+    cache.set("a", b"x" * 300)     # Replacing a value counts its new size only
+    assert cache.merge([("b", b"x"), ("c", b"x" * 10)]) == 1
+    other.clear()
+    cache.set("d", b"x" * 50)
+
+    actual = cache._conn.execute("SELECT COUNT(*), SUM(nbytes) FROM entries").fetchone()
+    assert cache._totals() == other._totals() == actual
+    assert cache.size() == 1
+
+
+def test_totals_are_counted_for_caches_without_them():
+    cache = ResultsCache("test")
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    totals = cache._totals()
+    with cache._conn:
+        cache._conn.execute("DELETE FROM meta WHERE key IN ('entries', 'bytes')")
+
+    assert ResultsCache("test")._totals() == totals
+    assert totals[0] == 3
+
+
+def test_runs_are_counted_once_per_execution():
+    ResultsCache("test").set("a", 1)
+    new_run()
+    first = ResultsCache("test")
+    # Other instances of the same process, e.g. of each stage, share the run
+    assert ResultsCache("test").run == first.run == 1
+    assert ResultsCache("other").run == 1
+
+    # Processes that do not start a run, e.g. workers and dry runs, join the latest run
+    ResultsCache.counting = False
+    ResultsCache._runs = {}
+    assert ResultsCache("test").run == 1
+
+    new_run()
+    assert ResultsCache("test").run == ResultsCache("other").run == 2
+
+
+def test_compact_drops_entries_unused_for_several_runs():
+    new_run()
+    cache = ResultsCache("test")
+    cache.set("old", 1)
+    cache.set("used", 2)
+    cache.save_to_disk()
+
+    new_run()
+    cache = ResultsCache("test")
+    cache.get("used")
+    cache.save_to_disk()
+
+    new_run()
+    ResultsCache.counting = False
+    ResultsCache._runs = {}
+    cache = ResultsCache("test")
+    dropped, _ = cache.compact(unused_runs=2)
+
+    assert dropped == 1
+    assert [key for key, _ in cache.items()] == ["used"]
+    # Compacting does not count as a run
+    assert cache._last_run() == 3
+
+
+def test_items_pages_through_every_entry():
+    cache = ResultsCache("test")
+    cache.merge((f"{k:05d}", k) for k in range(2500))
+
+    assert [value for _, value in cache.items()] == list(range(2500))
+
+
+def test_merge_keeps_cached_results():
+    cache = ResultsCache("test")
+    cache.set("a", "cached")
+
+    added = cache.merge([("a", "bundle"), ("b", "bundle")])
+
+    assert added == 1
+    assert cache.get("a") == "cached"
+    assert cache.get("b") == "bundle"
+
+
+def test_shared_between_threads():
+    cache = ResultsCache("test")
+
+    def work(k):
+        for j in range(50):
+            cache.set(f"{k}-{j}", j)
+            assert cache.get(f"{k}-{j}") == j
+    threads = [threading.Thread(target=work, args=(k,)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.size() == 200
@@ -0,0 +1,84 @@
+import httpx
+import pytest
+import requests
+
+import retry_queue
+from retry_queue import RetryQueue, istransient
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+@pytest.mark.parametrize("error", [
+    TimeoutError(),
+    ConnectionRefusedError(),
+    requests.Timeout(),
+    requests.ConnectionError(),
+    httpx.ReadTimeout("timed out"),
+    http_error(429),
+    http_error(503),
+    requests.HTTPError("HTTP 429 Error from https://api.elsevier.com/content/search/scopus"),
+])
+def test_istransient(error):
+    assert istransient(error)
+
+
+@pytest.mark.parametrize("error", [
+    http_error(404),
+    http_error(400),
+    requests.HTTPError("HTTP 401 Error from https://api.elsevier.com/content/search/scopus"),
+    KeyError("citationCount"),
+    ValueError("not JSON"),
+])
+def test_istransient_permanent(error):
+    assert not istransient(error)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace sleeping with advancing a fake monotonic clock, and jitter with its upper bound."""
+    now = [0.0]
+    monkeypatch.setattr(retry_queue.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(retry_queue.time, "sleep", lambda seconds: now.__setitem__(0, now[0] + seconds))
+    monkeypatch.setattr(retry_queue.random, "uniform", lambda low, high: high)
+    return now
+
+
+def test_drain_yields_due_retries_in_order(clock):
+    queue = RetryQueue("openalex", backoff=2.0)
+    assert queue.push(0, "10.1000/a", TimeoutError())
+    clock[0] = 1.0
+    assert queue.push(1, "10.1000/b", TimeoutError())
+
+    assert list(queue.drain()) == [(0, "10.1000/a", 2), (1, "10.1000/b", 2)]
+    # Each retry waited for its backoff
+    assert clock[0] == 3.0
+    assert len(queue) == 0
+
+
+def test_drain_retries_with_backoff_until_attempts_run_out(clock):
+    queue = RetryQueue("openalex", max_attempts=3, backoff=2.0, max_backoff=3.0)
+    queue.push(0, "10.1000/a", TimeoutError())
+
+    attempts = []
+    for row, doi, attempt in queue.drain():
+        attempts.append((attempt, clock[0]))
+        queue.push(row, doi, TimeoutError())
+
+    # Delays are 2 s, then 4 s capped at 3 s
+    assert attempts == [(2, 2.0), (3, 5.0)]
+    assert queue.failed == {"10.1000/a": (0, "TimeoutError", True)}
+    assert queue.report() == ["10.1000/a"]
+
+
+def test_permanent_failures_are_not_retried(clock):
+    queue = RetryQueue("elsevier")
+
+    assert not queue.push(4, "10.1000/a", http_error(404))
+    assert list(queue.drain()) == []
+    assert queue.failed == {"10.1000/a": (4, "HTTPError", False)}
+    # Permanent failures are reported, but not deferred to the next run
+    assert queue.report() == []
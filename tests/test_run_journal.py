@@ -0,0 +1,65 @@
+import citation_counter_functions as f
+from run_journal import RunJournal
+
+
+def make_rows(n):
+    return {i: f.emptyrow(f"10.1000/{i}", f"Paper {i}") for i in range(n)}
+
+
+def open_journal(data_dict, workdir, **kwargs):
+    key = RunJournal.fingerprint(data_dict, {"year": 2024})
+    return RunJournal(key, workdir / "journal.sqlite", **kwargs)
+
+
+def test_fingerprint_depends_on_rows_and_settings():
+    data_dict = make_rows(2)
+    key = RunJournal.fingerprint(data_dict, {"year": 2024})
+
+    assert RunJournal.fingerprint(make_rows(2), {"year": 2024}) == key
+    assert RunJournal.fingerprint(data_dict, {"year": 2023}) != key
+    assert RunJournal.fingerprint(make_rows(3), {"year": 2024}) != key
+
+
+def test_restore_after_interruption(workdir):
+    journal = open_journal(make_rows(3), workdir, flush_rows=1000, flush_seconds=1000)
+    done = make_rows(3)
+    for i in range(3):
+        done[i]["citationcount_openalex"] = i + 10
+    journal.finish("openalex", done)
+    done[0]["citationcount_elsevier"] = 7
+    journal.record("elsevier", 0, done[0])
+    # Recorded rows are written when the process exits, here by closing the journal
+    journal.close()
+
+    resumed = open_journal(make_rows(3), workdir)
+    data_dict = resumed.restore(make_rows(3))
+
+    assert resumed.done("openalex") and not resumed.done("elsevier")
+    assert resumed.rows("elsevier") == {0}
+    # Each row has the values of the latest stage that recorded it
+    assert data_dict[0]["citationcount_elsevier"] == 7
+    assert [data_dict[i]["citationcount_openalex"] for i in range(3)] == [10, 11, 12]
+    assert data_dict[1]["citationcount_elsevier"] is None
+
+
+def test_other_runs_and_completed_runs_are_not_restored(workdir):
+    journal = open_journal(make_rows(2), workdir)
+    journal.finish("openalex", make_rows(2))
+
+    other = open_journal(make_rows(3), workdir)
+    assert not other.done("openalex")
+    assert other.restore(make_rows(3)) == make_rows(3)
+
+    journal.complete()
+    assert not open_journal(make_rows(2), workdir).done("openalex")
+
+
+def test_disabled_journal(workdir):
+    journal = RunJournal()
+    journal.record("openalex", 0, {})
+    journal.finish("openalex", make_rows(1))
+
+    assert not journal.enabled()
+    assert not journal.done("openalex")
+    assert journal.restore(make_rows(1)) == make_rows(1)
+    assert not (workdir / "data").exists()
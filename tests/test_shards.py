@@ -0,0 +1,50 @@
+import pytest
+
+import citation_counter_functions as f
+
+
+def make_rows(n):
+    return {i: f.emptyrow(f"10.1000/{i}", f"Paper {i}") for i in range(n)}
+
+
+@pytest.mark.parametrize("n, shard_count", [(10, 3), (2, 4), (0, 2)])
+def test_select_shard_covers_every_row_once(n, shard_count):
+    data_dict = make_rows(n)
+    rows = list(range(100, 100 + n))
+
+    selected = [f.select_shard(data_dict, rows, k, shard_count) for k in range(shard_count)]
+
+    assert [i for _, shard_rows in selected for i in shard_rows] == rows
+    for shard_dict, shard_rows in selected:
+        assert list(shard_dict) == list(range(len(shard_rows)))
+        assert [row["DOI"] for row in shard_dict.values()] == [f"10.1000/{i - 100}" for i in shard_rows]
+
+
+def test_merge_shards_in_input_order(workdir):
+    data_dict = make_rows(7)
+    rows = [3, 5, 8, 9, 11, 12, 20]
+    shard_count = 3
+    # Shards finish in any order
+    for k in reversed(range(shard_count)):
+        shard_dict, shard_rows = f.select_shard(data_dict, rows, k, shard_count)
+        for row in shard_dict.values():
+            row["citationcount_openalex"] = k
+        f.output_shard(shard_dict, shard_rows, k, shard_count)
+
+    merged_dict, merged_rows = f.merge_shards(shard_count)
+
+    assert merged_rows == rows
+    assert [merged_dict[j]["DOI"] for j in range(7)] == [f"10.1000/{j}" for j in range(7)]
+    assert [merged_dict[j]["citationcount_openalex"] for j in range(7)] == [0, 0, 1, 1, 2, 2, 2]
+
+
+def test_merge_shards_missing_shard(workdir):
+    shard_dict, shard_rows = f.select_shard(make_rows(4), [0, 1, 2, 3], 0, 2)
+    f.output_shard(shard_dict, shard_rows, 0, 2)
+
+    with pytest.raises(FileNotFoundError, match="shard_1_of_2"):
+        f.merge_shards(2)
+
+
+def test_sharerates():
+    assert f.sharerates({"elsevier": 1.0, "openalex": 5.0}, 4) == {"elsevier": 0.25, "openalex": 1.25}
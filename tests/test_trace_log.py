@@ -0,0 +1,54 @@
+import json
+
+import httpx
+import pytest
+import requests
+
+from trace_log import TraceLog
+
+
+@pytest.fixture
+def events(workdir):
+    """Trace to a file, returning a function that closes it and reads the events written."""
+    TraceLog.configure(str(workdir / "trace.jsonl"))
+
+    def read():
+        TraceLog.close()
+        with open(workdir / "trace.jsonl") as trace:
+            return [json.loads(line) for line in trace]
+    yield read
+    TraceLog.close()
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+def test_call_records_row_status_and_bytes(events):
+    with TraceLog.call("openalex", 3, "10.1000/a", attempt=2) as event:
+        event["bytes"] = 120
+    with TraceLog.call("semanticscholar_authors", 4, "author1", cache="hit"):
+        pass
+
+    first, second = events()
+    assert (first["provider"], first["row"], first["doi"], first["attempt"], first["status"], first["bytes"]) == \
+        ("openalex", 3, "10.1000/a", 2, "ok", 120)
+    assert (second["row"], second["cache"]) == (4, "hit")
+
+
+@pytest.mark.parametrize("error, status", [
+    (http_error(404), "HTTPError 404"),
+    (http_error(429), "HTTPError 429"),
+    (httpx.HTTPStatusError("server error", request=httpx.Request("GET", "https://api.openalex.org"),
+                           response=httpx.Response(500)), "HTTPStatusError 500"),
+    (requests.HTTPError("HTTP 429 Error from https://api.elsevier.com"), "HTTPError"),
+    (TimeoutError(), "TimeoutError"),
+])
+def test_call_records_http_status_of_errors(events, error, status):
+    with pytest.raises(type(error)):
+        with TraceLog.call("openalex", 0, "10.1000/a"):
+            raise error
+
+    assert events()[0]["status"] == status
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import Optional, Iterator
+
+class TraceLog:
+    """
+    An optional JSON Lines trace of every provider call, for finding slow DOIs and the causes of empty rows.
+
+    Each line is one event:
+    {"time": ..., "row": 12, "doi": "10.1000/xyz", "provider": "openalex", "cache": "miss", "attempt": 1,
+     "status": "ok", "latency_ms": 231.4, "bytes": 18423}
+    `status` is "ok", or the class name of the exception raised by the call, e.g. "ReadTimeout".
+    `bytes` is the size of the response body, or the stored size of a cached result. It is null where the
+    client library does not expose the response, e.g. for Semantic Scholar.
+
+    Events are handed to a background thread that serialises and appends them, so tracing adds
+    little more than a queue put to each call. Sizes are measured by the caller, where they are already
+    known, so events never hold on to the results themselves. Tracing is disabled until `configure` is given a path.
+    """
+    path: Optional[str] = None
+    _queue: Optional[queue.Queue] = None
+    _thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def configure(cls, path: str = "") -> None:
+        """
+        Start writing events to `path`, appending if the file exists. An empty path disables tracing.
+
+        Parameters
+        ----------
+        path : str
+            Path of the JSON Lines file to append events to
+        """
+        cls.close()
+        if not path:
+            return
+        cls.path = path
+        cls._queue = queue.Queue()
+        cls._thread = threading.Thread(target=cls._write_events, args=(path, cls._queue), daemon=True)
+        cls._thread.start()
+        atexit.register(cls.close)
+
+    @classmethod
+    def enabled(cls) -> bool:
+        """Whether events are being written."""
+        return cls._queue is not None
+
+    @classmethod
+    def _write_events(cls, path: str, events: queue.Queue) -> None:
+        """Background writer. Drains the queue in batches, so each batch is one append. Stops at a None event."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            stop = False
+            while not stop:
+                batch = [events.get()]
+                while True:
+                    try:
+                        batch.append(events.get_nowait())
+                    except queue.Empty:
+                        break
+                lines = []
+                for event in batch:
+                    if event is None:
+                        stop = True
+                        continue
+                    lines.append(json.dumps(event, default=str) + "\n")
+                if lines:
+                    os.write(fd, "".join(lines).encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    @classmethod
+    def record(cls, provider: str, row: Optional[int] = None, doi: Optional[str] = None, cache: str = "miss",
+               attempt: int = 1, status: str = "ok", latency: float = 0.0, nbytes: Optional[int] = None) -> None:
+        """
+        Queue one event. Does nothing if tracing is disabled.
+
+        Parameters
+        ----------
+        provider : str
+            Name of the provider called, e.g. 'elsevier', 'semanticscholar', 'semanticscholar_authors',
+            'openalex', 'scimago' or 'gender-api'
+        row : int, optional
+            Index of the row in data_dict the call was made for
+        doi : str, optional
+            DOI (or other key) the call was made for
+        cache : str
+            'hit' if the result came from ResultsCache, 'miss' if the provider was queried,
+            'revalidate' if a cached HTTP response was sent to the provider for revalidation
+        attempt : int
+            1 for the first attempt at a call, incremented on each retry
+        status : str
+            'ok', or the class name of the exception raised
+        latency : float
+            Duration of the call, in seconds
+        nbytes : int, optional
+            Size in bytes of the response body, or of the cached result
+        """
+        if cls._queue is None:
+            return
+        cls._queue.put({"time": round(time.time(), 3), "row": row, "doi": doi, "provider": provider,
+                        "cache": cache, "attempt": attempt, "status": status,
+                        "latency_ms": round(latency * 1000, 1), "bytes": nbytes})
+
+    @classmethod
+    @contextmanager
+    def call(cls, provider: str, row: Optional[int] = None, doi: Optional[str] = None, cache: str = "miss",
+             attempt: int = 1) -> Iterator[dict]:
+        """
+        Time the calls made in a `with` block and record them as one event.
+
+        The block may set `event["bytes"]` to the size of the response or cached result, or
+        `event["status"]` to describe a result that is not an exception (e.g. an HTTP status code).
+        Exceptions are recorded by class name and re-raised. An exception carrying an HTTP response
+        (e.g. from `raise_for_status`) is recorded with its status code too, e.g. "HTTPError 429".
+
+        Example
+        -------
+        with TraceLog.call("openalex", i, doi) as event:
+            response = requests.get(url, timeout=30)
+            event["status"], event["bytes"] = response.status_code, len(response.content)
+        """
+        event = {"status": "ok", "bytes": None}
+        start = time.perf_counter()
+        try:
+            yield event
+        except BaseException as e:
+            status_code = getattr(getattr(e, "response", None), "status_code", None)
+            event["status"] = type(e).__name__ if status_code is None else f"{type(e).__name__} {status_code}"
+            raise
+        finally:
+            cls.record(provider, row, doi, cache, attempt, str(event["status"]),
+                       time.perf_counter() - start, event["bytes"])
+
+    @classmethod
+    def close(cls) -> None:
+        """Write all queued events and stop the writer thread."""
+        if cls._queue is None:
+            return
+        cls._queue.put(None)
+        cls._thread.join()
+        cls._queue = None
+        cls._thread = None
+        cls.path = None